@@ -9,7 +9,12 @@ from core.configuration.configuration import get_app_version
 from core.managers.module_manager import ModuleManager
 from core.managers.config_manager import ConfigManager
 from core.managers.error_handler_manager import ErrorHandlerManager
+from core.managers.flamapy_pool_manager import FlamapyPoolManager
 from core.managers.logging_manager import LoggingManager
+from core.managers.record_buffer_manager import RecordBufferManager
+from core.managers.response_cache_manager import ResponseCacheManager
+from core.managers.result_cache_manager import ResultCacheManager
+from core.managers.suggestion_index_manager import SuggestionIndexManager
 
 load_dotenv()
 
@@ -41,6 +46,26 @@ def create_app(config_name="development"):
     db.init_app(app)
     migrate.init_app(app, db)
 
+    # Buffer analytics records and write them in bulk
+    record_buffer_manager = RecordBufferManager(app)
+    record_buffer_manager.register()
+
+    # Cache rendered pages and fragments for a short TTL
+    response_cache_manager = ResponseCacheManager(app)
+    response_cache_manager.register()
+
+    # Cache ordered search results until the catalog changes
+    result_cache_manager = ResultCacheManager(app)
+    result_cache_manager.register()
+
+    # Keep an in-memory prefix index for search suggestions
+    suggestion_index_manager = SuggestionIndexManager(app)
+    suggestion_index_manager.register()
+
+    # Run CPU-heavy flamapy jobs in warm worker processes with time and memory limits
+    flamapy_pool_manager = FlamapyPoolManager(app)
+    flamapy_pool_manager.register()
+
     # Register modules
     module_manager = ModuleManager(app)
     module_manager.register_modules()
@@ -3,6 +3,9 @@ from enum import Enum
 
 from flask import request
 from sqlalchemy import Enum as SQLAlchemyEnum
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session, validates
 
 from app import db
 
@@ -42,14 +45,60 @@ class Author(db.Model):
 
 
 class DSMetrics(db.Model):
+    # Computed from the uploaded UVL files; indexed for the explore range filters
     id = db.Column(db.Integer, primary_key=True)
-    number_of_models = db.Column(db.String(120))
-    number_of_features = db.Column(db.String(120))
+    number_of_models = db.Column(db.Integer, index=True)
+    number_of_features = db.Column(db.Integer, index=True)
+    number_of_constraints = db.Column(db.Integer, index=True)
+    depth = db.Column(db.Integer, index=True)
 
     def __repr__(self):
         return f"DSMetrics<models={self.number_of_models}, features={self.number_of_features}>"
 
 
+class Tag(db.Model):
+    __table_args__ = (db.Index("ix_tag_name", "name", unique=True),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Binary collation, so the unique index compares names exactly like names_from does:
+    # the database default is accent-insensitive and would treat "café" and "cafe" as one tag
+    name = db.Column(
+        db.String(120).with_variant(mysql.VARCHAR(120, collation="utf8mb4_bin"), "mysql", "mariadb"),
+        nullable=False,
+    )
+
+    @staticmethod
+    def names_from(text) -> list:
+        """Normalized, de-duplicated tag names of a comma-separated tags string."""
+        names = (name.strip().lower()[:120] for name in (text or "").split(","))
+        return list(dict.fromkeys(name for name in names if name))
+
+    @staticmethod
+    def labels_from(text) -> list:
+        """
+        Tags of a comma-separated tags string as the user typed them, in their
+        order. Spellings that normalize to the same name keep the first one.
+        """
+        labels = {}
+        for label in (text or "").split(","):
+            label = label.strip()
+            name = label.lower()[:120]
+            if name and name not in labels:
+                labels[name] = label
+        return list(labels.values())
+
+    def __repr__(self):
+        return f"Tag<{self.name}>"
+
+
+ds_meta_data_tag = db.Table(
+    "ds_meta_data_tag",
+    db.Column("ds_meta_data_id", db.Integer, db.ForeignKey("ds_meta_data.id", ondelete="CASCADE"), primary_key=True),
+    db.Column("tag_id", db.Integer, db.ForeignKey("tag.id", ondelete="CASCADE"), primary_key=True),
+    db.Index("ix_ds_meta_data_tag_tag_id", "tag_id", "ds_meta_data_id"),
+)
+
+
 class DSMetaData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     deposition_id = db.Column(db.Integer)
@@ -66,6 +115,25 @@ class DSMetaData(db.Model):
     authors = db.relationship(
         "Author", backref="ds_meta_data", lazy=True, cascade="all, delete"
     )
+    # Normalized copy of `tags`, kept in step by sync_tags
+    tag_list = db.relationship("Tag", secondary=ds_meta_data_tag, lazy=True)
+
+    @staticmethod
+    def normalize_doi(doi):
+        # A blank DOI field means unpublished, so it is stored as NULL and
+        # `dataset_doi IS NOT NULL` is the one test for a published dataset
+        return (doi or "").strip() or None
+
+    @validates("dataset_doi")
+    def validate_dataset_doi(self, key, doi):
+        return self.normalize_doi(doi)
+
+    def tag_names(self):
+        return sorted(tag.name for tag in self.tag_list)
+
+    def tag_labels(self):
+        # What is shown and published; tag_names are only for lookups
+        return Tag.labels_from(self.tags)
 
 
 class DataSet(db.Model):
@@ -118,7 +186,7 @@ class DataSet(db.Model):
     def get_uvlhub_doi(self):
         from app.modules.dataset.services import DataSetService
 
-        return DataSetService().get_uvlhub_doi(self)
+        return DataSetService.get_uvlhub_doi(self)
 
     def to_dict(self):
         return {
@@ -131,7 +199,7 @@ class DataSet(db.Model):
             "publication_type": self.get_cleaned_publication_type(),
             "publication_doi": self.ds_meta_data.publication_doi,
             "dataset_doi": self.ds_meta_data.dataset_doi,
-            "tags": self.ds_meta_data.tags.split(",") if self.ds_meta_data.tags else [],
+            "tags": self.ds_meta_data.tag_labels(),
             "url": self.get_uvlhub_doi(),
             "download": f'{request.host_url.rstrip("/")}/dataset/download/{self.id}',
             "zenodo": self.get_zenodo_url(),
@@ -143,13 +211,34 @@ class DataSet(db.Model):
             "total_size_in_human_format": self.get_file_total_size_for_human(),
         }
 
+    def to_card_dict(self):
+        """Only the fields rendered by the dataset cards of the explore page."""
+        return {
+            "title": self.ds_meta_data.title,
+            "id": self.id,
+            "created_at": self.created_at,
+            "description": self.ds_meta_data.description,
+            "authors": [author.to_dict() for author in self.ds_meta_data.authors],
+            "publication_type": self.get_cleaned_publication_type(),
+            "tags": self.ds_meta_data.tag_labels(),
+            "url": self.get_uvlhub_doi(),
+            "total_size_in_human_format": self.get_file_total_size_for_human(),
+        }
+
     def __repr__(self):
         return f"DataSet<{self.id}>"
 
 
 class DSDownloadRecord(db.Model):
+    dedup_columns = ("user_id", "dataset_id", "download_cookie")
+    __table_args__ = (
+        db.Index("ix_ds_download_record_dataset_user_cookie", "dataset_id", "user_key", "download_cookie", unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    # Anonymous visitors have no user_id, and NULLs never collide in a unique index
+    user_key = db.Column(db.Integer, db.Computed("COALESCE(user_id, 0)", persisted=True))
     dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id"))
     download_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     download_cookie = db.Column(db.String(36), nullable=False)  # Assuming UUID4 strings
@@ -164,8 +253,15 @@ class DSDownloadRecord(db.Model):
 
 
 class DSViewRecord(db.Model):
+    dedup_columns = ("user_id", "dataset_id", "view_cookie")
+    __table_args__ = (
+        db.Index("ix_ds_view_record_dataset_user_cookie", "dataset_id", "user_key", "view_cookie", unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    # Anonymous visitors have no user_id, and NULLs never collide in a unique index
+    user_key = db.Column(db.Integer, db.Computed("COALESCE(user_id, 0)", persisted=True))
     dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id"))
     view_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     view_cookie = db.Column(db.String(36), nullable=False)  # Assuming UUID4 strings
@@ -198,3 +294,25 @@ class RateDatasets(db.Model):
             f"Dataset={self.data_set.tittle}, "
             f"Author={self.user.username}>"
         )
+
+
+@event.listens_for(Session, "before_flush")
+def sync_tags(session, flush_context, instances):
+    """
+    Links metadata whose comma-separated `tags` changed to the matching rows of
+    the tag table, creating missing tags first, so tag lookups can use indexes.
+    """
+    changed = [
+        instance
+        for instance in list(session.new) + list(session.dirty)
+        if hasattr(type(instance), "tag_list") and inspect(instance).attrs.tags.history.has_changes()
+    ]
+    if not changed:
+        return
+
+    from app.modules.dataset.repositories import TagRepository
+
+    names = {instance: Tag.names_from(instance.tags) for instance in changed}
+    tags = TagRepository().get_or_create_many({name for instance_names in names.values() for name in instance_names})
+    for instance, instance_names in names.items():
+        instance.tag_list = [tags[name] for name in instance_names]
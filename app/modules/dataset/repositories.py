@@ -1,10 +1,12 @@
 from datetime import datetime, timezone
 import logging
 from flask_login import current_user
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from sqlalchemy import desc, func
+from sqlalchemy import Select, desc, func, select
+from sqlalchemy.orm import joinedload, selectinload
 
+from app.modules.auth.models import User
 from app.modules.dataset.models import (
     Author,
     DOIMapping,
@@ -13,25 +15,58 @@ from app.modules.dataset.models import (
     DSViewRecord,
     DataSet,
     RateDatasets,
+    Tag,
+    ds_meta_data_tag,
 )
-
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import Hubfile
+from app.modules.public.models import HubCounter
+from app.modules.public.repositories import CountedRepository
+from core.managers.record_buffer_manager import get_record_buffer
 from core.repositories.BaseRepository import BaseRepository
 
 logger = logging.getLogger(__name__)
 
+# Relationships read by each use case, loaded up front instead of one lazy query per access:
+# "card" for dataset cards, "detail" for the dataset page and "export" for downloads and to_dict
+CARD_PROFILE = (
+    joinedload(DataSet.ds_meta_data).selectinload(DSMetaData.authors),
+    joinedload(DataSet.ds_meta_data).selectinload(DSMetaData.tag_list),
+    selectinload(DataSet.feature_models).selectinload(FeatureModel.files),
+)
+LOAD_PROFILES = {
+    "card": CARD_PROFILE,
+    "detail": CARD_PROFILE + (
+        joinedload(DataSet.user).joinedload(User.profile),
+        selectinload(DataSet.feature_models).selectinload(FeatureModel.files).selectinload(Hubfile.validation),
+    ),
+    "export": CARD_PROFILE + (selectinload(DataSet.feature_models).joinedload(FeatureModel.fm_meta_data),),
+}
+
+
+def load_profile(profile: Optional[str]) -> tuple:
+    return LOAD_PROFILES[profile] if profile else ()
+
 
 class AuthorRepository(BaseRepository):
     def __init__(self):
         super().__init__(Author)
 
 
-class DSDownloadRecordRepository(BaseRepository):
+class DSDownloadRecordRepository(CountedRepository):
+    counter_name = HubCounter.DATASET_DOWNLOADS
+
     def __init__(self):
         super().__init__(DSDownloadRecord)
 
-    def total_dataset_downloads(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
+    def record_download(self, dataset_id: int, user_id: Optional[int], user_cookie: str):
+        get_record_buffer().record(
+            self,
+            user_id=user_id,
+            dataset_id=dataset_id,
+            download_date=datetime.now(timezone.utc),
+            download_cookie=user_cookie,
+        )
 
 
 class DSMetaDataRepository(BaseRepository):
@@ -42,14 +77,12 @@ class DSMetaDataRepository(BaseRepository):
         return self.model.query.filter_by(dataset_doi=doi).first()
 
 
-class DSViewRecordRepository(BaseRepository):
+class DSViewRecordRepository(CountedRepository):
+    counter_name = HubCounter.DATASET_VIEWS
+
     def __init__(self):
         super().__init__(DSViewRecord)
 
-    def total_dataset_views(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
-
     def the_record_exists(self, dataset: DataSet, user_cookie: str):
         return self.model.query.filter_by(
             user_id=current_user.id if current_user.is_authenticated else None,
@@ -65,6 +98,15 @@ class DSViewRecordRepository(BaseRepository):
             view_cookie=user_cookie,
         )
 
+    def record_view(self, dataset: DataSet, user_cookie: str):
+        get_record_buffer().record(
+            self,
+            user_id=current_user.id if current_user.is_authenticated else None,
+            dataset_id=dataset.id,
+            view_date=datetime.now(timezone.utc),
+            view_cookie=user_cookie,
+        )
+
 
 class DataSetRepository(BaseRepository):
     def __init__(self):
@@ -83,9 +125,21 @@ class DataSetRepository(BaseRepository):
             return True
         return False
 
-    def get_synchronized(self, current_user_id: int) -> DataSet:
+    def get_or_404(self, id: int, profile: Optional[str] = None) -> DataSet:
+        return self.model.query.options(*load_profile(profile)).filter(self.model.id == id).first_or_404()
+
+    def get_by_doi(self, doi: str, profile: Optional[str] = None) -> Optional[DataSet]:
+        return (
+            self.model.query.join(DSMetaData)
+            .options(*load_profile(profile))
+            .filter(DSMetaData.dataset_doi == doi)
+            .first()
+        )
+
+    def get_synchronized(self, current_user_id: int, profile: Optional[str] = None) -> DataSet:
         return (
             self.model.query.join(DSMetaData)
+            .options(*load_profile(profile))
             .filter(
                 DataSet.user_id == current_user_id, DSMetaData.dataset_doi.isnot(None)
             )
@@ -93,9 +147,10 @@ class DataSetRepository(BaseRepository):
             .all()
         )
 
-    def get_unsynchronized(self, current_user_id: int) -> DataSet:
+    def get_unsynchronized(self, current_user_id: int, profile: Optional[str] = None) -> DataSet:
         return (
             self.model.query.join(DSMetaData)
+            .options(*load_profile(profile))
             .filter(
                 DataSet.user_id == current_user_id, DSMetaData.dataset_doi.is_(None)
             )
@@ -104,10 +159,11 @@ class DataSetRepository(BaseRepository):
         )
 
     def get_unsynchronized_dataset(
-        self, current_user_id: int, dataset_id: int
+        self, current_user_id: int, dataset_id: int, profile: Optional[str] = None
     ) -> DataSet:
         return (
             self.model.query.join(DSMetaData)
+            .options(*load_profile(profile))
             .filter(
                 DataSet.user_id == current_user_id,
                 DataSet.id == dataset_id,
@@ -130,17 +186,26 @@ class DataSetRepository(BaseRepository):
             .count()
         )
 
-    def latest_synchronized(self):
+    def all_synchronized(self, profile: Optional[str] = None):
         return (
             self.model.query.join(DSMetaData)
+            .options(*load_profile(profile))
+            .filter(DSMetaData.dataset_doi.isnot(None))
+            .all()
+        )
+
+    def latest_synchronized(self, profile: Optional[str] = None):
+        return (
+            self.model.query.join(DSMetaData)
+            .options(*load_profile(profile))
             .filter(DSMetaData.dataset_doi.isnot(None))
             .order_by(desc(self.model.id))
             .limit(5)
             .all()
         )
 
-    def get_all(self):
-        return self.model.query.all()
+    def get_all(self, profile: Optional[str] = None):
+        return self.model.query.options(*load_profile(profile)).all()
 
 
 class DOIMappingRepository(BaseRepository):
@@ -157,3 +222,46 @@ class RateRepository(BaseRepository):
 
     def get_all_comments(self, dataset_id):
         return RateDatasets.query.filter_by(dataset_id=dataset_id).all()
+
+
+class TagRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(Tag)
+
+    def get_by_names(self, names: Iterable[str]) -> List[Tag]:
+        names = list(names)
+        if not names:
+            return []
+        return self.model.query.filter(self.model.name.in_(names)).all()
+
+    def get_or_create_many(self, names: Iterable[str]) -> Dict[str, Tag]:
+        names = set(names)
+        tags = {tag.name: tag for tag in self.get_by_names(names)}
+        missing = names - tags.keys()
+        if missing:
+            # Another worker may create the same tags concurrently; the unique index keeps one of each
+            self.create_many_ignoring_duplicates([{"name": name} for name in missing], commit=False)
+            tags.update((tag.name, tag) for tag in self.get_by_names(missing))
+        return tags
+
+    def ds_meta_data_ids_with_any(self, names: Iterable[str]) -> Select:
+        """
+        Subquery of the metadata tagged with any of ``names``, resolved through the
+        unique tag name index and the (tag_id, ds_meta_data_id) association index.
+        """
+        tag_ids = select(Tag.id).where(Tag.name.in_(list(names)))
+        return select(ds_meta_data_tag.c.ds_meta_data_id).where(ds_meta_data_tag.c.tag_id.in_(tag_ids))
+
+    def tag_cloud(self, limit: int = 50) -> List[Tuple[str, int]]:
+        """The most used tags among published datasets, with how many datasets use each."""
+        count = func.count(ds_meta_data_tag.c.ds_meta_data_id)
+        return (
+            self.session.query(Tag.name, count)
+            .join(ds_meta_data_tag, ds_meta_data_tag.c.tag_id == Tag.id)
+            .join(DSMetaData, DSMetaData.id == ds_meta_data_tag.c.ds_meta_data_id)
+            .filter(DSMetaData.dataset_doi.isnot(None))
+            .group_by(Tag.id, Tag.name)
+            .order_by(count.desc(), Tag.name)
+            .limit(limit)
+            .all()
+        )
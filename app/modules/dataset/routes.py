@@ -2,38 +2,36 @@ import logging
 import os
 import json
 import shutil
-import tempfile
 import uuid
-from datetime import datetime, timezone
-from zipfile import ZipFile
 from flask import send_file
 from flask_login import login_required, current_user
 
 from flask import (
+    Response,
     redirect,
     render_template,
     request,
     jsonify,
-    send_from_directory,
     make_response,
+    stream_with_context,
     abort,
     url_for,
     flash,
 )
 
 from core.configuration.configuration import USE_FAKENODO
-from flamapy.metamodels.fm_metamodel.transformations import (
-    UVLReader,
-    GlencoeWriter,
-    SPLOTWriter,
+from core.http.caching import (
+    apply_cache_control,
+    file_last_modified,
+    is_not_modified,
+    not_modified_response,
 )
-from flamapy.metamodels.pysat_metamodel.transformations import FmToPysat, DimacsWriter
 
 from app.modules.dataset.forms import DataSetForm
 from app.modules.dataset.forms import RateForm
-from app.modules.dataset.models import DSDownloadRecord
 from app.modules.dataset import dataset_bp
 from app.modules.dataset.services import (
+    ArchiveCacheService,
     AuthorService,
     DSDownloadRecordService,
     DSMetaDataService,
@@ -41,9 +39,11 @@ from app.modules.dataset.services import (
     DataSetService,
     DOIMappingService,
     RateDataSetService,
+    ZipStreamService,
 )
 
 from app.modules.fakenodo.services import FakenodoService
+from app.modules.flamapy.services import FlamapyService, TransformationCacheService
 from app.modules.hubfile.services import HubfileService
 from app.modules.zenodo.services import ZenodoService
 
@@ -58,6 +58,12 @@ fakenodo_service = FakenodoService()
 doi_mapping_service = DOIMappingService()
 ds_view_record_service = DSViewRecordService()
 rateDataset_service = RateDataSetService()
+zip_stream_service = ZipStreamService()
+archive_cache_service = ArchiveCacheService()
+flamapy_service = FlamapyService()
+transformation_cache_service = TransformationCacheService()
+
+ARCHIVE_DIRS_BY_EXTENSION = {".cnf": "cnf", ".splot": "splot", ".glencoe": "glencoe"}
 
 
 @dataset_bp.route("/dataset/upload", methods=["GET", "POST"])
@@ -80,7 +86,7 @@ def create_dataset():
             dataset_service.move_feature_models(dataset)
             if form.dataset_doi._value() == "":
                 logger.info("Dataset DOI field was left blank - untracking dataset...")
-                dataset_service.update_dsmetadata(dataset.id, dataset_doi=None)
+                dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=None)
 
         except Exception as exc:
             logger.exception(f"Exception while create dataset data in local {exc}")
@@ -146,8 +152,8 @@ def create_dataset():
 def list_dataset():
     return render_template(
         "dataset/list_datasets.html",
-        datasets=dataset_service.get_synchronized(current_user.id),
-        local_datasets=dataset_service.get_unsynchronized(current_user.id),
+        datasets=dataset_service.get_synchronized(current_user.id, profile="card"),
+        local_datasets=dataset_service.get_unsynchronized(current_user.id, profile="card"),
     )
 
 
@@ -211,26 +217,47 @@ def delete():
 
 @dataset_bp.route("/dataset/download/<int:dataset_id>", methods=["GET"])
 def download_dataset(dataset_id):
-    dataset = dataset_service.get_or_404(dataset_id)
+    dataset = dataset_service.get_or_404(dataset_id, profile="export")
 
     file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
+    archive_name = f"dataset_{dataset_id}"
 
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"dataset_{dataset_id}.zip")
+    entries = list(
+        zip_stream_service.directory_entries(file_path, prefix=archive_name)
+    )
 
-    with ZipFile(zip_path, "w") as zipf:
-        for subdir, dirs, files in os.walk(file_path):
-            for file in files:
-                full_path = os.path.join(subdir, file)
+    # The archive key depends only on the file checksums, so it doubles as a strong ETag
+    checksums = {file.name: file.checksum for file in dataset.files()}
+    etag = archive_cache_service.key_for(
+        archive_cache_service.fingerprints(entries, checksums)
+    )
+    last_modified = max(
+        filter(None, (file_last_modified(path) for _, path in entries)), default=None
+    )
+    published = dataset.ds_meta_data.dataset_doi is not None
 
-                relative_path = os.path.relpath(full_path, file_path)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, published, last_modified)
 
-                zipf.write(
-                    full_path,
-                    arcname=os.path.join(
-                        os.path.basename(zip_path[:-4]), relative_path
-                    ),
-                )
+    if archive_cache_service.is_enabled():
+        # Prebuilt archives are reused as long as the file checksums do not change
+        resp = make_response(
+            send_file(
+                archive_cache_service.get_or_build(etag, entries),
+                as_attachment=True,
+                mimetype="application/zip",
+                download_name=f"{archive_name}.zip",
+                etag=etag,
+            )
+        )
+    else:
+        # The archive is compressed on the fly while it is being sent
+        resp = Response(zip_stream_service.stream(entries), mimetype="application/zip")
+        resp.headers["Content-Disposition"] = (
+            f"attachment; filename={archive_name}.zip"
+        )
+        resp.set_etag(etag)
+    resp.last_modified = last_modified
 
     user_cookie = request.cookies.get("download_cookie")
     if not user_cookie:
@@ -238,38 +265,15 @@ def download_dataset(dataset_id):
             uuid.uuid4()
         )  # Generate a new unique identifier if it does not exist
         # Save the cookie to the user's browser
-        resp = make_response(
-            send_from_directory(
-                temp_dir,
-                f"dataset_{dataset_id}.zip",
-                as_attachment=True,
-                mimetype="application/zip",
-            )
-        )
         resp.set_cookie("download_cookie", user_cookie)
-    else:
-        resp = send_from_directory(
-            temp_dir,
-            f"dataset_{dataset_id}.zip",
-            as_attachment=True,
-            mimetype="application/zip",
-        )
+    apply_cache_control(resp, published)
 
-    # Check if the download record already exists for this cookie
-    existing_record = DSDownloadRecord.query.filter_by(
+    # Record the download, queued in the record buffer which drops duplicates for this cookie
+    DSDownloadRecordService().record_download(
+        dataset_id,
         user_id=current_user.id if current_user.is_authenticated else None,
-        dataset_id=dataset_id,
-        download_cookie=user_cookie,
-    ).first()
-
-    if not existing_record:
-        # Record the download in your database
-        DSDownloadRecordService().create(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            dataset_id=dataset_id,
-            download_date=datetime.now(timezone.utc),
-            download_cookie=user_cookie,
-        )
+        user_cookie=user_cookie,
+    )
 
     return resp
 
@@ -284,14 +288,11 @@ def subdomain_index(doi):
         return redirect(url_for("dataset.subdomain_index", doi=new_doi), code=302)
 
     # Try to search the dataset by the provided DOI (which should already be the new one)
-    ds_meta_data = dsmetadata_service.filter_by_doi(doi)
+    dataset = dataset_service.get_by_doi(doi, profile="detail")
 
-    if not ds_meta_data:
+    if not dataset:
         abort(404)
 
-    # Get dataset
-    dataset = ds_meta_data.data_set
-
     # Save the cookie to the user's browser
     user_cookie = ds_view_record_service.create_cookie(dataset=dataset)
     resp = make_response(render_template("dataset/view_dataset.html", dataset=dataset))
@@ -305,7 +306,7 @@ def subdomain_index(doi):
 def get_unsynchronized_dataset(dataset_id):
 
     # Get dataset
-    dataset = dataset_service.get_unsynchronized_dataset(current_user.id, dataset_id)
+    dataset = dataset_service.get_unsynchronized_dataset(current_user.id, dataset_id, profile="detail")
 
     if not dataset:
         abort(404)
@@ -413,131 +414,105 @@ def delete_rate(dataset_id, rate_id):
 
 @dataset_bp.route("/dataset/download/all", methods=["GET"])
 def download_all_datasets():
-    datasets = dataset_service.get_all()
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, "all_datasets.zip")
-
-    uvl_dir = os.path.join(temp_dir, "uvl")
-    cnf_dir = os.path.join(temp_dir, "cnf")
-    splot_dir = os.path.join(temp_dir, "splot")
-    glencoe_dir = os.path.join(temp_dir, "glencoe")
-    others_dir = os.path.join(temp_dir, "otros")
-    os.makedirs(others_dir, exist_ok=True)
-
-    os.makedirs(uvl_dir, exist_ok=True)
-    os.makedirs(cnf_dir, exist_ok=True)
-    os.makedirs(splot_dir, exist_ok=True)
-    os.makedirs(glencoe_dir, exist_ok=True)
+    datasets = dataset_service.get_all(profile="export")
+
+    # The transformation cache needs the app context while the archive is streamed
+    resp = Response(
+        stream_with_context(
+            zip_stream_service.stream(all_datasets_entries(datasets))
+        ),
+        mimetype="application/zip",
+    )
+    resp.headers["Content-Disposition"] = "attachment; filename=all_datasets.zip"
+    return resp
+
+
+def all_datasets_entries(datasets):
+    """
+    Yields the ``(arcname, source)`` entries of the all-datasets archive. UVL files
+    are converted to CNF, SPLOT and Glencoe across the flamapy pool while the raw
+    files are being compressed, and each conversion is added as soon as it is done.
+    Conversions already in the transformation cache skip flamapy entirely.
+    """
+    raw_entries = []
+    cached_entries = []
+    pending_checksums = {}
+    arcnames = set()
+    for dataset in datasets:
+        file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
+        checksums = {file.name: file.checksum for file in dataset.files()}
+        for subdir, dirs, files in os.walk(file_path):
+            for file in files:
+                full_path = os.path.join(subdir, file)
+                relative_path = os.path.relpath(full_path, file_path)
 
+                _, ext = os.path.splitext(file)
+                ext = ext.lower()
+
+                # Si no es UVL (por si existen otros archivos)
+                # lo guardamos en la carpeta correspondiente a su extensión.
+                target_dir = "uvl" if ext == ".uvl" else ARCHIVE_DIRS_BY_EXTENSION.get(ext, "otros")
+                arcname = os.path.join(target_dir, relative_path)
+
+                # The archive layout is flat, so a name repeated across datasets is only added once
+                if arcname in arcnames:
+                    logger.warning(f"Skipping duplicated file {full_path} in all datasets archive")
+                    continue
+                arcnames.add(arcname)
+                raw_entries.append((arcname, full_path))
+
+                if ext != ".uvl":
+                    continue
+
+                checksum = checksums.get(file)
+                cached = (
+                    transformation_cache_service.lookup_all(checksum)
+                    if checksum
+                    else None
+                )
+                if cached:
+                    for format, path in cached.items():
+                        cached_entries.append((f"{format}/{file}_{format}.txt", path))
+                else:
+                    pending_checksums[full_path] = checksum
+
+    conversions = flamapy_service.transform_many(pending_checksums)
     try:
-        with ZipFile(zip_path, "w") as zipf:
-            for dataset in datasets:
-                file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
-                for subdir, dirs, files in os.walk(file_path):
-                    for file in files:
-                        full_path = os.path.join(subdir, file)
-                        relative_path = os.path.relpath(full_path, file_path)
-
-                        _, ext = os.path.splitext(file)
-                        ext = ext.lower()
-
-                        if ext == ".uvl":
-                            uvl_file_path = os.path.join(uvl_dir, relative_path)
-                            os.makedirs(os.path.dirname(uvl_file_path), exist_ok=True)
-                            shutil.copy(full_path, uvl_file_path)
-                            zipf.write(
-                                uvl_file_path,
-                                arcname=os.path.relpath(uvl_file_path, temp_dir),
-                            )
-
-                            try:
-                                file_id = int(file.split(".")[0][4:])
-                            except ValueError:
-                                logging.error(
-                                    f"No se puede extraer el ID del archivo: {file}"
-                                )
-                                continue
-
-                            try:
-                                cnf_dataset = to_cnf(file_id, cnf_dir)
-                                splot_dataset = to_splot(file_id, splot_dir)
-                                glencoe_dataset = to_glencoe(file_id, glencoe_dir)
-
-                                for transformed_file in [
-                                    cnf_dataset,
-                                    splot_dataset,
-                                    glencoe_dataset,
-                                ]:
-                                    if os.path.exists(transformed_file):
-                                        zipf.write(
-                                            transformed_file,
-                                            arcname=os.path.relpath(
-                                                transformed_file, temp_dir
-                                            ),
-                                        )
-                            except Exception as e:
-                                logging.error(
-                                    f"No se ha podido transformar el archivo {file}: {e}"
-                                )
-                                continue
-                        else:
-                            # Si no es UVL (por si existen otros archivos)
-                            # lo guardarmos en otra carpeta.
-                            # Aquí simplemente los copiamos a la carpeta correspondiente a su extensión.
-                            # Ejemplo:
-                            target_dir = None
-                            if ext == ".cnf":
-                                target_dir = cnf_dir
-                            elif ext == ".splot":
-                                target_dir = splot_dir
-                            elif ext == ".glencoe":
-                                target_dir = glencoe_dir
-                            else:
-                                target_dir = others_dir
-
-                            target_file_path = os.path.join(target_dir, relative_path)
-                            os.makedirs(
-                                os.path.dirname(target_file_path), exist_ok=True
-                            )
-                            shutil.copy(full_path, target_file_path)
-                            zipf.write(
-                                target_file_path,
-                                arcname=os.path.relpath(target_file_path, temp_dir),
-                            )
-
-        return send_file(
-            zip_path,
-            as_attachment=True,
-            mimetype="application/zip",
-            download_name="all_datasets.zip",
-        )
+        yield from raw_entries
+        yield from cached_entries
+        for uvl_path, results in conversions:
+            name = os.path.basename(uvl_path)
+            checksum = pending_checksums[uvl_path]
+            for format, content in results.items():
+                if checksum:
+                    source = transformation_cache_service.store(checksum, format, content)
+                else:
+                    source = content.encode("utf-8")
+                yield f"{format}/{name}_{format}.txt", source
     finally:
-        shutil.rmtree(temp_dir)
+        conversions.close()
 
 
 def to_glencoe(file_id, glencoe_dir):
-    hubfile = HubfileService().get_by_id(file_id)
-    model = UVLReader(hubfile.get_path()).transform()
-    glencoe_file_name = f"{hubfile.name}_glencoe.txt"
-    glencoe_full_path = os.path.join(glencoe_dir, glencoe_file_name)
-    GlencoeWriter(glencoe_full_path, model).transform()
-    return glencoe_full_path
+    return export_transformation(file_id, "glencoe", glencoe_dir)
 
 
 def to_splot(file_id, splot_dir):
-    hubfile = HubfileService().get_by_id(file_id)
-    model = UVLReader(hubfile.get_path()).transform()
-    splot_file_name = f"{hubfile.name}_splot.txt"
-    splot_full_path = os.path.join(splot_dir, splot_file_name)
-    SPLOTWriter(splot_full_path, model).transform()
-    return splot_full_path
+    return export_transformation(file_id, "splot", splot_dir)
 
 
 def to_cnf(file_id, cnf_dir):
+    return export_transformation(file_id, "cnf", cnf_dir)
+
+
+def export_transformation(file_id, format, target_dir):
     hubfile = HubfileService().get_by_id(file_id)
-    model = UVLReader(hubfile.get_path()).transform()
-    sat = FmToPysat(model).transform()
-    cnf_file_name = f"{hubfile.name}_cnf.txt"
-    cnf_full_path = os.path.join(cnf_dir, cnf_file_name)
-    DimacsWriter(cnf_full_path, sat).transform()
-    return cnf_full_path
+    source = transformation_cache_service.get_or_transform(hubfile, format)
+    full_path = os.path.join(target_dir, f"{hubfile.name}_{format}.txt")
+
+    if isinstance(source, bytes):
+        with open(full_path, "wb") as f:
+            f.write(source)
+    else:
+        shutil.copyfile(source, full_path)
+    return full_path
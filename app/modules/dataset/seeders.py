@@ -8,9 +8,9 @@ from app.modules.dataset.models import (
     DataSet,
     DSMetaData,
     PublicationType,
-    DSMetrics,
     Author,
 )
+from app.modules.dataset.services import DataSetService
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 
@@ -27,10 +27,6 @@ class DataSetSeeder(BaseSeeder):
         if not user1 or not user2:
             raise Exception("Users not found. Please seed users first.")
 
-        # Create DSMetrics instance
-        ds_metrics = DSMetrics(number_of_models="5", number_of_features="50")
-        seeded_ds_metrics = self.seed([ds_metrics])[0]
-
         # Create DSMetaData instances
         ds_meta_data_list = [
             DSMetaData(
@@ -41,7 +37,6 @@ class DataSetSeeder(BaseSeeder):
                 publication_doi=f"10.1234/dataset{i+1}",
                 dataset_doi=f"10.1234/dataset{i+1}",
                 tags="tag1, tag2",
-                ds_metrics_id=seeded_ds_metrics.id,
             )
             for i in range(4)
         ]
@@ -135,3 +130,6 @@ class DataSetSeeder(BaseSeeder):
                 feature_model_id=feature_model.id,
             )
             self.seed([uvl_file])
+
+        # Metrics and the identifier index are computed from the UVL files copied above
+        DataSetService().reanalyze_uvl_files()
@@ -1,13 +1,15 @@
+import io
 import logging
 import os
 import hashlib
 import shutil
 from typing import Optional
 import uuid
+from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
 from app.modules.hubfile.services import HubfileService
-from flask import request
+from flask import abort, current_app, request
 from app.modules.auth.services import AuthenticationService
-from app.modules.dataset.models import DSViewRecord, DataSet, DSMetaData
+from app.modules.dataset.models import DSMetrics, DSViewRecord, DataSet, DSMetaData
 from app.modules.dataset.repositories import (
     AuthorRepository,
     DOIMappingRepository,
@@ -16,17 +18,29 @@ from app.modules.dataset.repositories import (
     DSViewRecordRepository,
     DataSetRepository,
     RateRepository,
+    TagRepository,
 )
+from app.modules.featuremodel.models import FMMetrics
+from app.modules.flamapy.services import FlamapyService, UVLValidationService
 from app.modules.featuremodel.repositories import (
     FMMetaDataRepository,
     FeatureModelRepository,
+    UVLIdentifierRepository,
 )
 from app.modules.hubfile.repositories import (
     HubfileDownloadRecordRepository,
     HubfileRepository,
     HubfileViewRecordRepository,
 )
+from app.modules.dataset.signals import (
+    dataset_created,
+    dataset_synchronized,
+    dataset_updated,
+)
+from app.modules.public.models import HubCounter
+from app.modules.public.services import HubCounterService
 from core.services.BaseService import BaseService
+from core.services.DiskCacheService import DiskCacheService
 
 logger = logging.getLogger(__name__)
 
@@ -46,12 +60,15 @@ class DataSetService(BaseService):
         self.author_repository = AuthorRepository()
         self.dsmetadata_repository = DSMetaDataRepository()
         self.fmmetadata_repository = FMMetaDataRepository()
+        self.uvl_identifier_repository = UVLIdentifierRepository()
         self.dsdownloadrecord_repository = DSDownloadRecordRepository()
         self.hubfiledownloadrecord_repository = HubfileDownloadRecordRepository()
         self.hubfilerepository = HubfileRepository()
         self.dsviewrecord_repostory = DSViewRecordRepository()
         self.hubfileviewrecord_repository = HubfileViewRecordRepository()
         self.hubfile_service = HubfileService()
+        self.hub_counter_service = HubCounterService()
+        self.uvl_validation_service = UVLValidationService()
 
     def move_feature_models(self, dataset: DataSet):
         current_user = AuthenticationService().get_authenticated_user()
@@ -71,22 +88,34 @@ class DataSetService(BaseService):
     def is_synchronized(self, dataset_id: int) -> bool:
         return self.repository.is_synchronized(dataset_id)
 
-    def get_synchronized(self, current_user_id: int) -> DataSet:
-        return self.repository.get_synchronized(current_user_id)
+    def get_or_404(self, id, profile: Optional[str] = None) -> DataSet:
+        return self.repository.get_or_404(id, profile=profile)
+
+    def get_by_doi(self, doi: str, profile: Optional[str] = None) -> Optional[DataSet]:
+        return self.repository.get_by_doi(doi, profile=profile)
+
+    def get_all(self, profile: Optional[str] = None):
+        datasets = self.repository.get_all(profile=profile)
+        if not datasets:
+            abort(404, description="No datasets found")
+        return datasets
 
-    def get_unsynchronized(self, current_user_id: int) -> DataSet:
-        return self.repository.get_unsynchronized(current_user_id)
+    def get_synchronized(self, current_user_id: int, profile: Optional[str] = None) -> DataSet:
+        return self.repository.get_synchronized(current_user_id, profile=profile)
+
+    def get_unsynchronized(self, current_user_id: int, profile: Optional[str] = None) -> DataSet:
+        return self.repository.get_unsynchronized(current_user_id, profile=profile)
 
     def get_unsynchronized_dataset(
-        self, current_user_id: int, dataset_id: int
+        self, current_user_id: int, dataset_id: int, profile: Optional[str] = None
     ) -> DataSet:
-        return self.repository.get_unsynchronized_dataset(current_user_id, dataset_id)
+        return self.repository.get_unsynchronized_dataset(current_user_id, dataset_id, profile=profile)
 
-    def latest_synchronized(self):
-        return self.repository.latest_synchronized()
+    def latest_synchronized(self, profile: Optional[str] = None):
+        return self.repository.latest_synchronized(profile=profile)
 
     def count_synchronized_datasets(self):
-        return self.repository.count_synchronized_datasets()
+        return self.hub_counter_service.get(HubCounter.SYNCHRONIZED_DATASETS)
 
     def count_feature_models(self):
         return self.feature_model_service.count_feature_models()
@@ -98,10 +127,10 @@ class DataSetService(BaseService):
         return self.dsmetadata_repository.count()
 
     def total_dataset_downloads(self) -> int:
-        return self.dsdownloadrecord_repository.total_dataset_downloads()
+        return self.hub_counter_service.get(HubCounter.DATASET_DOWNLOADS)
 
     def total_dataset_views(self) -> int:
-        return self.dsviewrecord_repostory.total_dataset_views()
+        return self.hub_counter_service.get(HubCounter.DATASET_VIEWS)
 
     def create_from_form(self, form, current_user) -> DataSet:
         main_author = {
@@ -111,7 +140,11 @@ class DataSetService(BaseService):
         }
         try:
             logger.info(f"Creating dsmetadata...: {form.get_dsmetadata()}")
-            dsmetadata = self.dsmetadata_repository.create(**form.get_dsmetadata())
+            dsmetadata = self.dsmetadata_repository.create(commit=False, **form.get_dsmetadata())
+            if dsmetadata.dataset_doi:
+                # A DOI typed in the form publishes the dataset right away
+                self.hub_counter_service.increment(HubCounter.SYNCHRONIZED_DATASETS, commit=False)
+                self.hub_counter_service.increment(HubCounter.CATALOG_VERSION, commit=False)
             for author_data in [main_author] + form.get_authors():
                 author = self.author_repository.create(
                     commit=False, ds_meta_data_id=dsmetadata.id, **author_data
@@ -122,6 +155,7 @@ class DataSetService(BaseService):
                 commit=False, user_id=current_user.id, ds_meta_data_id=dsmetadata.id
             )
 
+            uvl_files = []
             for feature_model in form.feature_models:
                 uvl_filename = feature_model.uvl_filename.data
                 fmmetadata = self.fmmetadata_repository.create(
@@ -149,17 +183,109 @@ class DataSetService(BaseService):
                     feature_model_id=fm.id,
                 )
                 fm.files.append(file)
+                uvl_files.append((fm, fmmetadata, file_path))
+            self.analyze_uvl_files(dataset, dsmetadata, uvl_files)
+            self.hub_counter_service.increment(
+                HubCounter.FEATURE_MODELS, len(form.feature_models), commit=False
+            )
             self.repository.session.commit()
         except Exception as exc:
             logger.info(f"Exception creating dataset from form...: {exc}")
             self.repository.session.rollback()
             raise exc
+        dataset_created.send(current_app._get_current_object(), dataset=dataset)
         return dataset
 
-    def update_dsmetadata(self, id, **kwargs):
-        return self.dsmetadata_repository.update(id, **kwargs)
+    def analyze_uvl_files(self, dataset: DataSet, ds_meta_data: DSMetaData, uvl_files):
+        """
+        Parses each UVL file of a dataset once, given as (FeatureModel, FMMetaData,
+        path) triples, to store its metrics, index its identifiers and record its
+        syntax check.
+        """
+        flamapy_service = FlamapyService()
+        model_metrics = []
+        for feature_model, fm_meta_data, path in uvl_files:
+            for hubfile in feature_model.files:
+                self.uvl_validation_service.validate(hubfile.checksum, path, commit=False)
+            analysis = flamapy_service.analyze(path) or {}
+            model_metrics.append((fm_meta_data, analysis.get("metrics")))
+            self.uvl_identifier_repository.replace_feature_model(
+                feature_model.id, dataset.id, analysis.get("identifiers", {}), commit=False
+            )
+        return self.compute_metrics(ds_meta_data, model_metrics)
+
+    def compute_metrics(self, ds_meta_data: DSMetaData, model_metrics):
+        """
+        Stores the metrics of each model of a dataset, given as (FMMetaData,
+        metrics) pairs, and the dataset totals. Models that could not be parsed
+        come with None: they still count as models but add nothing to the other
+        totals.
+        """
+        computed = []
+        for fm_meta_data, metrics in model_metrics:
+            if metrics is None:
+                continue
+            computed.append(metrics)
+            if fm_meta_data is None:
+                continue
+            if fm_meta_data.fm_metrics is None:
+                fm_meta_data.fm_metrics = FMMetrics()
+            for name, value in metrics.items():
+                setattr(fm_meta_data.fm_metrics, name, value)
+
+        ds_metrics = ds_meta_data.ds_metrics
+        if ds_metrics is None or len(ds_metrics.ds_meta_data) > 1:
+            # Older seeds shared one row between datasets
+            ds_metrics = ds_meta_data.ds_metrics = DSMetrics()
+        ds_metrics.number_of_models = len(model_metrics)
+        ds_metrics.number_of_features = sum(metrics["number_of_features"] for metrics in computed)
+        ds_metrics.number_of_constraints = sum(metrics["number_of_constraints"] for metrics in computed)
+        ds_metrics.depth = max((metrics["depth"] for metrics in computed), default=0)
+        return ds_metrics
+
+    def reanalyze_uvl_files(self) -> int:
+        """Recomputes the metrics, identifier index and syntax checks of every dataset from its stored UVL files."""
+        datasets = self.repository.get_all(profile="export")
+        for dataset in datasets:
+            uvl_files = [
+                (feature_model, feature_model.fm_meta_data, feature_model.files[0].get_path())
+                for feature_model in dataset.feature_models
+                if feature_model.files
+            ]
+            self.analyze_uvl_files(dataset, dataset.ds_meta_data, uvl_files)
+        # Range and identifier filters see the new values, so cached explore results are stale
+        self.hub_counter_service.increment(HubCounter.CATALOG_VERSION, commit=False)
+        self.repository.session.commit()
+        logger.info(f"Reanalyzed the UVL files of {len(datasets)} datasets")
+        return len(datasets)
 
-    def get_uvlhub_doi(self, dataset: DataSet) -> str:
+    def update_dsmetadata(self, id, **kwargs):
+        dsmetadata = self.dsmetadata_repository.get_by_id(id)
+        if "dataset_doi" in kwargs:
+            kwargs["dataset_doi"] = DSMetaData.normalize_doi(kwargs["dataset_doi"])
+        synchronized = (
+            dsmetadata is not None
+            and "dataset_doi" in kwargs
+            and kwargs["dataset_doi"] != dsmetadata.dataset_doi
+        )
+        if synchronized:
+            # Publishing (or unpublishing) moves the synchronized datasets counter in the same commit
+            published = int(kwargs["dataset_doi"] is not None) - int(dsmetadata.dataset_doi is not None)
+            self.hub_counter_service.increment(
+                HubCounter.SYNCHRONIZED_DATASETS, published, commit=False
+            )
+        if synchronized or (dsmetadata is not None and dsmetadata.dataset_doi):
+            # Explore only lists published datasets, so only their changes invalidate cached results
+            self.hub_counter_service.increment(HubCounter.CATALOG_VERSION, commit=False)
+        updated = self.dsmetadata_repository.update(id, **kwargs)
+        if updated is not None:
+            dataset_updated.send(current_app._get_current_object(), ds_meta_data_id=id)
+        if synchronized:
+            dataset_synchronized.send(current_app._get_current_object(), ds_meta_data_id=id)
+        return updated
+
+    @staticmethod
+    def get_uvlhub_doi(dataset: DataSet) -> str:
         domain = os.getenv("DOMAIN", "localhost")
         return f"http://{domain}/doi/{dataset.ds_meta_data.dataset_doi}"
 
@@ -176,6 +302,9 @@ class DSDownloadRecordService(BaseService):
     def __init__(self):
         super().__init__(DSDownloadRecordRepository())
 
+    def record_download(self, dataset_id: int, user_id: Optional[int], user_cookie: str):
+        return self.repository.record_download(dataset_id, user_id, user_cookie)
+
 
 class DSMetaDataService(BaseService):
     def __init__(self):
@@ -204,12 +333,8 @@ class DSViewRecordService(BaseService):
         if not user_cookie:
             user_cookie = str(uuid.uuid4())
 
-        existing_record = self.the_record_exists(
-            dataset=dataset, user_cookie=user_cookie
-        )
-
-        if not existing_record:
-            self.create_new_record(dataset=dataset, user_cookie=user_cookie)
+        # Deduplicated and written in bulk by the record buffer, off the request path
+        self.repository.record_view(dataset=dataset, user_cookie=user_cookie)
 
         return user_cookie
 
@@ -226,6 +351,14 @@ class DOIMappingService(BaseService):
             return None
 
 
+class TagService(BaseService):
+    def __init__(self):
+        super().__init__(TagRepository())
+
+    def tag_cloud(self, limit: int = 50) -> list:
+        return [{"name": name, "count": count} for name, count in self.repository.tag_cloud(limit)]
+
+
 class SizeService:
 
     def __init__(self):
@@ -242,6 +375,108 @@ class SizeService:
             return f"{round(size / (1024 ** 3), 2)} GB"
 
 
+class _ZipStreamBuffer(io.RawIOBase):
+    """Write-only sink that keeps the bytes produced by ZipFile until they are drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStreamService:
+    """
+    Builds ZIP archives incrementally so they can be sent to the client while
+    they are being compressed. Nothing is written to disk and only one chunk
+    of the archive is held in memory at a time.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self):
+        pass
+
+    def directory_entries(self, directory: str, prefix: str = ""):
+        for subdir, dirs, files in os.walk(directory):
+            for file in files:
+                full_path = os.path.join(subdir, file)
+                relative_path = os.path.relpath(full_path, directory)
+                yield os.path.join(prefix, relative_path), full_path
+
+    def stream(self, entries):
+        """
+        Yields the bytes of a ZIP archive built from ``(arcname, source)`` pairs,
+        where ``source`` is either a path on disk or the content as ``bytes``.
+        """
+        buffer = _ZipStreamBuffer()
+        with ZipFile(buffer, "w", compression=ZIP_DEFLATED) as zipf:
+            for arcname, source in entries:
+                if isinstance(source, bytes):
+                    zipf.writestr(arcname, source)
+                else:
+                    zinfo = ZipInfo.from_file(source, arcname)
+                    zinfo.compress_type = ZIP_DEFLATED
+                    with open(source, "rb") as src, zipf.open(zinfo, "w") as dest:
+                        while chunk := src.read(self.CHUNK_SIZE):
+                            dest.write(chunk)
+                            data = buffer.drain()
+                            if data:
+                                yield data
+                data = buffer.drain()
+                if data:
+                    yield data
+        yield buffer.drain()
+
+
+class ArchiveCacheService(DiskCacheService):
+    """
+    Disk-backed cache of prebuilt ZIP archives. Archives are addressed by the
+    checksums of the files they contain, so any change in those files produces a
+    new key and the stale archive simply ages out of the cache.
+    """
+
+    dir_config_key = "ARCHIVE_CACHE_DIR"
+    max_bytes_config_key = "ARCHIVE_CACHE_MAX_BYTES"
+    suffix = ".zip"
+
+    def __init__(self):
+        self.zip_stream_service = ZipStreamService()
+
+    def fingerprints(self, entries, checksums: dict):
+        """
+        Pairs every ``(arcname, path)`` entry with the stored checksum of its file.
+        Files without a Hubfile record fall back to their size and mtime.
+        """
+        for arcname, path in entries:
+            checksum = checksums.get(os.path.basename(path))
+            if checksum is None:
+                stat = os.stat(path)
+                checksum = f"{stat.st_size}-{stat.st_mtime_ns}"
+            yield arcname, checksum
+
+    def key_for(self, fingerprints) -> str:
+        digest = hashlib.sha256()
+        for arcname, checksum in sorted(fingerprints):
+            digest.update(f"{arcname}\0{checksum}\n".encode())
+        return digest.hexdigest()
+
+    def get_or_build(self, key: str, entries) -> str:
+        path = self.get(key)
+        if path:
+            return path
+        return self.put(key, self.zip_stream_service.stream(entries))
+
+
 class RateDataSetService(BaseService):
     def __init__(self):
         self.repository = RateRepository()
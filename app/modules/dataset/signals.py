@@ -0,0 +1,12 @@
+from blinker import Namespace
+
+dataset_signals = Namespace()
+
+# Sent with the new DataSet once it has been committed
+dataset_created = dataset_signals.signal("dataset-created")
+
+# Sent with the DSMetaData id whenever the metadata of a dataset changes
+dataset_updated = dataset_signals.signal("dataset-updated")
+
+# Sent with the DSMetaData id whenever a dataset gets (or changes) its DOI
+dataset_synchronized = dataset_signals.signal("dataset-synchronized")
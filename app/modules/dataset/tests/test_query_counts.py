@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import Hubfile
+from app.modules.profile.models import UserProfile
+
+DOI = "10.1234/query-counts"
+
+
+@pytest.fixture(scope="module")
+def test_client(test_client):
+    """
+    Extends the test_client fixture with a published dataset whose number of files grows between measurements.
+    """
+    with test_client.application.app_context():
+        user = User(email="query_counts@example.com", password="test1234")
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(UserProfile(user_id=user.id, name="Query", surname="Counts"))
+
+        ds_meta_data = DSMetaData(
+            title="Query counts dataset",
+            description="Dataset used to measure queries per page",
+            publication_type=PublicationType.NONE,
+            dataset_doi=DOI,
+            tags="benchmark",
+        )
+        db.session.add(ds_meta_data)
+        db.session.commit()
+        for index in range(2):
+            ds_meta_data.authors.append(Author(name=f"Author {index}", affiliation="Sevilla"))
+
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=ds_meta_data.id)
+        db.session.add(dataset)
+        db.session.commit()
+
+        test_client.query_counts_dataset_id = dataset.id
+        add_files(dataset.id, 1)
+
+    yield test_client
+
+
+def add_files(dataset_id, count):
+    for index in range(count):
+        feature_model = FeatureModel(data_set_id=dataset_id)
+        db.session.add(feature_model)
+        db.session.commit()
+        for name in ("a", "b"):
+            db.session.add(
+                Hubfile(
+                    name=f"model_{feature_model.id}_{name}.uvl",
+                    checksum=f"{feature_model.id}{name}",
+                    size=10,
+                    feature_model_id=feature_model.id,
+                )
+            )
+        db.session.commit()
+
+
+def count_queries(test_client, method, url, **kwargs):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    # Every request starts without cookies so view records are written each time
+    test_client.delete_cookie("view_cookie")
+    db.session.expire_all()
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = test_client.open(url, method=method, **kwargs)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize(
+    "method, url, kwargs",
+    [
+        ("GET", f"/doi/{DOI}/", {}),
+        ("GET", "/", {}),
+        ("POST", "/explore", {"json": {"query": ""}}),
+        ("POST", "/explore", {"json": {"query": "", "fields": "full"}}),
+    ],
+)
+def test_queries_per_page_do_not_grow_with_files(test_client, method, url, kwargs):
+    # The first request also pays for one-off work such as creating counters
+    count_queries(test_client, method, url, **kwargs)
+    before = count_queries(test_client, method, url, **kwargs)
+
+    add_files(test_client.query_counts_dataset_id, 5)
+    after = count_queries(test_client, method, url, **kwargs)
+
+    assert after == before
@@ -1,19 +1,22 @@
 import io
 import shutil
 from zipfile import ZipFile
+from sqlalchemy.dialects import mysql
 import pytest
 import os
 import json
 from app import db
 from app.modules.auth.models import User
-from app.modules.featuremodel.models import FeatureModel
+from app.modules.featuremodel.models import FeatureModel, FMMetaData, UVLIdentifier
 from app.modules.hubfile.models import Hubfile
 from app.modules.dataset.models import (
     DSMetaData,
     PublicationType,
     DataSet,
+    Tag,
 )
 from app.modules.dataset.routes import to_glencoe, to_splot, to_cnf
+from app.modules.dataset.services import ArchiveCacheService, DataSetService
 
 """
 -------------------------
@@ -153,6 +156,133 @@ def test_download_all_datasets(test_client):
     delete_folder(user, dataset)
 
 
+def test_download_dataset_streams_zip(test_client, monkeypatch):
+    user = create_user(email="test_user_stream@example.com", password="password123")
+    dataset = create_dataset(user_id=user.id)
+    feature_model = create_feature_model(dataset.id)
+    hubfile = create_hubfile("file100.uvl", feature_model.id, user.id, dataset.id)
+
+    def fail_mkdtemp(*args, **kwargs):
+        raise AssertionError("The dataset ZIP must not be staged in a temp dir")
+
+    monkeypatch.setattr("tempfile.mkdtemp", fail_mkdtemp)
+
+    response = test_client.get(f"/dataset/download/{dataset.id}")
+
+    assert response.status_code == 200, "La descarga del dataset falló."
+    assert response.is_streamed, "El ZIP del dataset no se envía en streaming."
+    assert (
+        f"dataset_{dataset.id}.zip" in response.headers["Content-Disposition"]
+    ), "El archivo ZIP no tiene el nombre esperado."
+
+    with ZipFile(io.BytesIO(response.data)) as zipf:
+        assert zipf.namelist() == [f"dataset_{dataset.id}/file100.uvl"]
+        assert zipf.read(f"dataset_{dataset.id}/file100.uvl").startswith(b"features")
+
+    db.session.delete(hubfile)
+    db.session.delete(dataset)
+    db.session.delete(user)
+    db.session.commit()
+    delete_folder(user, dataset)
+
+
+def test_download_dataset_reuses_cached_archive(test_client, monkeypatch, tmp_path):
+    monkeypatch.setitem(test_client.application.config, "ARCHIVE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setitem(test_client.application.config, "ARCHIVE_CACHE_MAX_BYTES", 1024 * 1024)
+    user = create_user(email="test_user_cache@example.com", password="password123")
+    dataset = create_dataset(user_id=user.id)
+    feature_model = create_feature_model(dataset.id)
+    hubfile = create_hubfile("file100.uvl", feature_model.id, user.id, dataset.id)
+
+    first = test_client.get(f"/dataset/download/{dataset.id}")
+    cached_archives = os.listdir(tmp_path)
+    second = test_client.get(f"/dataset/download/{dataset.id}")
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert first.data == second.data, "La descarga cacheada no coincide con la original."
+    assert len(cached_archives) == 1, "El ZIP del dataset no se guardó en la caché."
+    assert os.listdir(tmp_path) == cached_archives, "La segunda descarga reconstruyó el ZIP."
+
+    # A new checksum means a new archive
+    hubfile.checksum = "654321"
+    db.session.commit()
+    test_client.get(f"/dataset/download/{dataset.id}")
+    assert len(os.listdir(tmp_path)) == 2, "La caché no se invalidó al cambiar el checksum."
+
+    db.session.delete(hubfile)
+    db.session.delete(dataset)
+    db.session.delete(user)
+    db.session.commit()
+    delete_folder(user, dataset)
+
+
+def test_archive_cache_evicts_least_recently_used(test_client, monkeypatch, tmp_path):
+    config = test_client.application.config
+    monkeypatch.setitem(config, "ARCHIVE_CACHE_DIR", str(tmp_path))
+    file_path = tmp_path / "file.uvl"
+    file_path.write_bytes(os.urandom(4096))
+    entries = [("file.uvl", str(file_path))]
+
+    archive_cache_service = ArchiveCacheService()
+    oldest = archive_cache_service.get_or_build("a", entries)
+    os.utime(oldest, (0, 0))
+    monkeypatch.setitem(config, "ARCHIVE_CACHE_MAX_BYTES", os.path.getsize(oldest) + 1)
+    newest = archive_cache_service.get_or_build("b", entries)
+
+    assert not os.path.exists(oldest), "El ZIP menos usado no fue desalojado."
+    assert os.path.exists(newest)
+
+
+def test_download_all_datasets_includes_conversions(test_client):
+    user = create_user(email="test_user_all_conv@example.com", password="password123")
+    dataset = create_dataset(user_id=user.id)
+    feature_model = create_feature_model(dataset.id)
+    hubfile = create_hubfile("file100.uvl", feature_model.id, user.id, dataset.id)
+
+    response = test_client.get("/dataset/download/all")
+
+    assert response.status_code == 200, "La descarga de todos los datasets falló."
+    with ZipFile(io.BytesIO(response.data)) as zipf:
+        file_list = zipf.namelist()
+        for expected in [
+            "uvl/file100.uvl",
+            "cnf/file100.uvl_cnf.txt",
+            "splot/file100.uvl_splot.txt",
+            "glencoe/file100.uvl_glencoe.txt",
+        ]:
+            assert expected in file_list, f"{expected} no se encontró en el ZIP."
+        assert zipf.read("cnf/file100.uvl_cnf.txt").startswith(b"p cnf 10 18")
+
+    db.session.delete(hubfile)
+    db.session.delete(dataset)
+    db.session.delete(user)
+    db.session.commit()
+    delete_folder(user, dataset)
+
+
+def test_download_dataset_not_modified(test_client):
+    user = create_user(email="test_user_etag@example.com", password="password123")
+    dataset = create_dataset(user_id=user.id)
+    feature_model = create_feature_model(dataset.id)
+    hubfile = create_hubfile("file100.uvl", feature_model.id, user.id, dataset.id)
+
+    response = test_client.get(f"/dataset/download/{dataset.id}")
+    etag = response.headers["ETag"]
+    assert "no-cache" in response.headers["Cache-Control"], "Un dataset sin publicar no debe cachearse."
+
+    response = test_client.get(
+        f"/dataset/download/{dataset.id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304, "El ZIP sin cambios debería responder 304."
+    assert response.data == b""
+
+    db.session.delete(hubfile)
+    db.session.delete(dataset)
+    db.session.delete(user)
+    db.session.commit()
+    delete_folder(user, dataset)
+
+
 """
 -------------------------
 PARSING
@@ -482,3 +612,76 @@ c 10 "Media Player"
     db.session.delete(user)
     db.session.commit()
     delete_folder(user, dataset)
+
+
+def test_tags_are_normalized_into_shared_rows(test_client):
+    first = DSMetaData(
+        title="Tagged", description="d", publication_type=PublicationType.NONE, tags="Cars, automotive,cars,"
+    )
+    second = DSMetaData(title="Tagged too", description="d", publication_type=PublicationType.NONE, tags="cars")
+    db.session.add_all([first, second])
+    db.session.commit()
+
+    assert first.tag_names() == ["automotive", "cars"]
+    # Shown and published as typed; only lookups use the normalized names
+    assert first.tag_labels() == ["Cars", "automotive"]
+    assert second.tag_list == [Tag.query.filter_by(name="cars").one()]
+
+    DataSetService().update_dsmetadata(second.id, tags="trucks, Automotive")
+
+    assert second.tag_names() == ["automotive", "trucks"]
+    assert Tag.query.filter(Tag.name.in_(["automotive", "cars", "trucks"])).count() == 3
+
+
+def test_tag_names_differing_in_accents_are_distinct(test_client):
+    ds_meta_data = DSMetaData(
+        title="Accents", description="d", publication_type=PublicationType.NONE, tags="café, cafe"
+    )
+    db.session.add(ds_meta_data)
+    db.session.commit()
+
+    assert ds_meta_data.tag_names() == ["cafe", "café"]
+    # The database default collation would treat both names as equal in the unique index
+    assert Tag.__table__.c.name.type.dialect_impl(mysql.dialect()).collation == "utf8mb4_bin"
+
+
+def test_uvl_files_are_analyzed_into_metrics_and_identifiers(test_client, tmp_path):
+    uvl_path = tmp_path / "model.uvl"
+    shutil.copy(os.path.join(os.path.dirname(__file__), "..", "uvl_examples", "file1.uvl"), uvl_path)
+    broken_path = tmp_path / "broken.uvl"
+    broken_path.write_text("features\n    Root\n        nonsense\n")
+
+    user = User(email="analyzed@example.com", password="test1234")
+    ds_meta_data = DSMetaData(title="Measured", description="d", publication_type=PublicationType.NONE)
+    fm_meta_data = FMMetaData(
+        uvl_filename="model.uvl", title="Model", description="d", publication_type=PublicationType.NONE
+    )
+    db.session.add_all([user, ds_meta_data, fm_meta_data])
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=ds_meta_data.id)
+    db.session.add(dataset)
+    db.session.flush()
+    parsed = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta_data.id)
+    broken = FeatureModel(data_set_id=dataset.id)
+    db.session.add_all([parsed, broken])
+    db.session.flush()
+    parsed.files.append(Hubfile(name="model.uvl", checksum="analyzed-checksum", size=1, feature_model_id=parsed.id))
+
+    ds_metrics = DataSetService().analyze_uvl_files(
+        dataset, ds_meta_data, [(parsed, fm_meta_data, str(uvl_path)), (broken, None, str(broken_path))]
+    )
+    db.session.commit()
+
+    assert (fm_meta_data.fm_metrics.number_of_features, fm_meta_data.fm_metrics.number_of_constraints) == (10, 2)
+    assert fm_meta_data.fm_metrics.depth == 2
+    assert ds_meta_data.ds_metrics is ds_metrics
+    assert (ds_metrics.number_of_models, ds_metrics.number_of_features, ds_metrics.depth) == (2, 10, 2)
+
+    identifiers = UVLIdentifier.query.filter_by(data_set_id=dataset.id).all()
+    assert {identifier.feature_model_id for identifier in identifiers} == {parsed.id}
+    names = {(identifier.kind, identifier.name) for identifier in identifiers}
+    assert ("feature", "peer 2 peer") in names
+    assert ("constraint", "media player") in names
+    assert ("constraint", "chat") not in names
+    assert len([kind for kind, _ in names if kind == "feature"]) == 10
+    assert parsed.files[0].validation.valid
@@ -2,6 +2,8 @@ document.addEventListener('DOMContentLoaded', () => {
     send_query();
 });
 
+let next_cursor = null;
+
 function send_query() {
 
     console.log("send query...")
@@ -13,127 +15,190 @@ function send_query() {
     const filters = document.querySelectorAll('#filters input, #filters select, #filters [type="radio"]');
 
     filters.forEach(filter => {
+        if (filter.id === 'query') {
+            return;
+        }
         filter.addEventListener('input', () => {
-            const csrfToken = document.getElementById('csrf_token').value;
-
-            const searchCriteria = {
-                csrf_token: csrfToken,
-                query: document.querySelector('#query').value,
-                publication_type: document.querySelector('#publication_type').value,
-                sorting: document.querySelector('[name="sorting"]:checked').value,
-                number_of_features: document.querySelector('#number_of_features').value,
-                number_of_models: document.querySelector('#number_of_models').value, 
-
-            };            
-
-            console.log(document.querySelector('#publication_type').value);
-
-            fetch('/explore', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(searchCriteria),
-            })
-                .then(response => response.json())
-                .then(data => {
-
-                    console.log(data);
-                    document.getElementById('results').innerHTML = '';
-
-                    // results counter
-                    const resultCount = data.length;
-                    const resultText = resultCount === 1 ? 'dataset' : 'datasets';
-                    document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
-
-                    if (resultCount === 0) {
-                        console.log("show not found icon");
-                        document.getElementById("results_not_found").style.display = "block";
-                    } else {
-                        document.getElementById("results_not_found").style.display = "none";
-                    }
-
-
-                    data.forEach(dataset => {
-                        let card = document.createElement('div');
-                        card.className = 'col-12';
-                        card.innerHTML = `
-                            <div class="card">
-                                <div class="card-body">
-                                    <div class="d-flex align-items-center justify-content-between">
-                                        <h3><a href="${dataset.url}">${dataset.title}</a></h3>
-                                        <div>
-                                            <span class="badge bg-primary" style="cursor: pointer;" onclick="set_publication_type_as_query('${dataset.publication_type}')">${dataset.publication_type}</span>
-                                        </div>
-                                    </div>
-                                    <p class="text-secondary">${formatDate(dataset.created_at)}</p>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Description
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            <p class="card-text">${dataset.description}</p>
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Authors
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            ${dataset.authors.map(author => `
-                                                <p class="p-0 m-0">${author.name}${author.affiliation ? ` (${author.affiliation})` : ''}${author.orcid ? ` (${author.orcid})` : ''}</p>
-                                            `).join('')}
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Tags
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            ${dataset.tags.map(tag => `<span class="badge bg-primary me-1" style="cursor: pointer;" onclick="set_tag_as_query('${tag}')">${tag}</span>`).join('')}
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row">
-
-                                        <div class="col-md-4 col-12">
-
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                View dataset
-                                            </a>
-                                            <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                Download (${dataset.total_size_in_human_format})
-                                            </a>
-                                        </div>
-
-
-                                    </div>
+            fetch_results(null);
+        });
+    });
+
+    // Typing only asks for suggestions; the full search runs once the user pauses
+    let search_timer = null;
+    document.getElementById('query').addEventListener('input', (event) => {
+        fetch_suggestions(event.target.value);
+        clearTimeout(search_timer);
+        search_timer = setTimeout(() => fetch_results(null), event.isTrusted ? 300 : 0);
+    });
+
+    document.getElementById('load_more').addEventListener('click', () => {
+        fetch_results(next_cursor);
+    });
+}
+
+function fetch_suggestions(prefix) {
+    const datalist = document.getElementById('query_suggestions');
+    if (prefix.trim().length < 2) {
+        datalist.innerHTML = '';
+        return;
+    }
+
+    fetch(`/explore/suggest?q=${encodeURIComponent(prefix)}`)
+        .then(response => response.json())
+        .then(data => {
+            datalist.innerHTML = '';
+            data.suggestions.forEach(suggestion => {
+                const option = document.createElement('option');
+                option.value = suggestion;
+                datalist.appendChild(option);
+            });
+        });
+}
+
+function fetch_results(cursor) {
+    const csrfToken = document.getElementById('csrf_token').value;
+
+    const searchCriteria = {
+        csrf_token: csrfToken,
+        query: document.querySelector('#query').value,
+        publication_type: document.querySelector('#publication_type').value,
+        sorting: document.querySelector('[name="sorting"]:checked').value,
+        number_of_features: document.querySelector('#number_of_features').value,
+        number_of_models: document.querySelector('#number_of_models').value,
+        min_features: document.querySelector('#min_features').value,
+        max_features: document.querySelector('#max_features').value,
+        cursor: cursor,
+        facets: !cursor,
+    };
+
+    fetch('/explore', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(searchCriteria),
+    })
+        .then(response => response.json())
+        .then(data => {
+
+            console.log(data);
+
+            // A new search replaces the results, a cursor appends the next page
+            if (!cursor) {
+                document.getElementById('results').innerHTML = '';
+
+                // results counter
+                const resultCount = data.total;
+                const resultText = resultCount === 1 ? 'dataset' : 'datasets';
+                document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
+
+                if (resultCount === 0) {
+                    console.log("show not found icon");
+                    document.getElementById("results_not_found").style.display = "block";
+                } else {
+                    document.getElementById("results_not_found").style.display = "none";
+                }
+            }
+
+            if (data.facets) {
+                show_facet_counts(data.facets);
+            }
+
+            next_cursor = data.next_cursor;
+            document.getElementById('load_more').style.display = next_cursor ? 'inline-block' : 'none';
+
+            data.datasets.forEach(dataset => {
+                let card = document.createElement('div');
+                card.className = 'col-12';
+                card.innerHTML = `
+                    <div class="card">
+                        <div class="card-body">
+                            <div class="d-flex align-items-center justify-content-between">
+                                <h3><a href="${dataset.url}">${dataset.title}</a></h3>
+                                <div>
+                                    <span class="badge bg-primary" style="cursor: pointer;" onclick="set_publication_type_as_query('${dataset.publication_type}')">${dataset.publication_type}</span>
+                                </div>
+                            </div>
+                            <p class="text-secondary">${formatDate(dataset.created_at)}</p>
+
+                            <div class="row mb-2">
+
+                                <div class="col-md-4 col-12">
+                                    <span class=" text-secondary">
+                                        Description
+                                    </span>
+                                </div>
+                                <div class="col-md-8 col-12">
+                                    <p class="card-text">${dataset.description}</p>
+                                </div>
+
+                            </div>
 
+                            <div class="row mb-2">
+
+                                <div class="col-md-4 col-12">
+                                    <span class=" text-secondary">
+                                        Authors
+                                    </span>
+                                </div>
+                                <div class="col-md-8 col-12">
+                                    ${dataset.authors.map(author => `
+                                        <p class="p-0 m-0">${author.name}${author.affiliation ? ` (${author.affiliation})` : ''}${author.orcid ? ` (${author.orcid})` : ''}</p>
+                                    `).join('')}
+                                </div>
+
+                            </div>
+
+                            <div class="row mb-2">
+
+                                <div class="col-md-4 col-12">
+                                    <span class=" text-secondary">
+                                        Tags
+                                    </span>
+                                </div>
+                                <div class="col-md-8 col-12">
+                                    ${dataset.tags.map(tag => `<span class="badge bg-primary me-1" style="cursor: pointer;" onclick="set_tag_as_query('${tag}')">${tag}</span>`).join('')}
                                 </div>
+
                             </div>
-                        `;
 
-                        document.getElementById('results').appendChild(card);
-                    });
-                });
+                            <div class="row">
+
+                                <div class="col-md-4 col-12">
+
+                                </div>
+                                <div class="col-md-8 col-12">
+                                    <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                                        View dataset
+                                    </a>
+                                    <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                                        Download (${dataset.total_size_in_human_format})
+                                    </a>
+                                </div>
+
+
+                            </div>
+
+                        </div>
+                    </div>
+                `;
+
+                document.getElementById('results').appendChild(card);
+            });
         });
+}
+
+function show_facet_counts(facets) {
+    // Each publication type shows how many results choosing it would give
+    document.querySelectorAll('#publication_type option').forEach(option => {
+        if (!option.dataset.label) {
+            option.dataset.label = option.textContent;
+        }
+        if (option.value === 'any') {
+            return;
+        }
+        const count = facets.publication_type[option.value] || 0;
+        option.textContent = `${option.dataset.label} (${count})`;
     });
 }
 
@@ -176,6 +241,9 @@ function clearFilters() {
     let numberOfModelsInput = document.querySelector('#number_of_models');
     numberOfModelsInput.value = "";
 
+    document.querySelector('#min_features').value = "";
+    document.querySelector('#max_features').value = "";
+
     // Reset the publication type to its default value
     let publicationTypeSelect = document.querySelector('#publication_type');
     publicationTypeSelect.value = "any"; // replace "any" with whatever your default value is
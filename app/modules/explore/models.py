@@ -0,0 +1,33 @@
+from app import db
+
+
+class SearchDocument(db.Model):
+    """Length of the indexed text of a dataset, used to normalise BM25 scores."""
+
+    __tablename__ = "search_document"
+
+    dataset_id = db.Column(
+        db.Integer, db.ForeignKey("data_set.id", ondelete="CASCADE"), primary_key=True
+    )
+    length = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"SearchDocument<dataset={self.dataset_id}, length={self.length}>"
+
+
+class SearchPosting(db.Model):
+    """Weighted number of occurrences of a term in a dataset."""
+
+    __tablename__ = "search_posting"
+
+    term = db.Column(db.String(64), primary_key=True)
+    dataset_id = db.Column(
+        db.Integer,
+        db.ForeignKey("data_set.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+    frequency = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"SearchPosting<{self.term}, dataset={self.dataset_id}, frequency={self.frequency}>"
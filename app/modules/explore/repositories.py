@@ -1,20 +1,189 @@
+import math
 import re
-from sqlalchemy import any_, or_
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import and_, case, func, insert, or_, select, true, tuple_
 import unidecode
 from app.modules.dataset.models import (
-    Author,
     DSMetaData,
     DataSet,
     PublicationType,
     DSMetrics,
+    Tag,
+    ds_meta_data_tag,
 )
-from app.modules.featuremodel.models import FMMetaData, FeatureModel
+from app.modules.dataset.repositories import TagRepository, load_profile
+from app.modules.explore.models import SearchDocument, SearchPosting
+from app.modules.featuremodel.models import UVLIdentifier
+from app.modules.featuremodel.repositories import UVLIdentifierRepository
 from core.repositories.BaseRepository import BaseRepository
 
+TERM_PATTERN = re.compile(r"[a-z0-9]+")
+MAX_TERM_LENGTH = 64
+
+# feature:Name and constraint:Name terms; names with spaces go in double quotes
+IDENTIFIER_FILTER_PATTERN = re.compile(r'\b(feature|constraint):(?:"([^"]*)"|(\S+))', re.IGNORECASE)
+
+# BM25 parameters: term frequency saturation and document length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+# Metrics that explore filters by range, as min_<name> and max_<name> criteria
+METRIC_RANGE_COLUMNS = {
+    "features": DSMetrics.number_of_features,
+    "models": DSMetrics.number_of_models,
+    "constraints": DSMetrics.number_of_constraints,
+    "depth": DSMetrics.depth,
+}
+
+
+# Facet buckets of the model and feature counts as (min, max) bounds, max None meaning
+# unbounded. Each bucket is labelled "min-max" or "min+", so choosing it maps straight
+# onto the min_<name> and max_<name> filters.
+METRIC_FACET_BUCKETS = {
+    "models": ((0, 1), (2, 5), (6, 10), (11, 50), (51, None)),
+    "features": ((0, 10), (11, 50), (51, 100), (101, 500), (501, None)),
+}
+
+
+def metric_bucket(name):
+    """SQL expression with the facet bucket label of metric ``name``, NULL without metrics."""
+    column = METRIC_RANGE_COLUMNS[name]
+    whens = []
+    for low, high in METRIC_FACET_BUCKETS[name]:
+        if high is None:
+            whens.append((column >= low, f"{low}+"))
+        else:
+            whens.append((column.between(low, high), f"{low}-{high}"))
+    return case(*whens, else_=None)
+
+
+def metric_ranges(criteria) -> Dict[str, int]:
+    """The min_/max_ metric bounds present in ``criteria``, as integers."""
+    return {
+        f"{bound}_{name}": int(criteria[f"{bound}_{name}"])
+        for name in METRIC_RANGE_COLUMNS
+        for bound in ("min", "max")
+        if criteria.get(f"{bound}_{name}") not in (None, "")
+    }
+
+
+def identifier_filters(query) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Splits the feature: and constraint: terms out of a query. Returns the rest of
+    the query and the sorted (kind, normalized name) pairs it asked for.
+    """
+    filters = set()
+
+    def collect(match):
+        name = UVLIdentifier.normalize(match.group(2) if match.group(2) is not None else match.group(3))
+        if name:
+            filters.add((match.group(1).lower(), name))
+        return " "
+
+    text = IDENTIFIER_FILTER_PATTERN.sub(collect, query or "")
+    return text, sorted(filters)
+
+
+def tokenize(text) -> List[str]:
+    # Normalize and keep alphanumeric runs only
+    normalized = unidecode.unidecode(text or "").lower()
+    return [term[:MAX_TERM_LENGTH] for term in TERM_PATTERN.findall(normalized)]
+
+
+class SearchIndexRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(SearchDocument)
+
+    def replace_document(self, dataset_id: int, terms: Dict[str, int], commit: bool = True):
+        self.remove_document(dataset_id, commit=False)
+        self.session.add(SearchDocument(dataset_id=dataset_id, length=sum(terms.values())))
+        if terms:
+            self.session.execute(
+                insert(SearchPosting),
+                [
+                    {"term": term, "dataset_id": dataset_id, "frequency": frequency}
+                    for term, frequency in terms.items()
+                ],
+            )
+        if commit:
+            self.session.commit()
+
+    def remove_document(self, dataset_id: int, commit: bool = True):
+        SearchPosting.query.filter_by(dataset_id=dataset_id).delete()
+        SearchDocument.query.filter_by(dataset_id=dataset_id).delete()
+        if commit:
+            self.session.commit()
+
+    def clear(self, commit: bool = True):
+        SearchPosting.query.delete()
+        SearchDocument.query.delete()
+        if commit:
+            self.session.commit()
+
+    def matching_ids(self, words: Iterable[str]):
+        """
+        The ids of the datasets with a term prefixed by any of ``words``, as a
+        subquery the caller filters on so the database does the matching.
+        """
+        return select(SearchPosting.dataset_id).where(
+            or_(*[SearchPosting.term.like(f"{word}%") for word in dict.fromkeys(words)])
+        )
+
+    def search(self, words: Iterable[str]) -> Dict[int, float]:
+        """
+        Scores every dataset matching at least one word with BM25. Words match
+        indexed terms by prefix, which keeps the term index usable while still
+        finding partial words as the old ILIKE search did.
+        """
+        words = list(dict.fromkeys(words))
+        if not words:
+            return {}
+
+        document_count, average_length = self.session.query(
+            func.count(SearchDocument.dataset_id), func.avg(SearchDocument.length)
+        ).one()
+        if not document_count:
+            return {}
+        average_length = float(average_length) or 1.0
+
+        postings = (
+            self.session.query(
+                SearchPosting.term,
+                SearchPosting.dataset_id,
+                SearchPosting.frequency,
+                SearchDocument.length,
+            )
+            .join(SearchDocument, SearchDocument.dataset_id == SearchPosting.dataset_id)
+            .filter(or_(*[SearchPosting.term.like(f"{word}%") for word in words]))
+            .all()
+        )
+
+        # Term frequency of each query word per dataset, summed over the terms it prefixes
+        frequencies = defaultdict(lambda: defaultdict(int))
+        lengths = {}
+        for term, dataset_id, frequency, length in postings:
+            lengths[dataset_id] = length
+            for word in words:
+                if term.startswith(word):
+                    frequencies[word][dataset_id] += frequency
+
+        scores = defaultdict(float)
+        for word, matches in frequencies.items():
+            idf = math.log(1 + (document_count - len(matches) + 0.5) / (len(matches) + 0.5))
+            for dataset_id, frequency in matches.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[dataset_id] / average_length)
+                scores[dataset_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return dict(scores)
+
 
 class ExploreRepository(BaseRepository):
     def __init__(self):
         super().__init__(DataSet)
+        # Scores per query, so repeated relevance orderings share one index lookup
+        self._scores = {}
 
     def filter(
         self,
@@ -26,36 +195,191 @@ class ExploreRepository(BaseRepository):
         number_of_models="",
         **kwargs,
     ):
-        # Normalize and remove unwanted characters
-        normalized_query = unidecode.unidecode(query).lower()
-        cleaned_query = re.sub(r'[,.":\'()\[\]^;!¡¿?]', "", normalized_query)
-
-        filters = []
-        for word in cleaned_query.split():
-            filters.append(DSMetaData.title.ilike(f"%{word}%"))
-            filters.append(DSMetaData.description.ilike(f"%{word}%"))
-            filters.append(Author.name.ilike(f"%{word}%"))
-            filters.append(Author.affiliation.ilike(f"%{word}%"))
-            filters.append(Author.orcid.ilike(f"%{word}%"))
-            filters.append(FMMetaData.uvl_filename.ilike(f"%{word}%"))
-            filters.append(FMMetaData.title.ilike(f"%{word}%"))
-            filters.append(FMMetaData.description.ilike(f"%{word}%"))
-            filters.append(FMMetaData.publication_doi.ilike(f"%{word}%"))
-            filters.append(FMMetaData.tags.ilike(f"%{word}%"))
-            filters.append(DSMetaData.tags.ilike(f"%{word}%"))
-
-        datasets = (
-            self.model.query.join(DataSet.ds_meta_data)
-            .join(DSMetaData.authors)
-            .join(DSMetaData.ds_metrics)
-            .join(DataSet.feature_models)
-            .join(FeatureModel.fm_meta_data)
-            .filter(or_(*filters))
+        datasets, scores = self._filtered(
+            query,
+            publication_type,
+            tags,
+            number_of_features,
+            number_of_models,
+            scored=sorting == "relevance",
+            **kwargs,
+        )
+
+        # Order by created_at
+        if sorting == "oldest":
+            datasets = datasets.order_by(self.model.created_at.asc())
+        else:
+            datasets = datasets.order_by(self.model.created_at.desc())
+
+        datasets = datasets.all()
+
+        # Most relevant first; ties (and queries without words) keep the newest first
+        if sorting == "relevance":
+            datasets.sort(key=lambda dataset: scores.get(dataset.id, 0.0), reverse=True)
+
+        return datasets
+
+    def filter_page(
+        self,
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=[],
+        number_of_features="",
+        number_of_models="",
+        limit=20,
+        after=None,
+        profile="card",
+        **kwargs,
+    ):
+        """
+        Returns one page of matches with the total number of matches and the sort
+        key of the last dataset, which the next page starts after. The sort key is
+        (created_at, id) for date orderings and (score, id) for relevance.
+        """
+        if sorting == "relevance":
+            # Scores only exist in memory, so rank the matching ids and load just this page
+            keys = self.sorted_keys(
+                query, sorting, publication_type, tags, number_of_features, number_of_models, **kwargs
+            )
+            page, last_key = self.page_from_keys(keys, sorting, limit, after, profile)
+            return page, last_key, len(keys)
+
+        datasets, _ = self._filtered(
+            query, publication_type, tags, number_of_features, number_of_models, **kwargs
+        )
+        total = datasets.count()
+
+        created_at, dataset_id = self.model.created_at, self.model.id
+        if sorting == "oldest":
+            if after is not None:
+                datasets = datasets.filter(tuple_(created_at, dataset_id) > tuple_(*after))
+            datasets = datasets.order_by(created_at.asc(), dataset_id.asc())
+        else:
+            if after is not None:
+                datasets = datasets.filter(tuple_(created_at, dataset_id) < tuple_(*after))
+            datasets = datasets.order_by(created_at.desc(), dataset_id.desc())
+
+        page = datasets.options(*load_profile(profile)).limit(limit + 1).all()
+        has_more = len(page) > limit
+        page = page[:limit]
+        last_key = (page[-1].created_at, page[-1].id) if page else None
+
+        return page, (last_key if has_more else None), total
+
+    def sorted_keys(
+        self,
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=[],
+        number_of_features="",
+        number_of_models="",
+        **kwargs,
+    ) -> List[tuple]:
+        """Returns the sort key of every match, in result order."""
+        datasets, scores = self._filtered(
+            query,
+            publication_type,
+            tags,
+            number_of_features,
+            number_of_models,
+            scored=sorting == "relevance",
+            **kwargs,
+        )
+        if sorting == "relevance":
+            return sorted(
+                ((scores.get(dataset_id, 0.0), dataset_id) for (dataset_id,) in datasets.with_entities(self.model.id)),
+                reverse=True,
+            )
+
+        keys = [tuple(key) for key in datasets.with_entities(self.model.created_at, self.model.id)]
+        return sorted(keys, reverse=sorting != "oldest")
+
+    def page_from_keys(self, keys, sorting="newest", limit=20, after=None, profile="card"):
+        """
+        Loads the page of datasets following ``after`` in an ordered list of sort
+        keys, and returns it with the key the next page starts after, if any.
+        """
+        if after is not None:
+            after = tuple(after)
+            if sorting == "oldest":
+                keys = [key for key in keys if key > after]
+            else:
+                keys = [key for key in keys if key < after]
+
+        page_keys = keys[:limit]
+        by_id = {
+            dataset.id: dataset
+            for dataset in self.model.query.options(*load_profile(profile)).filter(
+                self.model.id.in_([key[1] for key in page_keys])
+            )
+        }
+        page = [by_id[dataset_id] for _, dataset_id in page_keys if dataset_id in by_id]
+        last_key = page_keys[-1] if len(keys) > limit else None
+        return page, last_key
+
+    def facet_rows(
+        self, query="", publication_type="any", tags=[], number_of_features="", number_of_models="", **kwargs
+    ):
+        """
+        Counts the datasets matching ``query`` and the metric ranges in a single
+        grouped query, one row per publication type and bucket of models and
+        features. Each row also says whether it passes the tag and exact metric
+        filters, so callers can count every facet against the remaining filters.
+        """
+        datasets, _ = self._filtered(query, "any", [], "", "", **kwargs)
+        tag_names = [name for tag in tags for name in Tag.names_from(tag)]
+        columns = (
+            DSMetaData.publication_type,
+            metric_bucket("models"),
+            metric_bucket("features"),
+            DSMetaData.id.in_(TagRepository().ds_meta_data_ids_with_any(tag_names)) if tag_names else true(),
+            DSMetrics.number_of_models == int(number_of_models) if number_of_models else true(),
+            DSMetrics.number_of_features == int(number_of_features) if number_of_features else true(),
+        )
+        return (
+            self.session.query(*columns, func.count(DSMetaData.id))
+            .outerjoin(DSMetaData.ds_metrics)
+            .filter(DSMetaData.id.in_(datasets.with_entities(self.model.ds_meta_data_id).statement))
+            .group_by(*columns)
+            .all()
+        )
+
+    def tag_facet_rows(
+        self, query="", publication_type="any", number_of_features="", number_of_models="", **kwargs
+    ) -> List[Tuple[str, int]]:
+        """
+        Counts the datasets using each tag among those matching every criterion
+        but the tags, grouped over the tag table, most used first.
+        """
+        datasets, _ = self._filtered(query, publication_type, [], number_of_features, number_of_models, **kwargs)
+        count = func.count(ds_meta_data_tag.c.ds_meta_data_id)
+        return (
+            self.session.query(Tag.name, count)
+            .join(ds_meta_data_tag, ds_meta_data_tag.c.tag_id == Tag.id)
             .filter(
-                DSMetaData.dataset_doi.isnot(None)
-            )  # Exclude datasets with empty dataset_doi
+                ds_meta_data_tag.c.ds_meta_data_id.in_(datasets.with_entities(self.model.ds_meta_data_id).statement)
+            )
+            .group_by(Tag.id, Tag.name)
+            .order_by(count.desc(), Tag.name)
+            .all()
         )
 
+    def _filtered(
+        self, query, publication_type, tags, number_of_features, number_of_models, scored=False, **kwargs
+    ):
+        """
+        Builds the matching datasets from EXISTS predicates on their metadata
+        instead of joins, so every dataset comes back exactly once however many
+        authors or feature models it has, and ordering and pagination run on
+        data_set rows alone. Returns them with the BM25 score of each match when
+        ``scored``, and an empty dict otherwise.
+        """
+        metadata_filters = [
+            DSMetaData.dataset_doi.isnot(None)
+        ]  # Exclude unpublished datasets
+
         if publication_type != "any":
             matching_type = None
             for member in PublicationType:
@@ -64,27 +388,50 @@ class ExploreRepository(BaseRepository):
                     break
 
             if matching_type is not None:
-                datasets = datasets.filter(
+                metadata_filters.append(
                     DSMetaData.publication_type == matching_type.name
                 )
 
-        if tags:
-            datasets = datasets.filter(
-                DSMetaData.tags.ilike(any_(f"%{tag}%" for tag in tags))
+        tag_names = [name for tag in tags for name in Tag.names_from(tag)]
+        if tag_names:
+            metadata_filters.append(
+                DSMetaData.id.in_(TagRepository().ds_meta_data_ids_with_any(tag_names))
             )
 
+        metrics_filters = []
         if number_of_features:
-            datasets = datasets.filter(
-                DSMetrics.number_of_features == number_of_features
-            )
+            metrics_filters.append(DSMetrics.number_of_features == int(number_of_features))
 
         if number_of_models:
-            datasets = datasets.filter(DSMetrics.number_of_models == number_of_models)
+            metrics_filters.append(DSMetrics.number_of_models == int(number_of_models))
 
-        # Order by created_at
-        if sorting == "oldest":
-            datasets = datasets.order_by(self.model.created_at.asc())
-        else:
-            datasets = datasets.order_by(self.model.created_at.desc())
+        # Ranges seek the metric indexes; the dataset is then reached through the EXISTS below
+        for criterion, value in metric_ranges(kwargs).items():
+            column = METRIC_RANGE_COLUMNS[criterion[4:]]
+            metrics_filters.append(column >= value if criterion.startswith("min_") else column <= value)
+
+        if metrics_filters:
+            metadata_filters.append(DSMetaData.ds_metrics.has(and_(*metrics_filters)))
+
+        datasets = self.model.query.filter(
+            DataSet.ds_meta_data.has(and_(*metadata_filters))
+        )
+
+        # Model contents are matched through the identifier index, never by reading UVL files
+        query, identifiers = identifier_filters(query)
+        for kind, name in identifiers:
+            datasets = datasets.filter(
+                self.model.id.in_(UVLIdentifierRepository().data_set_ids_with(kind, name))
+            )
+
+        words = tokenize(query)
+        scores = {}
+        if words:
+            # Matching stays in SQL; scores are only read back for relevance ordering
+            datasets = datasets.filter(self.model.id.in_(SearchIndexRepository().matching_ids(words)))
+            if scored:
+                if tuple(words) not in self._scores:
+                    self._scores[tuple(words)] = SearchIndexRepository().search(words)
+                scores = self._scores[tuple(words)]
 
-        return datasets.all()
+        return datasets, scores
@@ -1,8 +1,39 @@
-from flask import render_template, request, jsonify
+import logging
 
+from flask import current_app, render_template, request, jsonify
+
+from app import db
+from app.modules.dataset.models import DSMetaData
+from app.modules.dataset.services import TagService
+from app.modules.dataset.signals import dataset_created, dataset_updated
 from app.modules.explore import explore_bp
 from app.modules.explore.forms import ExploreForm
-from app.modules.explore.services import ExploreService
+from app.modules.explore.services import ExploreService, SearchIndexService, SuggestionService
+from core.managers.result_cache_manager import get_result_cache
+
+logger = logging.getLogger(__name__)
+
+
+def index_dataset(dataset):
+    # A stale index entry must not fail the upload or edit; `rosemary search:reindex` repairs it
+    try:
+        SearchIndexService().index_dataset(dataset)
+    except Exception as exc:
+        db.session.rollback()
+        logger.exception(f"Could not index dataset {dataset.id}: {exc}")
+
+
+@dataset_created.connect
+def index_created_dataset(sender, dataset, **extra):
+    index_dataset(dataset)
+
+
+@dataset_updated.connect
+def index_updated_dataset(sender, ds_meta_data_id, **extra):
+    ds_meta_data = db.session.get(DSMetaData, ds_meta_data_id)
+    if ds_meta_data is not None and ds_meta_data.data_set is not None:
+        index_dataset(ds_meta_data.data_set)
+        SuggestionService().update_dataset(ds_meta_data.data_set)
 
 
 @explore_bp.route("/explore", methods=["GET", "POST"])
@@ -14,5 +45,55 @@ def index():
 
     if request.method == "POST":
         criteria = request.get_json()
-        datasets = ExploreService().filter(**criteria)
-        return jsonify([dataset.to_dict() for dataset in datasets])
+        fields = criteria.pop("fields", "card")
+        facets = criteria.pop("facets", False)
+        cursor = criteria.pop("cursor", None)
+        try:
+            limit = int(criteria.pop("limit", current_app.config["EXPLORE_PAGE_SIZE"]))
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit must be an integer"}), 400
+        limit = max(1, min(limit, current_app.config["EXPLORE_MAX_PAGE_SIZE"]))
+
+        # Cards carry only what the explore page renders; fields=full returns the whole dataset
+        profile = "export" if fields == "full" else "card"
+        explore_service = ExploreService()
+        try:
+            datasets, next_cursor, total = explore_service.filter_page(
+                limit=limit, cursor=cursor, profile=profile, **criteria
+            )
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+
+        if fields == "full":
+            results = [dataset.to_dict() for dataset in datasets]
+        else:
+            results = [dataset.to_card_dict() for dataset in datasets]
+        response = {"datasets": results, "next_cursor": next_cursor, "total": total}
+        if facets:
+            response["facets"] = explore_service.facet_counts(**criteria)
+        return jsonify(response)
+
+
+@explore_bp.route("/explore/suggest", methods=["GET"])
+def suggest():
+    query = request.args.get("q", "")
+    try:
+        limit = int(request.args.get("limit", 10))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    suggestions = SuggestionService().suggest(query, max(1, min(limit, 50)))
+    return jsonify({"query": query, "suggestions": suggestions})
+
+
+@explore_bp.route("/explore/tags", methods=["GET"])
+def tag_cloud():
+    try:
+        limit = int(request.args.get("limit", 50))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify({"tags": TagService().tag_cloud(max(1, min(limit, 200)))})
+
+
+@explore_bp.route("/explore/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify({"results": get_result_cache().stats()})
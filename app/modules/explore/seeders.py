@@ -0,0 +1,10 @@
+from app.modules.explore.services import SearchIndexService
+from core.seeders.BaseSeeder import BaseSeeder
+
+
+class SearchIndexSeeder(BaseSeeder):
+
+    priority = 100  # Runs after the seeders that create datasets
+
+    def run(self):
+        SearchIndexService().rebuild()
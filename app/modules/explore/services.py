@@ -1,10 +1,33 @@
-from app.modules.explore.repositories import ExploreRepository
+import base64
+import binascii
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
+
+from app.modules.dataset.models import DataSet, Tag
+from app.modules.dataset.repositories import DataSetRepository
+from app.modules.explore.repositories import (
+    ExploreRepository,
+    SearchIndexRepository,
+    identifier_filters,
+    metric_ranges,
+    tokenize,
+)
+from app.modules.public.models import HubCounter
+from app.modules.public.services import HubCounterService
+from core.managers.result_cache_manager import get_result_cache
+from core.managers.suggestion_index_manager import get_suggestion_index
 from core.services.BaseService import BaseService
 
+logger = logging.getLogger(__name__)
+
 
 class ExploreService(BaseService):
     def __init__(self):
         super().__init__(ExploreRepository())
+        self.hub_counter_service = HubCounterService()
 
     def filter(
         self,
@@ -25,3 +48,249 @@ class ExploreService(BaseService):
             number_of_models,
             **kwargs
         )
+
+    def filter_page(self, limit=20, cursor=None, sorting="newest", profile="card", **criteria):
+        """
+        Returns (datasets, next_cursor, total). The cursor is opaque to clients and
+        only valid for the sorting it was issued for; ValueError is raised otherwise.
+        With the result cache enabled the ordered matches are reused until the
+        catalog version changes, and only the page itself is loaded.
+        """
+        after = self.decode_cursor(cursor, sorting)
+        result_cache = get_result_cache()
+        if not result_cache.is_enabled():
+            datasets, last_key, total = self.repository.filter_page(
+                sorting=sorting, limit=limit, after=after, profile=profile, **criteria
+            )
+            return datasets, self.encode_cursor(last_key, sorting), total
+
+        keys = result_cache.get_or_set(
+            self.cache_key(sorting=sorting, **criteria),
+            self.hub_counter_service.get(HubCounter.CATALOG_VERSION),
+            lambda: self.repository.sorted_keys(sorting=sorting, **criteria),
+        )
+        datasets, last_key = self.repository.page_from_keys(keys, sorting, limit, after, profile)
+        return datasets, self.encode_cursor(last_key, sorting), len(keys)
+
+    def facet_counts(
+        self,
+        query="",
+        publication_type="any",
+        tags=[],
+        number_of_features="",
+        number_of_models="",
+        **kwargs
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Returns how many results each facet value would give, keeping every other
+        active filter: selecting a publication type does not hide the counts of
+        the alternatives. Models and features are counted per bucket, labelled
+        "min-max" or "min+" like the min_/max_ filters they select. Publication
+        types and buckets come from one aggregate, tags from a second over the tag
+        table.
+        """
+        criteria = dict(
+            publication_type=publication_type,
+            number_of_features=number_of_features,
+            number_of_models=number_of_models,
+            **kwargs,
+        )
+        facets = {name: Counter() for name in ("publication_type", "number_of_models", "number_of_features")}
+
+        for row_type, row_models, row_features, tags_match, models_match, features_match, count in (
+            self.repository.facet_rows(query, tags=tags, **criteria)
+        ):
+            values = {
+                "publication_type": row_type.value if row_type is not None else "",
+                "number_of_models": row_models or "",
+                "number_of_features": row_features or "",
+            }
+            matches = {
+                "publication_type": publication_type == "any" or values["publication_type"] == publication_type,
+                "tags": bool(tags_match),
+                "number_of_models": bool(models_match),
+                "number_of_features": bool(features_match),
+            }
+            for name in facets:
+                if values[name] and all(match for other, match in matches.items() if other != name):
+                    facets[name][values[name]] += count
+
+        result = {name: dict(counter.most_common()) for name, counter in facets.items()}
+        result["tags"] = dict(self.repository.tag_facet_rows(query, **criteria))
+        return result
+
+    @staticmethod
+    def cache_key(
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=[],
+        number_of_features="",
+        number_of_models="",
+        **kwargs
+    ) -> str:
+        # Queries that tokenize alike return the same results, whatever their case or punctuation
+        text, identifiers = identifier_filters(query)
+        return json.dumps(
+            [
+                tokenize(text),
+                identifiers,
+                sorting,
+                publication_type,
+                sorted({name for tag in tags for name in Tag.names_from(tag)}),
+                str(number_of_features),
+                str(number_of_models),
+                metric_ranges(kwargs),
+            ]
+        )
+
+    @staticmethod
+    def encode_cursor(key, sorting):
+        if key is None:
+            return None
+        first, dataset_id = key
+        if isinstance(first, datetime):
+            first = first.isoformat()
+        payload = json.dumps({"sorting": sorting, "key": [first, dataset_id]})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor, sorting):
+        if not cursor:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            first, dataset_id = payload["key"]
+            if payload["sorting"] != sorting:
+                raise ValueError("cursor was issued for a different sorting")
+            if sorting == "relevance":
+                return float(first), int(dataset_id)
+            return datetime.fromisoformat(first), int(dataset_id)
+        except (binascii.Error, UnicodeDecodeError, KeyError, TypeError, ValueError) as exc:
+            raise ValueError(f"Invalid cursor: {exc}")
+
+
+class SearchIndexService(BaseService):
+    # Occurrences in these fields count this many times towards the term frequency
+    TITLE_WEIGHT = 3
+    TAG_WEIGHT = 2
+    AUTHOR_WEIGHT = 2
+    TEXT_WEIGHT = 1
+
+    def __init__(self):
+        super().__init__(SearchIndexRepository())
+
+    def document_terms(self, dataset: DataSet) -> Counter:
+        ds_meta_data = dataset.ds_meta_data
+        fm_meta_datas = [
+            feature_model.fm_meta_data
+            for feature_model in dataset.feature_models
+            if feature_model.fm_meta_data is not None
+        ]
+        return self.metadata_terms(ds_meta_data, ds_meta_data.authors, fm_meta_datas)
+
+    @classmethod
+    def metadata_terms(cls, ds_meta_data, authors, fm_meta_datas) -> Counter:
+        """
+        Weighted terms of a dataset from its metadata, its authors and the metadata
+        of its feature models.
+        """
+        fields = [
+            (ds_meta_data.title, cls.TITLE_WEIGHT),
+            (ds_meta_data.tags, cls.TAG_WEIGHT),
+            (ds_meta_data.description, cls.TEXT_WEIGHT),
+        ]
+        for author in authors:
+            fields += [
+                (author.name, cls.AUTHOR_WEIGHT),
+                (author.affiliation, cls.AUTHOR_WEIGHT),
+                (author.orcid, cls.AUTHOR_WEIGHT),
+            ]
+        for fm_meta_data in fm_meta_datas:
+            fields += [
+                (fm_meta_data.uvl_filename, cls.TEXT_WEIGHT),
+                (fm_meta_data.title, cls.TEXT_WEIGHT),
+                (fm_meta_data.description, cls.TEXT_WEIGHT),
+                (fm_meta_data.publication_doi, cls.TEXT_WEIGHT),
+                (fm_meta_data.tags, cls.TAG_WEIGHT),
+            ]
+
+        terms = Counter()
+        for text, weight in fields:
+            for term in tokenize(text):
+                terms[term] += weight
+        return terms
+
+    def index_dataset(self, dataset: DataSet, commit: bool = True):
+        self.repository.replace_document(dataset.id, self.document_terms(dataset), commit=commit)
+
+    def remove_dataset(self, dataset_id: int):
+        self.repository.remove_document(dataset_id)
+
+    def rebuild(self) -> int:
+        self.repository.clear(commit=False)
+        datasets = DataSet.query.all()
+        for dataset in datasets:
+            self.index_dataset(dataset, commit=False)
+        self.repository.session.commit()
+        logger.info(f"Rebuilt the search index with {len(datasets)} datasets")
+        return len(datasets)
+
+    def search(self, query: str) -> dict:
+        return self.repository.search(tokenize(query))
+
+
+class SuggestionService(BaseService):
+    """
+    Serves search suggestions from the worker's in-memory prefix index over the
+    published catalog. Datasets published or edited in this worker are applied
+    incrementally; changes made by other workers are picked up by reloading the
+    index once the catalog version moves on, checked at most every
+    SUGGESTION_INDEX_REFRESH_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        super().__init__(DataSetRepository())
+        self.hub_counter_service = HubCounterService()
+
+    @staticmethod
+    def dataset_phrases(dataset: DataSet) -> List[str]:
+        ds_meta_data = dataset.ds_meta_data
+        phrases = [ds_meta_data.title]
+        phrases += ds_meta_data.tag_labels()
+        for author in ds_meta_data.authors:
+            phrases += [author.name, author.affiliation]
+        for feature_model in dataset.feature_models:
+            if feature_model.fm_meta_data is not None:
+                phrases.append(feature_model.fm_meta_data.uvl_filename)
+        return [phrase for phrase in phrases if phrase]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        index = get_suggestion_index()
+        if index.needs_check():
+            self.refresh()
+        return index.suggest(prefix, limit)
+
+    def refresh(self, force: bool = False):
+        index = get_suggestion_index()
+        version = self.hub_counter_service.get(HubCounter.CATALOG_VERSION)
+        if not force and version == index.version:
+            index.mark_checked(version)
+            return
+        datasets = self.repository.all_synchronized(profile="export")
+        index.load({dataset.id: self.dataset_phrases(dataset) for dataset in datasets}, version)
+        logger.info(f"Loaded {index.size()} suggestions from {len(datasets)} datasets")
+
+    def update_dataset(self, dataset: DataSet):
+        index = get_suggestion_index()
+        if index.version is None:
+            # Nothing loaded yet; the first suggestion request loads the current catalog
+            return
+        if dataset.ds_meta_data.dataset_doi is None:
+            index.remove(dataset.id)
+        else:
+            index.replace(dataset.id, self.dataset_phrases(dataset))
+        # A single bump is this change; anything more means another worker changed the catalog too
+        version = self.hub_counter_service.get(HubCounter.CATALOG_VERSION)
+        if version == index.version + 1:
+            index.mark_checked(version)
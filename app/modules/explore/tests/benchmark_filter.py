@@ -0,0 +1,150 @@
+"""
+Benchmark of the explore filter on a seeded catalog: the join-based filter it
+replaced against the EXISTS-based ExploreRepository._filtered.
+
+    python -m app.modules.explore.tests.benchmark_filter [DATABASE_URI]
+
+DATABASE_URI defaults to a SQLite file in the temp dir. The database is dropped
+and recreated, so never point it at one holding data you want to keep.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, or_, text
+
+from app import create_app, db
+from app.modules.auth.models import User
+from app.modules.dataset.models import Author, DataSet, DSMetaData, DSMetrics, PublicationType, ds_meta_data_tag
+from app.modules.dataset.repositories import TagRepository
+from app.modules.explore.repositories import ExploreRepository
+from app.modules.explore.services import SearchIndexService
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from core.managers import config_manager
+
+DATASETS = 2000
+WORDS = "automotive model engine cloud mobile phone product line feature variability embedded linux".split()
+TAGS = [f"tag{i}" for i in range(20)]
+RUNS = 30
+
+
+def seed():
+    rng = random.Random(42)
+    db.session.execute(insert(User), [{"id": 1, "email": "bench@example.com", "password": "x"}])
+    now = datetime(2026, 1, 1)
+    metrics, metas, authors, datasets, fm_metas, fms = [], [], [], [], [], []
+    fm_id = 0
+    for i in range(1, DATASETS + 1):
+        n_authors, n_models = rng.randint(1, 10), rng.randint(1, 30)
+        metrics.append({"id": i, "number_of_models": n_models, "number_of_features": rng.randint(5, 300)})
+        metas.append({
+            "id": i, "title": " ".join(rng.sample(WORDS, 3)), "description": " ".join(rng.sample(WORDS, 6)),
+            "publication_type": PublicationType.NONE.name, "dataset_doi": f"10.1234/{i}",
+            "tags": ",".join(rng.sample(TAGS, 3)), "ds_metrics_id": i,
+        })
+        authors += [
+            {"name": f"Author {i}-{a}", "affiliation": rng.choice(WORDS), "ds_meta_data_id": i}
+            for a in range(n_authors)
+        ]
+        datasets.append({"id": i, "user_id": 1, "ds_meta_data_id": i, "created_at": now + timedelta(minutes=i)})
+        for _ in range(n_models):
+            fm_id += 1
+            fm_metas.append({
+                "id": fm_id, "uvl_filename": f"m{fm_id}.uvl", "title": rng.choice(WORDS), "description": "uvl",
+                "publication_type": PublicationType.NONE.name, "tags": rng.choice(TAGS),
+            })
+            fms.append({"id": fm_id, "data_set_id": i, "fm_meta_data_id": fm_id})
+    for model, rows in [(DSMetrics, metrics), (DSMetaData, metas), (Author, authors), (DataSet, datasets),
+                        (FMMetaData, fm_metas), (FeatureModel, fms)]:
+        db.session.execute(insert(model), rows)
+    # Tag rows as sync_tags would link them (core inserts bypass the ORM hook)
+    tag_ids = {name: tag.id for name, tag in TagRepository().get_or_create_many(TAGS).items()}
+    db.session.execute(insert(ds_meta_data_tag), [
+        {"ds_meta_data_id": meta["id"], "tag_id": tag_ids[name]} for meta in metas for name in meta["tags"].split(",")
+    ])
+    db.session.commit()
+    SearchIndexService().rebuild()
+    return len(authors), fm_id
+
+
+def old_filter_query(query, tags):
+    # The pre-change ExploreRepository.filter, verbatim except that the tag ILIKE ANY
+    # (rejected by SQLite and MariaDB) is written as an OR of ILIKEs
+    filters = []
+    for word in query.lower().split():
+        for column in (DSMetaData.title, DSMetaData.description, Author.name, Author.affiliation, Author.orcid,
+                       FMMetaData.uvl_filename, FMMetaData.title, FMMetaData.description,
+                       FMMetaData.publication_doi, FMMetaData.tags, DSMetaData.tags):
+            filters.append(column.ilike(f"%{word}%"))
+    datasets = (
+        DataSet.query.join(DataSet.ds_meta_data)
+        .join(DSMetaData.authors)
+        .join(DSMetaData.ds_metrics)
+        .join(DataSet.feature_models)
+        .join(FeatureModel.fm_meta_data)
+        .filter(or_(*filters))
+        .filter(DSMetaData.dataset_doi.isnot(None))
+    )
+    if tags:
+        datasets = datasets.filter(or_(*[DSMetaData.tags.ilike(f"%{tag}%") for tag in tags]))
+    return datasets.order_by(DataSet.created_at.desc())
+
+
+def new_filter_query(query, tags):
+    datasets, _ = ExploreRepository()._filtered(query, "any", tags, "", "")
+    return datasets.order_by(DataSet.created_at.desc())
+
+
+def measure(label, build, query, tags):
+    statement = build(query, tags).statement
+    raw_rows = len(db.session.execute(statement).all())
+    latencies = []
+    for _ in range(RUNS):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        result = build(query, tags).all()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"  {label:4} rows from DB {raw_rows:>6}  datasets {len(result):>5}  p50 {p50:8.1f} ms  p95 {p95:8.1f} ms")
+    return result
+
+
+def explain(build, query, tags):
+    compiled = build(query, tags).statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    if db.engine.dialect.name == "sqlite":
+        return [row.detail for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+    # MySQL and MariaDB: the table each step reads and the index it uses
+    return [f"{row.table} via {row.key or 'scan'}" for row in db.session.execute(text(f"EXPLAIN {compiled}"))]
+
+
+def main(database_uri):
+    config_manager.TestingConfig.SQLALCHEMY_DATABASE_URI = database_uri
+    app = create_app("testing")
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        n_authors, n_models = seed()
+        print(
+            f"Seeded {DATASETS} published datasets, {n_authors} authors, {n_models} feature models "
+            f"({db.engine.dialect.name})"
+        )
+        for query, tags in [("model", []), ("model", ["tag1", "tag2"]), ("automotive engine", ["tag3"])]:
+            print(f"query={query!r} tags={tags}")
+            old = measure("old", old_filter_query, query, tags)
+            new = measure("new", new_filter_query, query, tags)
+            # The old query matched words in any field through the joins; the index covers the same fields
+            print(f"  same datasets: {sorted(d.id for d in old) == sorted(d.id for d in new)}")
+        print("Query plans, query='model' tags=['tag1', 'tag2']")
+        for label, build in (("old", old_filter_query), ("new", new_filter_query)):
+            print(f"  {label}: " + " | ".join(explain(build, "model", ["tag1", "tag2"])))
+
+
+if __name__ == "__main__":
+    default_uri = "sqlite:///" + os.path.join(tempfile.gettempdir(), "explore_benchmark.db")
+    main(sys.argv[1] if len(sys.argv) > 1 else default_uri)
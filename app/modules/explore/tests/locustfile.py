@@ -89,3 +89,18 @@ class AdvancedFilteringUser(HttpUser):
             else:
                 response.success()
                 print(f"Respuesta exitosa: {response.json()}")
+
+    @task(2)
+    def search_with_tags(self):
+        # Búsqueda por texto y etiquetas sobre datasets con muchos autores y modelos
+        with self.client.post(
+            "/explore",
+            data=json.dumps({"query": "model", "tags": ["tag1", "tag2"]}),
+            headers={"Content-Type": "application/json"},
+            catch_response=True,
+            name="POST /explore (Query and tags)",
+        ) as response:
+            if response.status_code != 200:
+                response.failure(f"Error al filtrar por texto y etiquetas: {response.status_code}")
+            else:
+                response.success()
@@ -1,7 +1,17 @@
+import time
 from unittest.mock import MagicMock
 import pytest
-from app.modules.explore.services import ExploreService
+from sqlalchemy import event
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import Author, DataSet, DSMetaData, DSMetrics, PublicationType
+from app.modules.dataset.services import DataSetService
+from app.modules.explore.services import ExploreService, SearchIndexService, SuggestionService
 from app.modules.explore.repositories import ExploreRepository
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.featuremodel.repositories import UVLIdentifierRepository
+from app.modules.public.models import HubCounter
+from app.modules.public.services import HubCounterService
 
 
 @pytest.fixture
@@ -43,3 +53,366 @@ def test_filter_no_results(explore_service):
     result = explore_service.filter(query="nonexistent", tags=["nonexistenttag"])
 
     assert result == []
+
+
+@pytest.fixture(scope="module")
+def search_client(test_client):
+    with test_client.application.app_context():
+        user = User(email="explore_user@example.com", password="test1234")
+        db.session.add(user)
+        db.session.commit()
+
+        datasets = {}
+        for key, title, description, tags, doi in [
+            ("automotive", "Automotive product lines", "Car configuration models", "cars,automotive", "10.1/a"),
+            ("mentions", "Assorted models", "Includes one automotive example", "misc", "10.1/b"),
+            ("unpublished", "Automotive drafts", "Not synchronized yet", "automotive", None),
+        ]:
+            ds_meta_data = DSMetaData(
+                title=title,
+                description=description,
+                publication_type=PublicationType.NONE,
+                tags=tags,
+                dataset_doi=doi,
+            )
+            db.session.add(ds_meta_data)
+            db.session.flush()
+            ds_meta_data.authors.append(Author(name="Doe, Jane", affiliation="Sevilla", orcid="0000-0001"))
+            dataset = DataSet(user_id=user.id, ds_meta_data_id=ds_meta_data.id)
+            db.session.add(dataset)
+            db.session.commit()
+            datasets[key] = dataset.id
+
+        SearchIndexService().rebuild()
+        test_client.search_datasets = datasets
+
+    yield test_client
+
+
+def search_ids(client, **criteria):
+    response = client.post("/explore", json=criteria)
+    assert response.status_code == 200
+    return [dataset["id"] for dataset in response.get_json()["datasets"]]
+
+
+def test_search_ranks_by_relevance(search_client):
+    datasets = search_client.search_datasets
+
+    ids = search_ids(search_client, query="automotive", sorting="relevance")
+
+    assert ids == [datasets["automotive"], datasets["mentions"]]
+
+
+def test_search_matches_word_prefixes_and_authors(search_client):
+    datasets = search_client.search_datasets
+
+    assert set(search_ids(search_client, query="automot")) == {datasets["automotive"], datasets["mentions"]}
+    assert datasets["mentions"] in search_ids(search_client, query="sevilla")
+    assert search_ids(search_client, query="nonexistentword") == []
+
+
+def test_search_matches_in_the_database_without_scoring(search_client, monkeypatch):
+    datasets = search_client.search_datasets
+    monkeypatch.setattr(
+        "app.modules.explore.repositories.SearchIndexRepository.search",
+        MagicMock(side_effect=AssertionError("date orderings must not score")),
+    )
+
+    matches, scores = ExploreRepository()._filtered("automotive", "any", [], "", "")
+
+    assert "search_posting" in str(matches.statement)
+    assert scores == {}
+    assert search_ids(search_client, query="automotive") == [datasets["mentions"], datasets["automotive"]]
+
+
+def test_search_index_follows_metadata_updates(search_client):
+    datasets = search_client.search_datasets
+    ds_meta_data_id = db.session.get(DataSet, datasets["mentions"]).ds_meta_data_id
+
+    DataSetService().update_dsmetadata(ds_meta_data_id, title="Aerospace models")
+
+    assert search_ids(search_client, query="aerospace") == [datasets["mentions"]]
+
+
+@pytest.mark.parametrize("sorting", ["newest", "oldest", "relevance"])
+def test_explore_paginates_with_cursor(search_client, sorting):
+    expected = search_ids(search_client, query="models", sorting=sorting, limit=100)
+
+    ids, cursor = [], None
+    while True:
+        response = search_client.post(
+            "/explore", json={"query": "models", "sorting": sorting, "limit": 1, "cursor": cursor}
+        )
+        data = response.get_json()
+        assert data["total"] == len(expected)
+        ids += [dataset["id"] for dataset in data["datasets"]]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(expected) == 2
+    assert ids == expected
+
+
+def test_explore_card_and_full_projections(search_client):
+    card = search_client.post("/explore", json={"query": "automotive"}).get_json()["datasets"][0]
+    full = search_client.post("/explore", json={"query": "automotive", "fields": "full"}).get_json()["datasets"][0]
+
+    assert "files" not in card
+    assert set(card) < set(full)
+    assert card["url"] == full["url"]
+
+
+def test_explore_rejects_invalid_cursor(search_client):
+    response = search_client.post("/explore", json={"query": "", "cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+
+def test_filter_returns_each_dataset_once(search_client):
+    user = User.query.filter_by(email="explore_user@example.com").first()
+    ds_metrics = DSMetrics(number_of_models=30, number_of_features=120)
+    ds_meta_data = DSMetaData(
+        title="Wide catalogue entry",
+        description="Many authors and files",
+        publication_type=PublicationType.NONE,
+        tags="fanout",
+        dataset_doi="10.1/fanout",
+        ds_metrics=ds_metrics,
+    )
+    db.session.add(ds_meta_data)
+    db.session.flush()
+    for index in range(10):
+        ds_meta_data.authors.append(Author(name=f"Author {index}", affiliation="Cadiz"))
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=ds_meta_data.id)
+    db.session.add(dataset)
+    db.session.flush()
+    for _ in range(30):
+        db.session.add(FeatureModel(data_set_id=dataset.id))
+    db.session.commit()
+
+    datasets, _ = ExploreRepository()._filtered("", "any", ["fanout"], "120", "30")
+    # Plain id rows are not deduplicated by the ORM, so they show what the database returns
+    rows = datasets.with_entities(DataSet.id).all()
+
+    assert "JOIN" not in str(datasets.statement)
+    assert [row[0] for row in rows] == [dataset.id]
+    assert search_ids(search_client, query="", tags=["fanout"], number_of_models="30") == [dataset.id]
+
+
+@pytest.fixture
+def result_cache(search_client, monkeypatch):
+    result_cache = search_client.application.result_cache
+    monkeypatch.setattr(result_cache, "max_keys", 1000)
+    result_cache.invalidate()
+    yield result_cache
+    result_cache.invalidate()
+
+
+def test_result_cache_reuses_normalized_criteria(search_client, result_cache):
+    expected = search_ids(search_client, query="Automotive!", sorting="relevance")
+    hits = result_cache.stats()["hits"]
+
+    assert search_ids(search_client, query="automotive", sorting="relevance") == expected
+    assert result_cache.stats()["hits"] == hits + 1
+
+    first = search_client.post("/explore", json={"query": "automotive", "sorting": "relevance", "limit": 1}).get_json()
+    second = search_client.post(
+        "/explore", json={"query": "automotive", "sorting": "relevance", "limit": 1, "cursor": first["next_cursor"]}
+    ).get_json()
+    assert [first["datasets"][0]["id"], second["datasets"][0]["id"]] == expected
+    assert second["next_cursor"] is None
+
+    stats = search_client.get("/explore/cache/stats").get_json()["results"]
+    assert stats["hit_ratio"] > 0
+    assert stats["entries"] == 1
+
+
+def test_result_cache_is_invalidated_when_a_dataset_is_published(search_client, result_cache):
+    unpublished = db.session.get(DataSet, search_client.search_datasets["unpublished"])
+    assert unpublished.id not in search_ids(search_client, query="automotive")
+
+    DataSetService().update_dsmetadata(unpublished.ds_meta_data_id, dataset_doi="10.1/c")
+    try:
+        assert unpublished.id in search_ids(search_client, query="automotive")
+    finally:
+        DataSetService().update_dsmetadata(unpublished.ds_meta_data_id, dataset_doi=None)
+
+    assert unpublished.id not in search_ids(search_client, query="automotive")
+
+
+def suggestions(client, prefix):
+    response = client.get("/explore/suggest", query_string={"q": prefix})
+    assert response.status_code == 200
+    return response.get_json()["suggestions"]
+
+
+def test_suggest_completes_titles_tags_and_authors(search_client):
+    SuggestionService().refresh(force=True)
+
+    assert suggestions(search_client, "autom")[:2] == ["automotive", "Automotive product lines"]
+    assert "Doe, Jane" in suggestions(search_client, "jane")
+    assert "Sevilla" in suggestions(search_client, "sev")
+    assert "Automotive drafts" not in suggestions(search_client, "autom")
+    assert suggestions(search_client, "") == []
+
+
+def test_suggestions_follow_publishing_incrementally(search_client):
+    SuggestionService().refresh(force=True)
+    index = search_client.application.suggestion_index
+    unpublished = db.session.get(DataSet, search_client.search_datasets["unpublished"])
+
+    DataSetService().update_dsmetadata(unpublished.ds_meta_data_id, dataset_doi="10.1/suggest")
+    try:
+        assert "Automotive drafts" in suggestions(search_client, "drafts")
+        assert index.version == HubCounterService().get(HubCounter.CATALOG_VERSION)
+    finally:
+        DataSetService().update_dsmetadata(unpublished.ds_meta_data_id, dataset_doi=None)
+
+    assert suggestions(search_client, "drafts") == []
+
+
+def test_suggest_lookup_is_fast(search_client):
+    SuggestionService().refresh(force=True)
+    index = search_client.application.suggestion_index
+    for number in range(2000):
+        index.replace(-number - 1, [f"Generated model {number}", f"tag{number % 50}"])
+
+    try:
+        prefixes = ["g", "ge", "gen", "generated", "generated model 1", "model 2", "tag", "tag4"]
+        started = time.perf_counter()
+        for prefix in prefixes:
+            index.suggest(prefix, limit=10)
+        elapsed = (time.perf_counter() - started) / len(prefixes)
+
+        assert elapsed < 0.001
+    finally:
+        for number in range(2000):
+            index.remove(-number - 1)
+
+
+def test_explore_returns_facet_counts_in_two_aggregates(search_client):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    criteria = {"query": "automotive", "publication_type": "article"}
+    search_client.post("/explore", json=criteria)
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        plain = search_client.post("/explore", json=criteria).get_json()
+        without_facets = len(statements)
+        data = search_client.post("/explore", json=dict(criteria, facets=True)).get_json()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    assert "facets" not in plain
+    # One aggregate for publication types and metric buckets, one over the tag table
+    assert len(statements) == 2 * without_facets + 2
+    assert data["total"] == 0
+    # Counts of the other publication types ignore the selected one
+    assert data["facets"]["publication_type"] == {"none": 2}
+    assert data["facets"]["tags"] == {}
+
+    facets = search_client.post("/explore", json={"query": "automotive", "facets": True}).get_json()["facets"]
+    assert facets["tags"] == {"automotive": 1, "cars": 1, "misc": 1}
+
+
+def test_metric_facets_count_buckets_matching_the_range_filters(search_client):
+    user = User.query.filter_by(email="explore_user@example.com").first()
+    ids = []
+    for models, features in [(3, 40), (60, 45)]:
+        ds_meta_data = DSMetaData(
+            title="Bucketed catalogue",
+            description="Counted per bucket",
+            publication_type=PublicationType.NONE,
+            tags="Bucketed",
+            dataset_doi=f"10.1/bucketed-{models}",
+            ds_metrics=DSMetrics(number_of_models=models, number_of_features=features),
+        )
+        db.session.add(ds_meta_data)
+        db.session.flush()
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=ds_meta_data.id)
+        db.session.add(dataset)
+        db.session.commit()
+        SearchIndexService().index_dataset(dataset)
+        ids.append(dataset.id)
+
+    def facets(**criteria):
+        return search_client.post("/explore", json=dict(criteria, query="bucketed", facets=True)).get_json()["facets"]
+
+    assert facets()["number_of_models"] == {"2-5": 1, "51+": 1}
+    assert facets()["number_of_features"] == {"11-50": 2}
+    assert facets()["tags"] == {"bucketed": 2}
+    # An exact model count narrows the other facets but not its own
+    narrowed = facets(number_of_models="3")
+    assert narrowed["number_of_models"] == {"2-5": 1, "51+": 1}
+    assert narrowed["number_of_features"] == {"11-50": 1}
+    assert narrowed["tags"] == {"bucketed": 1}
+    # A bucket label is the range filter it stands for
+    assert search_ids(search_client, query="bucketed", min_models=2, max_models=5) == [ids[0]]
+
+
+def test_tag_filter_matches_whole_tags(search_client):
+    datasets = search_client.search_datasets
+
+    assert search_ids(search_client, query="", tags=["Cars"]) == [datasets["automotive"]]
+    assert search_ids(search_client, query="", tags=["car"]) == []
+    assert set(search_ids(search_client, query="", tags=["misc", "cars"])) == {
+        datasets["automotive"],
+        datasets["mentions"],
+    }
+
+
+def test_tag_cloud_counts_published_datasets(search_client):
+    tags = {tag["name"]: tag["count"] for tag in search_client.get("/explore/tags").get_json()["tags"]}
+
+    assert tags["automotive"] == 1
+    assert tags["cars"] == 1
+    assert tags["misc"] == 1
+
+
+def test_explore_filters_metric_ranges(search_client):
+    user = User.query.filter_by(email="explore_user@example.com").first()
+    ds_meta_data = DSMetaData(
+        title="Large product line",
+        description="Measured dataset",
+        publication_type=PublicationType.NONE,
+        tags="ranged",
+        dataset_doi="10.1/ranged",
+        ds_metrics=DSMetrics(number_of_models=3, number_of_features=500, number_of_constraints=12, depth=4),
+    )
+    db.session.add(ds_meta_data)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=ds_meta_data.id)
+    db.session.add(dataset)
+    db.session.commit()
+
+    def ranged(**ranges):
+        return search_ids(search_client, query="", tags=["ranged"], **ranges)
+
+    assert ranged(min_features=100, max_features=1000) == [dataset.id]
+    assert ranged(min_features="500", max_depth=4, min_constraints=12) == [dataset.id]
+    assert ranged(max_features=499) == []
+    assert ranged(min_models=4) == []
+    assert search_client.post("/explore", json={"query": "", "min_features": "many"}).status_code == 400
+
+
+def test_explore_filters_by_uvl_identifiers(search_client):
+    datasets = search_client.search_datasets
+    for key, identifiers in [
+        ("automotive", {"feature": ["Encryption", '"Data Storage"'], "constraint": ['"Data Storage"']}),
+        ("mentions", {"feature": ["Encryption"]}),
+        ("unpublished", {"feature": ["Encryption"], "constraint": ["Encryption"]}),
+    ]:
+        feature_model = FeatureModel(data_set_id=datasets[key])
+        db.session.add(feature_model)
+        db.session.flush()
+        UVLIdentifierRepository().replace_feature_model(feature_model.id, datasets[key], identifiers)
+
+    assert set(search_ids(search_client, query="feature:Encryption")) == {datasets["automotive"], datasets["mentions"]}
+    assert search_ids(search_client, query='constraint:"data storage"') == [datasets["automotive"]]
+    assert search_ids(search_client, query="feature:encryption cars", sorting="relevance") == [datasets["automotive"]]
+    assert search_ids(search_client, query="constraint:Encryption") == []
+    assert ExploreService.cache_key(query="feature:Encryption") != ExploreService.cache_key(query="feature encryption")
@@ -47,11 +47,7 @@ class FakenodoService(BaseService):
                 }
                 for author in ds_meta_data.authors
             ],
-            "keywords": (
-                ["uvlhub"]
-                if not ds_meta_data.tags
-                else ds_meta_data.tags.split(", ") + ["uvlhub"]
-            ),
+            "keywords": ds_meta_data.tag_labels() + ["uvlhub"],
             "access_right": "open",
             "license": "CC-BY-4.0",
         }
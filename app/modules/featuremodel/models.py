@@ -1,9 +1,18 @@
 from app import db
 from sqlalchemy import Enum as SQLAlchemyEnum
+from sqlalchemy.dialects import mysql
 
 from app.modules.dataset.models import Author, PublicationType
 
 
+fm_meta_data_tag = db.Table(
+    "fm_meta_data_tag",
+    db.Column("fm_meta_data_id", db.Integer, db.ForeignKey("fm_meta_data.id", ondelete="CASCADE"), primary_key=True),
+    db.Column("tag_id", db.Integer, db.ForeignKey("tag.id", ondelete="CASCADE"), primary_key=True),
+    db.Index("ix_fm_meta_data_tag_tag_id", "tag_id", "fm_meta_data_id"),
+)
+
+
 class FeatureModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     data_set_id = db.Column(db.Integer, db.ForeignKey("data_set.id"), nullable=False)
@@ -37,6 +46,11 @@ class FMMetaData(db.Model):
         cascade="all, delete",
         foreign_keys=[Author.fm_meta_data_id],
     )
+    # Normalized copy of `tags`, kept in step by sync_tags
+    tag_list = db.relationship("Tag", secondary=fm_meta_data_tag, lazy=True)
+
+    def tag_names(self):
+        return sorted(tag.name for tag in self.tag_list)
 
     def __repr__(self):
         return f"FMMetaData<{self.title}"
@@ -46,6 +60,47 @@ class FMMetrics(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     solver = db.Column(db.Text)
     not_solver = db.Column(db.Text)
+    number_of_features = db.Column(db.Integer)
+    number_of_constraints = db.Column(db.Integer)
+    depth = db.Column(db.Integer)
 
     def __repr__(self):
         return f"FMMetrics<solver={self.solver}, not_solver={self.not_solver}>"
+
+
+class UVLIdentifier(db.Model):
+    """
+    Inverted index of UVL contents: one row per feature name, or name referenced
+    by a cross-tree constraint, in each feature model. Names are stored
+    normalized, and the dataset is kept alongside so a lookup by name never
+    reads the feature models or their files.
+    """
+
+    __tablename__ = "uvl_identifier"
+
+    FEATURE = "feature"
+    CONSTRAINT = "constraint"
+    KINDS = (FEATURE, CONSTRAINT)
+
+    feature_model_id = db.Column(
+        db.Integer, db.ForeignKey("feature_model.id", ondelete="CASCADE"), primary_key=True
+    )
+    kind = db.Column(db.String(16), primary_key=True)
+    # Binary collation, so names that differ only in accents are distinct keys as they are in UVL
+    name = db.Column(
+        db.String(255).with_variant(mysql.VARCHAR(255, collation="utf8mb4_bin"), "mysql", "mariadb"),
+        primary_key=True,
+    )
+    data_set_id = db.Column(
+        db.Integer, db.ForeignKey("data_set.id", ondelete="CASCADE"), nullable=False
+    )
+
+    __table_args__ = (db.Index("ix_uvl_identifier_kind_name", "kind", "name", "data_set_id"),)
+
+    @staticmethod
+    def normalize(name) -> str:
+        """Lowercases a UVL identifier and drops the quotes around names with spaces."""
+        return (name or "").strip().strip('"').strip().lower()[:255]
+
+    def __repr__(self):
+        return f"UVLIdentifier<{self.kind}:{self.name}, feature_model={self.feature_model_id}>"
@@ -1,5 +1,8 @@
-from sqlalchemy import func
-from app.modules.featuremodel.models import FMMetaData, FeatureModel
+from typing import Dict, Iterable
+
+from sqlalchemy import insert, select
+
+from app.modules.featuremodel.models import FMMetaData, FeatureModel, UVLIdentifier
 from core.repositories.BaseRepository import BaseRepository
 
 
@@ -7,11 +10,39 @@ class FeatureModelRepository(BaseRepository):
     def __init__(self):
         super().__init__(FeatureModel)
 
-    def count_feature_models(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
-
 
 class FMMetaDataRepository(BaseRepository):
     def __init__(self):
         super().__init__(FMMetaData)
+
+
+class UVLIdentifierRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(UVLIdentifier)
+
+    def replace_feature_model(
+        self, feature_model_id: int, data_set_id: int, identifiers: Dict[str, Iterable[str]], commit: bool = True
+    ):
+        """Replaces the indexed identifiers of a feature model, given as names per kind."""
+        UVLIdentifier.query.filter_by(feature_model_id=feature_model_id).delete()
+        rows = {
+            (kind, UVLIdentifier.normalize(name))
+            for kind in UVLIdentifier.KINDS
+            for name in identifiers.get(kind, [])
+        }
+        rows = [
+            {"feature_model_id": feature_model_id, "kind": kind, "name": name, "data_set_id": data_set_id}
+            for kind, name in sorted(rows)
+            if name
+        ]
+        if rows:
+            self.session.execute(insert(UVLIdentifier), rows)
+        if commit:
+            self.session.commit()
+
+    def data_set_ids_with(self, kind: str, name: str):
+        """Select of the datasets with a feature model containing the identifier, for use in IN clauses."""
+        return (
+            select(UVLIdentifier.data_set_id)
+            .where(UVLIdentifier.kind == kind, UVLIdentifier.name == UVLIdentifier.normalize(name))
+        )
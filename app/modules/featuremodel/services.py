@@ -3,6 +3,8 @@ from app.modules.featuremodel.repositories import (
     FeatureModelRepository,
 )
 from app.modules.hubfile.services import HubfileService
+from app.modules.public.models import HubCounter
+from app.modules.public.services import HubCounterService
 from core.services.BaseService import BaseService
 
 
@@ -10,6 +12,7 @@ class FeatureModelService(BaseService):
     def __init__(self):
         super().__init__(FeatureModelRepository())
         self.hubfile_service = HubfileService()
+        self.hub_counter_service = HubCounterService()
 
     def total_feature_model_views(self) -> int:
         return self.hubfile_service.total_hubfile_views()
@@ -18,7 +21,7 @@ class FeatureModelService(BaseService):
         return self.hubfile_service.total_hubfile_downloads()
 
     def count_feature_models(self):
-        return self.repository.count_feature_models()
+        return self.hub_counter_service.get(HubCounter.FEATURE_MODELS)
 
     class FMMetaDataService(BaseService):
         def __init__(self):
@@ -0,0 +1,88 @@
+from datetime import datetime, timezone
+
+from app import db
+
+
+class UVLValidation(db.Model):
+    """
+    Syntax check of a UVL file, stored once per checksum and shared by every file
+    with the same content. ``errors`` holds the parser errors as
+    ``{"line", "column", "message"}`` objects and is empty for valid models.
+    """
+
+    __tablename__ = "uvl_validation"
+
+    checksum = db.Column(db.String(120), primary_key=True)
+    parser_version = db.Column(db.String(64), nullable=False)
+    valid = db.Column(db.Boolean, nullable=False)
+    errors = db.Column(db.JSON, nullable=False)
+    checked_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {"checksum": self.checksum, "valid": self.valid, "errors": self.errors}
+
+    def __repr__(self):
+        return f"UVLValidation<{self.checksum}, valid={self.valid}>"
+
+
+class SATCheck(db.Model):
+    """
+    Satisfiability of a UVL model, stored once per checksum and flamapy version,
+    with the size of its CNF translation and the time the solver needed.
+    """
+
+    __tablename__ = "sat_check"
+
+    checksum = db.Column(db.String(120), primary_key=True)
+    flamapy_version = db.Column(db.String(64), nullable=False)
+    satisfiable = db.Column(db.Boolean, nullable=False)
+    clauses = db.Column(db.Integer, nullable=False)
+    variables = db.Column(db.Integer, nullable=False)
+    solver_ms = db.Column(db.Float, nullable=False)
+    checked_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {
+            "satisfiable": self.satisfiable,
+            "clauses": self.clauses,
+            "variables": self.variables,
+            "solver_ms": self.solver_ms,
+        }
+
+    def __repr__(self):
+        return f"SATCheck<{self.checksum}, satisfiable={self.satisfiable}>"
+
+
+class SATCheckClaim(db.Model):
+    """
+    Marks a model whose SAT check is running, so requests in other processes wait
+    for its result instead of starting another solver run. Deleted when the run
+    ends; a claim older than the flamapy job timeout was left by a dead worker.
+    """
+
+    __tablename__ = "sat_check_claim"
+
+    checksum = db.Column(db.String(120), primary_key=True)
+    claimed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"SATCheckClaim<{self.checksum}>"
+
+
+class ModelAnalysis(db.Model):
+    """Result of one analysis operation on a UVL model, stored per checksum and flamapy version."""
+
+    __tablename__ = "model_analysis"
+
+    checksum = db.Column(db.String(120), primary_key=True)
+    operation = db.Column(db.String(32), primary_key=True)
+    flamapy_version = db.Column(db.String(64), nullable=False)
+    result = db.Column(db.JSON, nullable=False)
+    elapsed_ms = db.Column(db.Float, nullable=False)
+    checked_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {"result": self.result, "elapsed_ms": self.elapsed_ms}
+
+    def __repr__(self):
+        return f"ModelAnalysis<{self.checksum}, {self.operation}>"
@@ -1,7 +1,99 @@
-from app.modules.flamapy.models import Flamapy
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import update
+
+from app.modules.flamapy.models import ModelAnalysis, SATCheck, SATCheckClaim, UVLValidation
 from core.repositories.BaseRepository import BaseRepository
 
 
-class FlamapyRepository(BaseRepository):
+class UVLValidationRepository(BaseRepository):
     def __init__(self):
-        super().__init__(Flamapy)
+        super().__init__(UVLValidation)
+
+    def get_by_checksum(self, checksum: str) -> Optional[UVLValidation]:
+        return self.session.get(UVLValidation, checksum)
+
+    def get_by_checksums(self, checksums: Iterable[str]) -> Dict[str, UVLValidation]:
+        checksums = list(set(checksums))
+        if not checksums:
+            return {}
+        return {
+            validation.checksum: validation
+            for validation in UVLValidation.query.filter(UVLValidation.checksum.in_(checksums))
+        }
+
+    def save(self, checksum: str, parser_version: str, errors: List[dict], commit: bool = True) -> UVLValidation:
+        return self.upsert(
+            {"checksum": checksum},
+            {"parser_version": parser_version, "valid": not errors, "errors": errors},
+            commit=commit,
+        )
+
+
+class SATCheckRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(SATCheck)
+
+    def get_by_checksum(self, checksum: str) -> Optional[SATCheck]:
+        return self.session.get(SATCheck, checksum)
+
+    def save(self, checksum: str, flamapy_version: str, result: dict, commit: bool = True) -> SATCheck:
+        values = {name: result[name] for name in ("satisfiable", "clauses", "variables", "solver_ms")}
+        return self.upsert({"checksum": checksum}, dict(values, flamapy_version=flamapy_version), commit=commit)
+
+
+class SATCheckClaimRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(SATCheckClaim)
+
+    def claim(self, checksum: str, stale_after: float) -> bool:
+        """
+        Claims the SAT check of ``checksum`` for this request. Returns False while
+        another request holds a claim younger than ``stale_after`` seconds.
+        """
+        now = datetime.utcnow()
+        claimed = self.create_many_ignoring_duplicates([{"checksum": checksum, "claimed_at": now}], commit=False)
+        if not claimed:
+            # Take over the claim of a worker that died mid-run
+            claimed = self.session.execute(
+                update(SATCheckClaim)
+                .where(
+                    SATCheckClaim.checksum == checksum,
+                    SATCheckClaim.claimed_at < now - timedelta(seconds=stale_after),
+                )
+                .values(claimed_at=now)
+            ).rowcount
+        self.session.commit()
+        return bool(claimed)
+
+    def is_claimed(self, checksum: str) -> bool:
+        return self.session.query(SATCheckClaim.checksum).filter_by(checksum=checksum).first() is not None
+
+    def release(self, checksum: str):
+        SATCheckClaim.query.filter_by(checksum=checksum).delete()
+        self.session.commit()
+
+
+class ModelAnalysisRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(ModelAnalysis)
+
+    def get_for(self, checksum: str, operations: Iterable[str], flamapy_version: str) -> Dict[str, ModelAnalysis]:
+        return {
+            analysis.operation: analysis
+            for analysis in ModelAnalysis.query.filter(
+                ModelAnalysis.checksum == checksum,
+                ModelAnalysis.operation.in_(list(operations)),
+                ModelAnalysis.flamapy_version == flamapy_version,
+            )
+        }
+
+    def save(
+        self, checksum: str, operation: str, flamapy_version: str, result, elapsed_ms: float, commit: bool = True
+    ) -> ModelAnalysis:
+        return self.upsert(
+            {"checksum": checksum, "operation": operation},
+            {"flamapy_version": flamapy_version, "result": result, "elapsed_ms": elapsed_ms},
+            commit=commit,
+        )
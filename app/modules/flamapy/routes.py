@@ -1,131 +1,147 @@
+import io
+import json
 import logging
+import os
+from collections import defaultdict
+from app.modules.dataset.services import DataSetService
 from app.modules.hubfile.services import HubfileService
-from flask import send_file, jsonify
+from flask import Response, request, send_file, jsonify, stream_with_context
 from app.modules.flamapy import flamapy_bp
-from flamapy.metamodels.fm_metamodel.transformations import (
-    UVLReader,
-    GlencoeWriter,
-    SPLOTWriter,
+from core.flamapy.jobs import ANALYSIS_OPERATIONS
+from core.managers.flamapy_pool_manager import FlamapyJobLimitExceeded, get_flamapy_pool
+from app.modules.flamapy.services import (
+    ModelAnalysisService,
+    SATCheckService,
+    TransformationCacheService,
+    UVLValidationService,
 )
-from flamapy.metamodels.pysat_metamodel.transformations import FmToPysat, DimacsWriter
-import tempfile
-import os
-
-from antlr4 import CommonTokenStream, FileStream
-from uvl.UVLCustomLexer import UVLCustomLexer
-from uvl.UVLPythonParser import UVLPythonParser
-from antlr4.error.ErrorListener import ErrorListener
 
 logger = logging.getLogger(__name__)
 
+transformation_cache_service = TransformationCacheService()
+
 
 @flamapy_bp.route("/flamapy/check_uvl/<int:file_id>", methods=["GET"])
 def check_uvl(file_id):
-    class CustomErrorListener(ErrorListener):
-        def __init__(self):
-            self.errors = []
-
-        def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
-            if "\\t" in msg:
-                warning_message = (
-                    f"The UVL has the following warning that prevents reading it: "
-                    f"Line {line}:{column} - {msg}"
-                )
-                print(warning_message)
-                self.errors.append(warning_message)
-            else:
-                error_message = (
-                    f"The UVL has the following error that prevents reading it: "
-                    f"Line {line}:{column} - {msg}"
-                )
-                self.errors.append(error_message)
-
+    hubfile = HubfileService().get_or_404(file_id)
     try:
-        hubfile = HubfileService().get_by_id(file_id)
-        input_stream = FileStream(hubfile.get_path())
-        lexer = UVLCustomLexer(input_stream)
-
-        error_listener = CustomErrorListener()
+        # Usually a lookup: the verdict is stored at upload time under the file checksum
+        validation = UVLValidationService().validate_hubfile(hubfile)
+    except FlamapyJobLimitExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Could not check the UVL file {file_id}: {e}")
+        return jsonify({"error": str(e)}), 500
 
-        lexer.removeErrorListeners()
-        lexer.addErrorListener(error_listener)
+    if not validation.valid:
+        return jsonify({"errors": validation.errors}), 400
 
-        stream = CommonTokenStream(lexer)
-        parser = UVLPythonParser(stream)
+    return jsonify({"message": "Valid Model"}), 200
 
-        parser.removeErrorListeners()
-        parser.addErrorListener(error_listener)
 
-        # tree = parser.featureModel()
+@flamapy_bp.route("/flamapy/check_dataset/<int:dataset_id>", methods=["GET"])
+def check_dataset(dataset_id):
+    """
+    Checks every UVL file of a dataset in one request. Stored verdicts are
+    answered at once and the other files are parsed in parallel. With
+    ``?stream=1``, or when NDJSON is accepted, each file is sent as one line as
+    soon as its verdict is known.
+    """
+    dataset = DataSetService().get_or_404(dataset_id, profile="card")
+    dataset_dir = os.path.join(
+        os.getenv("WORKING_DIR", ""), "uploads", f"user_{dataset.user_id}", f"dataset_{dataset.id}"
+    )
+    files_by_checksum = defaultdict(list)
+    for hubfile in dataset.files():
+        files_by_checksum[hubfile.checksum].append(hubfile)
 
-        if error_listener.errors:
-            return jsonify({"errors": error_listener.errors}), 400
+    results = UVLValidationService().validate_many(
+        [(checksum, os.path.join(dataset_dir, files[0].name)) for checksum, files in files_by_checksum.items()]
+    )
 
-        # Optional: Print the parse tree
-        # print(tree.toStringTree(recog=parser))
+    def file_results():
+        for checksum, result in results:
+            for hubfile in files_by_checksum[checksum]:
+                yield {"file_id": hubfile.id, "name": hubfile.name, **result}
 
-        return jsonify({"message": "Valid Model"}), 200
+    if request.args.get("stream") or request.accept_mimetypes.best == "application/x-ndjson":
+        lines = (json.dumps(result) + "\n" for result in file_results())
+        return Response(stream_with_context(lines), mimetype="application/x-ndjson")
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    files = sorted(file_results(), key=lambda result: result["file_id"])
+    return jsonify(
+        {"dataset_id": dataset.id, "valid": all(result["valid"] for result in files), "files": files}
+    )
 
 
 @flamapy_bp.route("/flamapy/valid/<int:file_id>", methods=["GET"])
 def valid(file_id):
-    return jsonify({"success": True, "file_id": file_id})
+    hubfile = HubfileService().get_or_404(file_id)
+    try:
+        result = SATCheckService().check(hubfile)
+    except FlamapyJobLimitExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Could not check the satisfiability of the UVL file {file_id}: {e}")
+        return jsonify({"file_id": file_id, "error": str(e)}), 400
 
+    return jsonify({"file_id": file_id, "valid": result.pop("satisfiable"), **result})
 
-@flamapy_bp.route("/flamapy/to_glencoe/<int:file_id>", methods=["GET"])
-def to_glencoe(file_id):
-    temp_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+
+@flamapy_bp.route("/flamapy/analyze/<int:file_id>", methods=["GET"])
+def analyze(file_id):
+    """Runs the comma-separated ``ops`` (all of them by default) on one parse of the model."""
+    operations = [op.strip() for op in request.args.get("ops", ",".join(ANALYSIS_OPERATIONS)).split(",") if op.strip()]
+    unknown = [op for op in operations if op not in ANALYSIS_OPERATIONS]
+    if unknown or not operations:
+        return jsonify({"error": f"Unknown operations {unknown}; available: {list(ANALYSIS_OPERATIONS)}"}), 400
+
+    hubfile = HubfileService().get_or_404(file_id)
     try:
-        hubfile = HubfileService().get_or_404(file_id)
-        fm = UVLReader(hubfile.get_path()).transform()
-        GlencoeWriter(temp_file.name, fm).transform()
+        results = ModelAnalysisService().analyze(hubfile, list(dict.fromkeys(operations)))
+    except FlamapyJobLimitExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Could not analyze the UVL file {file_id}: {e}")
+        return jsonify({"file_id": file_id, "error": str(e)}), 400
+
+    return jsonify({"file_id": file_id, "operations": results})
 
-        # Return the file in the response
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name=f"{hubfile.name}_glencoe.txt",
-        )
-    finally:
-        # Clean up the temporary file
-        os.remove(temp_file.name)
+
+@flamapy_bp.route("/flamapy/to_glencoe/<int:file_id>", methods=["GET"])
+def to_glencoe(file_id):
+    hubfile = HubfileService().get_or_404(file_id)
+    return send_transformation(hubfile, "glencoe")
 
 
 @flamapy_bp.route("/flamapy/to_splot/<int:file_id>", methods=["GET"])
 def to_splot(file_id):
-    temp_file = tempfile.NamedTemporaryFile(suffix=".splx", delete=False)
-    try:
-        hubfile = HubfileService().get_by_id(file_id)
-        fm = UVLReader(hubfile.get_path()).transform()
-        SPLOTWriter(temp_file.name, fm).transform()
-
-        # Return the file in the response
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name=f"{hubfile.name}_splot.txt",
-        )
-    finally:
-        # Clean up the temporary file
-        os.remove(temp_file.name)
+    hubfile = HubfileService().get_or_404(file_id)
+    return send_transformation(hubfile, "splot")
 
 
 @flamapy_bp.route("/flamapy/to_cnf/<int:file_id>", methods=["GET"])
 def to_cnf(file_id):
-    temp_file = tempfile.NamedTemporaryFile(suffix=".cnf", delete=False)
-    try:
-        hubfile = HubfileService().get_by_id(file_id)
-        fm = UVLReader(hubfile.get_path()).transform()
-        sat = FmToPysat(fm).transform()
-        DimacsWriter(temp_file.name, sat).transform()
-
-        # Return the file in the response
-        return send_file(
-            temp_file.name, as_attachment=True, download_name=f"{hubfile.name}_cnf.txt"
-        )
-    finally:
-        # Clean up the temporary file
-        os.remove(temp_file.name)
+    hubfile = HubfileService().get_or_404(file_id)
+    return send_transformation(hubfile, "cnf")
+
+
+@flamapy_bp.route("/flamapy/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify({"transformations": transformation_cache_service.stats()})
+
+
+@flamapy_bp.route("/flamapy/pool/stats", methods=["GET"])
+def pool_stats():
+    return jsonify(get_flamapy_pool().stats())
+
+
+def send_transformation(hubfile, format):
+    # Served straight from the artifact store when the model was already converted
+    source = transformation_cache_service.get_or_transform(hubfile, format)
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    return send_file(
+        source, as_attachment=True, download_name=f"{hubfile.name}_{format}.txt"
+    )
@@ -1,7 +1,309 @@
-from app.modules.flamapy.repositories import FlamapyRepository
+import hashlib
+import logging
+import time
+from concurrent.futures import as_completed
+from importlib.metadata import PackageNotFoundError, version
+from typing import Optional, Union
+
+from flask import current_app
+
+from app.modules.flamapy.models import SATCheck, UVLValidation
+from app.modules.flamapy.repositories import (
+    ModelAnalysisRepository,
+    SATCheckClaimRepository,
+    SATCheckRepository,
+    UVLValidationRepository,
+)
+from app.modules.hubfile.models import Hubfile
+from core.flamapy.jobs import (
+    SAT_ANALYSIS_OPERATIONS,
+    TRANSFORMATION_FORMATS,
+    analyze_uvl,
+    check_satisfiability,
+    count_configurations,
+    run_analyses,
+    transform_uvl,
+    validate_uvl,
+)
+from core.managers.flamapy_pool_manager import FlamapyJobLimitExceeded, get_flamapy_pool
 from core.services.BaseService import BaseService
+from core.services.DiskCacheService import DiskCacheService
+
+logger = logging.getLogger(__name__)
+
+
+def get_distribution_version(*distributions) -> str:
+    versions = []
+    for distribution in distributions:
+        try:
+            versions.append(version(distribution))
+        except PackageNotFoundError:
+            versions.append("unknown")
+    return "+".join(versions)
+
+
+def get_flamapy_version() -> str:
+    return get_distribution_version("flamapy-fm", "flamapy-sat")
+
+
+FLAMAPY_VERSION = get_flamapy_version()
+UVL_PARSER_VERSION = get_distribution_version("uvlparser")
+
+
+class FlamapyService:
+    def __init__(self):
+        pass
+
+    def analyze(self, uvl_path: str) -> Optional[dict]:
+        try:
+            return get_flamapy_pool().run(analyze_uvl, uvl_path)
+        except Exception as exc:
+            logger.error(f"Could not analyze {uvl_path}: {exc}")
+            return None
+
+    def transform_many(self, uvl_paths):
+        """
+        Submits every UVL file to the worker pool right away and returns a
+        generator that yields ``(uvl_path, results)`` pairs as conversions finish.
+        Files that cannot be transformed are logged and skipped, and closing the
+        generator cancels the conversions that have not started.
+        """
+        pool = get_flamapy_pool()
+        futures = {pool.submit(transform_uvl, path): path for path in uvl_paths}
+        return self._completed_transformations(futures)
+
+    def _completed_transformations(self, futures):
+        try:
+            for future in as_completed(futures):
+                uvl_path = futures[future]
+                try:
+                    yield uvl_path, future.result()
+                except Exception as exc:
+                    logger.error(f"Could not transform the file {uvl_path}: {exc}")
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+class UVLValidationService(BaseService):
+    """
+    Syntax checks of UVL files, remembered by checksum so that checking a file
+    again, or another file with the same content, is a lookup. Verdicts from
+    another version of the parser are checked again.
+    """
+
+    def __init__(self):
+        super().__init__(UVLValidationRepository())
+
+    def validate(self, checksum: str, uvl_path: str, commit: bool = True) -> UVLValidation:
+        validation = self.repository.get_by_checksum(checksum)
+        if validation is None or validation.parser_version != UVL_PARSER_VERSION:
+            errors = get_flamapy_pool().run(validate_uvl, uvl_path)
+            validation = self.repository.save(checksum, UVL_PARSER_VERSION, errors, commit=commit)
+        return validation
+
+    def validate_hubfile(self, hubfile: Hubfile, commit: bool = True) -> UVLValidation:
+        return self.validate(hubfile.checksum, hubfile.get_path(), commit=commit)
+
+    def validate_many(self, uvl_files):
+        """
+        Checks ``(checksum, uvl_path)`` pairs and returns a generator of
+        ``(checksum, result)`` pairs, where ``result`` is the verdict as a dict.
+        Stored verdicts come first, read in one query. The remaining files are
+        parsed across the worker pool, once per checksum, and are yielded as they
+        finish. Files that cannot be read get ``valid`` set to None and an
+        ``error``.
+        """
+        paths = dict(uvl_files)
+        stored = self.repository.get_by_checksums(paths)
+        pending = {
+            checksum: path
+            for checksum, path in paths.items()
+            if checksum not in stored or stored[checksum].parser_version != UVL_PARSER_VERSION
+        }
+        fresh = [stored[checksum] for checksum in paths if checksum not in pending]
+        return self._validated(fresh, pending)
+
+    def _validated(self, fresh, pending):
+        for validation in fresh:
+            yield validation.checksum, validation.to_dict()
+        if not pending:
+            return
 
+        pool = get_flamapy_pool()
+        futures = {pool.submit(validate_uvl, path): checksum for checksum, path in pending.items()}
+        try:
+            for future in as_completed(futures):
+                checksum = futures[future]
+                try:
+                    errors = future.result()
+                except Exception as exc:
+                    logger.error(f"Could not check the UVL file {pending[checksum]}: {exc}")
+                    yield checksum, {"checksum": checksum, "valid": None, "errors": [], "error": str(exc)}
+                    continue
+                validation = self.repository.save(checksum, UVL_PARSER_VERSION, errors, commit=False)
+                yield checksum, validation.to_dict()
+        finally:
+            for future in futures:
+                future.cancel()
+            # Keep the verdicts reached so far, even if the client went away
+            self.repository.session.commit()
+
+
+class SATCheckService(BaseService):
+    """
+    SAT validity checks, stored by checksum and flamapy version. A request for a
+    model that another request, in any worker process, is already solving waits
+    for that run's stored result within its own time budget instead of starting
+    another solver run. Runs that hit the budget are not stored.
+    """
+
+    def __init__(self):
+        super().__init__(SATCheckRepository())
+        self.claim_repository = SATCheckClaimRepository()
+
+    def current(self, checksum: str) -> Optional[SATCheck]:
+        stored = self.repository.get_by_checksum(checksum)
+        return stored if stored is not None and stored.flamapy_version == FLAMAPY_VERSION else None
+
+    def check(self, hubfile: Hubfile, time_budget: Optional[float] = None) -> dict:
+        if time_budget is None:
+            time_budget = current_app.config["SAT_CHECK_TIME_BUDGET"]
+
+        stored = self.current(hubfile.checksum)
+        if stored is not None:
+            return {**stored.to_dict(), "timed_out": False, "cached": True, "coalesced": False}
+
+        # Jobs never outlive FLAMAPY_JOB_TIMEOUT, so an older claim belongs to a dead worker
+        if not self.claim_repository.claim(hubfile.checksum, current_app.config["FLAMAPY_JOB_TIMEOUT"]):
+            return self.wait_for(hubfile.checksum, time_budget)
+
+        try:
+            stored = self.current(hubfile.checksum)
+            if stored is not None:
+                # Another request finished between the lookup and the claim
+                return {**stored.to_dict(), "timed_out": False, "cached": True, "coalesced": False}
+            result = get_flamapy_pool().run(check_satisfiability, hubfile.get_path(), time_budget)
+            result["timed_out"] = result["satisfiable"] is None
+            if not result["timed_out"]:
+                self.repository.save(hubfile.checksum, FLAMAPY_VERSION, result)
+        finally:
+            self.claim_repository.release(hubfile.checksum)
+        return {**result, "cached": False, "coalesced": False}
+
+    def wait_for(self, checksum: str, time_budget: float) -> dict:
+        """Polls for the result of the run that holds the claim on ``checksum``."""
+        poll_interval = current_app.config["SAT_CHECK_POLL_INTERVAL"]
+        deadline = time.monotonic() + time_budget
+        while time.monotonic() < deadline:
+            time.sleep(min(poll_interval, max(deadline - time.monotonic(), 0)))
+            # End the read transaction, which would otherwise keep showing the same snapshot
+            self.repository.session.commit()
+            stored = self.current(checksum)
+            if stored is not None:
+                return {**stored.to_dict(), "timed_out": False, "cached": False, "coalesced": True}
+            if not self.claim_repository.is_claimed(checksum):
+                # The run ended without storing a result: it hit its own budget
+                break
+        return {"satisfiable": None, "timed_out": True, "cached": False, "coalesced": True}
+
+
+class ModelAnalysisService(BaseService):
+    """
+    Runs analysis operations on a UVL model and stores each result by checksum
+    and flamapy version. Only the operations without a stored result are run:
+    the SAT ones all on one parse and one solver, and counting on the model's
+    BDD in a job of its own, so a diagram too large for the worker only costs
+    the count.
+    """
 
-class FlamapyService(BaseService):
     def __init__(self):
-        super().__init__(FlamapyRepository())
+        super().__init__(ModelAnalysisRepository())
+
+    def analyze(self, hubfile: Hubfile, operations, time_budget: Optional[float] = None) -> dict:
+        if time_budget is None:
+            time_budget = current_app.config["SAT_CHECK_TIME_BUDGET"]
+        deadline = time.monotonic() + time_budget
+
+        stored = self.repository.get_for(hubfile.checksum, operations, FLAMAPY_VERSION)
+        results = {
+            operation: {**analysis.to_dict(), "timed_out": False, "cached": True}
+            for operation, analysis in stored.items()
+        }
+        missing = [operation for operation in operations if operation not in stored]
+        if missing:
+            outcomes = {}
+            sat_operations = [operation for operation in missing if operation in SAT_ANALYSIS_OPERATIONS]
+            if sat_operations:
+                outcomes = get_flamapy_pool().run(run_analyses, hubfile.get_path(), sat_operations, time_budget)
+            if "count" in missing:
+                outcomes["count"] = self.count(hubfile, deadline - time.monotonic())
+            for operation, outcome in outcomes.items():
+                if not outcome["timed_out"]:
+                    self.repository.save(
+                        hubfile.checksum, operation, FLAMAPY_VERSION, outcome["result"], outcome["elapsed_ms"],
+                        commit=False,
+                    )
+                results[operation] = {**outcome, "cached": False}
+            self.repository.session.commit()
+        return {operation: results[operation] for operation in operations}
+
+    def count(self, hubfile: Hubfile, time_budget: float) -> dict:
+        timed_out = {"result": None, "elapsed_ms": round(max(time_budget, 0) * 1000, 3), "timed_out": True}
+        if time_budget <= 0:
+            return timed_out
+        try:
+            return get_flamapy_pool().run(count_configurations, hubfile.get_path(), timeout=time_budget)
+        except FlamapyJobLimitExceeded as exc:
+            # The BDD outgrew the budget or the worker's memory; the other operations still stand
+            logger.warning(f"Could not count the configurations of {hubfile.checksum}: {exc}")
+            return timed_out
+
+
+class TransformationCacheService(DiskCacheService):
+    """
+    On-disk store of UVL transformations keyed by ``(checksum, format, flamapy
+    version)``, so exporting a model that was already converted does not touch
+    flamapy at all. Upgrading flamapy changes every key.
+    """
+
+    dir_config_key = "TRANSFORMATION_CACHE_DIR"
+    max_bytes_config_key = "TRANSFORMATION_CACHE_MAX_BYTES"
+    suffix = ".txt"
+
+    def key_for(self, checksum: str, format: str) -> str:
+        return hashlib.sha256(
+            f"{checksum}:{format}:{FLAMAPY_VERSION}".encode()
+        ).hexdigest()
+
+    def lookup(self, checksum: str, format: str) -> Optional[str]:
+        if not self.is_enabled():
+            return None
+        return self.get(self.key_for(checksum, format))
+
+    def lookup_all(self, checksum: str, formats=TRANSFORMATION_FORMATS) -> Optional[dict]:
+        """Returns the cached path of every format, or None unless all of them are cached."""
+        paths = {}
+        for format in formats:
+            path = self.lookup(checksum, format)
+            if path is None:
+                return None
+            paths[format] = path
+        return paths
+
+    def store(self, checksum: str, format: str, content: str) -> Union[str, bytes]:
+        """
+        Saves a transformation and returns its path in the cache, or the content as
+        ``bytes`` when the cache is disabled.
+        """
+        data = content.encode("utf-8")
+        if not self.is_enabled():
+            return data
+        return self.put(self.key_for(checksum, format), [data])
+
+    def get_or_transform(self, hubfile: Hubfile, format: str) -> Union[str, bytes]:
+        path = self.lookup(hubfile.checksum, format)
+        if path:
+            return path
+        results = get_flamapy_pool().run(transform_uvl, hubfile.get_path(), (format,))
+        return self.store(hubfile.checksum, format, results[format])
@@ -1,5 +1,44 @@
+import json
+import os
+import shutil
+import threading
+import time
+from types import SimpleNamespace
+
 import pytest
 
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.flamapy.models import ModelAnalysis, SATCheck, UVLValidation
+from app.modules.flamapy.repositories import SATCheckClaimRepository, UVLValidationRepository
+from app.modules.flamapy.services import (
+    ModelAnalysisService,
+    SATCheckService,
+    TransformationCacheService,
+    check_satisfiability,
+    count_configurations,
+    validate_uvl,
+)
+from app.modules.hubfile.models import Hubfile
+from core.managers.flamapy_pool_manager import FlamapyJobError, FlamapyJobLimitExceeded, FlamapyPoolManager
+
+UVL_CONTENT = (
+    "features\n"
+    "    Chat\n"
+    "        mandatory\n"
+    "            Connection\n"
+    "                alternative\n"
+    '                    "Peer 2 Peer"\n'
+    "                    Server\n"
+    "        optional\n"
+    '            "Data Storage"\n'
+    "\n"
+    "constraints\n"
+    '    Server => "Data Storage"\n'
+)
+
 
 @pytest.fixture(scope="module")
 def test_client(test_client):
@@ -7,12 +46,49 @@ def test_client(test_client):
     Extends the test_client fixture to add additional specific data for module testing.
     """
     with test_client.application.app_context():
-        # Add HERE new elements to the database that you want to exist in the test context.
-        # DO NOT FORGET to use db.session.add(<element>) and db.session.commit() to save the data.
-        pass
+        user = User(email="flamapy_user@example.com", password="test1234")
+        db.session.add(user)
+        db.session.commit()
+
+        ds_meta_data = DSMetaData(
+            title="Flamapy dataset",
+            description="Dataset used by the flamapy tests",
+            publication_type=PublicationType.NONE,
+        )
+        db.session.add(ds_meta_data)
+        db.session.commit()
+
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=ds_meta_data.id)
+        db.session.add(dataset)
+        db.session.commit()
+
+        feature_model = FeatureModel(data_set_id=dataset.id)
+        db.session.add(feature_model)
+        db.session.commit()
+
+        dataset_dir = f"uploads/user_{user.id}/dataset_{dataset.id}"
+        os.makedirs(dataset_dir, exist_ok=True)
+        with open(os.path.join(dataset_dir, "flamapy.uvl"), "w") as f:
+            f.write(UVL_CONTENT)
+
+        hubfile = Hubfile(
+            name="flamapy.uvl",
+            checksum="flamapy-checksum",
+            size=len(UVL_CONTENT),
+            feature_model_id=feature_model.id,
+        )
+        db.session.add(hubfile)
+        db.session.commit()
+
+        test_client.hubfile_id = hubfile.id
+        test_client.dataset_dir = dataset_dir
+        test_client.dataset_id = dataset.id
+        os.environ["WORKING_DIR"] = os.getcwd()
 
     yield test_client
 
+    shutil.rmtree(dataset_dir, ignore_errors=True)
+
 
 def test_sample_assertion(test_client):
     """
@@ -24,3 +100,293 @@ def test_sample_assertion(test_client):
     assert (
         greeting == "Hello, World!"
     ), "The greeting does not coincide with 'Hello, World!'"
+
+
+def test_to_cnf_is_served_from_transformation_cache(test_client, monkeypatch, tmp_path):
+    config = test_client.application.config
+    monkeypatch.setitem(config, "TRANSFORMATION_CACHE_DIR", str(tmp_path))
+    monkeypatch.setitem(config, "TRANSFORMATION_CACHE_MAX_BYTES", 1024 * 1024)
+
+    first = test_client.get(f"/flamapy/to_cnf/{test_client.hubfile_id}")
+    assert first.status_code == 200
+    assert first.data.startswith(b"p cnf")
+
+    def fail_transform(*args, **kwargs):
+        raise AssertionError("A cached export must not run flamapy")
+
+    monkeypatch.setattr("app.modules.flamapy.services.transform_uvl", fail_transform)
+    hits = TransformationCacheService.hits
+
+    second = test_client.get(f"/flamapy/to_cnf/{test_client.hubfile_id}")
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert TransformationCacheService.hits == hits + 1
+
+    stats = test_client.get("/flamapy/cache/stats").get_json()["transformations"]
+    assert stats["hits"] >= 1 and stats["misses"] >= 1
+
+
+def test_to_glencoe_without_cache(test_client):
+    response = test_client.get(f"/flamapy/to_glencoe/{test_client.hubfile_id}")
+
+    assert response.status_code == 200
+    assert b'"features"' in response.data
+    assert "flamapy.uvl_glencoe.txt" in response.headers["Content-Disposition"]
+
+
+@pytest.mark.parametrize("format", ["glencoe", "splot", "cnf"])
+def test_transformations_of_unknown_files_are_not_found(test_client, format):
+    assert test_client.get(f"/flamapy/to_{format}/999999").status_code == 404
+
+
+def test_check_uvl_parses_once_per_checksum(test_client, monkeypatch):
+    response = test_client.get(f"/flamapy/check_uvl/{test_client.hubfile_id}")
+    assert response.status_code == 200
+    assert response.get_json() == {"message": "Valid Model"}
+    assert db.session.get(UVLValidation, "flamapy-checksum").valid
+
+    def fail_validate(*args, **kwargs):
+        raise AssertionError("A stored verdict must not parse the file again")
+
+    monkeypatch.setattr("app.modules.flamapy.services.validate_uvl", fail_validate)
+    assert test_client.get(f"/flamapy/check_uvl/{test_client.hubfile_id}").status_code == 200
+
+
+def test_check_uvl_reports_syntax_errors(test_client):
+    content = "features\n    Chat\n        nonsense\n"
+    with open(os.path.join(test_client.dataset_dir, "broken.uvl"), "w") as f:
+        f.write(content)
+    feature_model_id = db.session.get(Hubfile, test_client.hubfile_id).feature_model_id
+    hubfile = Hubfile(
+        name="broken.uvl", checksum="broken-checksum", size=len(content), feature_model_id=feature_model_id
+    )
+    db.session.add(hubfile)
+    db.session.commit()
+
+    response = test_client.get(f"/flamapy/check_uvl/{hubfile.id}")
+
+    assert response.status_code == 400
+    first_error = response.get_json()["errors"][0]
+    assert (first_error["line"], first_error["column"]) == (3, 8)
+    assert "nonsense" in first_error["message"]
+    assert db.session.get(UVLValidation, "broken-checksum").valid is False
+
+
+def test_saving_a_verdict_upserts_by_checksum(test_client):
+    repository = UVLValidationRepository()
+    # Written by another worker, outside this session
+    with db.engine.begin() as connection:
+        connection.execute(
+            UVLValidation.__table__.insert(),
+            {"checksum": "raced-checksum", "parser_version": "old", "valid": True, "errors": []},
+        )
+
+    errors = [{"line": 1, "column": 0, "message": "broken"}]
+    validation = repository.save("raced-checksum", "new", errors)
+
+    assert (validation.parser_version, validation.valid, validation.errors) == ("new", False, errors)
+    assert UVLValidation.query.filter_by(checksum="raced-checksum").count() == 1
+
+
+def test_check_dataset_validates_every_file_in_one_request(test_client, monkeypatch):
+    feature_model_id = db.session.get(Hubfile, test_client.hubfile_id).feature_model_id
+    for name, content in [("first.uvl", "features\n    A\n"), ("second.uvl", "features\n    B\n        optional\n")]:
+        with open(os.path.join(test_client.dataset_dir, name), "w") as f:
+            f.write(content)
+        db.session.add(
+            Hubfile(name=name, checksum=f"{name}-checksum", size=len(content), feature_model_id=feature_model_id)
+        )
+    db.session.commit()
+
+    response = test_client.get(f"/flamapy/check_dataset/{test_client.dataset_id}?stream=1")
+    assert response.mimetype == "application/x-ndjson"
+    streamed = {result["name"]: result for result in map(json.loads, response.data.decode().splitlines())}
+    assert streamed["first.uvl"]["valid"] is True
+    assert streamed["second.uvl"]["valid"] is False
+    assert db.session.get(UVLValidation, "second.uvl-checksum").errors == streamed["second.uvl"]["errors"]
+
+    def fail_validate(*args, **kwargs):
+        raise AssertionError("Stored verdicts must not parse the files again")
+
+    monkeypatch.setattr("app.modules.flamapy.services.validate_uvl", fail_validate)
+    document = test_client.get(f"/flamapy/check_dataset/{test_client.dataset_id}").get_json()
+
+    assert document["dataset_id"] == test_client.dataset_id
+    assert document["valid"] is False
+    assert {result["name"]: result["valid"] for result in document["files"]} == {
+        name: result["valid"] for name, result in streamed.items()
+    }
+
+
+def test_sat_validity_is_solved_once_per_checksum(test_client, monkeypatch):
+    first = test_client.get(f"/flamapy/valid/{test_client.hubfile_id}").get_json()
+
+    assert first["valid"] is True
+    assert first["cached"] is False and first["timed_out"] is False
+    assert first["variables"] == 5 and first["clauses"] > 0
+    assert db.session.get(SATCheck, "flamapy-checksum").satisfiable
+
+    def fail_check(*args, **kwargs):
+        raise AssertionError("A stored result must not run the solver")
+
+    monkeypatch.setattr("app.modules.flamapy.services.check_satisfiability", fail_check)
+    second = test_client.get(f"/flamapy/valid/{test_client.hubfile_id}").get_json()
+    assert second["cached"] is True
+    assert (second["valid"], second["clauses"]) == (True, first["clauses"])
+
+
+def test_sat_validity_detects_contradictions_and_respects_the_budget(tmp_path):
+    uvl_path = tmp_path / "contradiction.uvl"
+    uvl_path.write_text("features\n    A\n        mandatory\n            B\n\nconstraints\n    !B\n")
+
+    assert check_satisfiability(str(uvl_path), 10)["satisfiable"] is False
+    assert check_satisfiability(str(uvl_path), 0)["satisfiable"] is None
+
+
+@pytest.mark.parametrize("satisfiable", [True, None])
+def test_concurrent_sat_checks_share_one_solver_run(test_client, monkeypatch, satisfiable):
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def slow_check(uvl_path, time_budget):
+        calls.append(uvl_path)
+        started.set()
+        release.wait(5)
+        return {"satisfiable": satisfiable, "clauses": 3, "variables": 2, "solver_ms": 1.0}
+
+    monkeypatch.setattr("app.modules.flamapy.services.check_satisfiability", slow_check)
+    checksum = f"coalesced-{satisfiable}"
+    hubfile = SimpleNamespace(checksum=checksum, get_path=lambda: "coalesced.uvl")
+    results = []
+
+    def leader():
+        with test_client.application.app_context():
+            results.append(SATCheckService().check(hubfile, time_budget=5))
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait(5)
+    # The claim row is what another worker process would see
+    assert SATCheckClaimRepository().is_claimed(checksum)
+    threading.Timer(0.2, release.set).start()
+    follower = SATCheckService().check(hubfile, time_budget=5)
+    thread.join(5)
+
+    assert calls == ["coalesced.uvl"]
+    assert follower["coalesced"] is True and results[0]["coalesced"] is False
+    assert not SATCheckClaimRepository().is_claimed(checksum)
+    if satisfiable:
+        assert follower["satisfiable"] is True and follower["clauses"] == 3
+    else:
+        # Runs that hit the budget are not stored, so the waiting request times out too
+        assert follower["timed_out"] is True
+        assert db.session.get(SATCheck, checksum) is None
+
+
+def test_stale_sat_check_claims_are_taken_over(test_client):
+    claims = SATCheckClaimRepository()
+    assert claims.claim("stale-checksum", stale_after=60)
+    assert not claims.claim("stale-checksum", stale_after=60)
+
+    assert claims.claim("stale-checksum", stale_after=0)
+    claims.release("stale-checksum")
+
+
+def test_analyze_runs_requested_operations_once_per_checksum(test_client, monkeypatch):
+    response = test_client.get(f"/flamapy/analyze/{test_client.hubfile_id}?ops=valid,core,dead,false_optional,count")
+    operations = response.get_json()["operations"]
+
+    assert response.status_code == 200
+    assert operations["valid"]["result"] is True
+    assert operations["core"]["result"] == ["Chat", "Connection"]
+    assert operations["dead"]["result"] == []
+    # Server requires the optional Data Storage, which stays deselectable through Peer 2 Peer
+    assert operations["false_optional"]["result"] == []
+    assert operations["count"]["result"] == 3
+    assert not any(operation["cached"] for operation in operations.values())
+    assert ModelAnalysis.query.filter_by(checksum="flamapy-checksum").count() == 5
+
+    def fail_analyses(*args, **kwargs):
+        raise AssertionError("Stored results must not parse the model again")
+
+    monkeypatch.setattr("app.modules.flamapy.services.run_analyses", fail_analyses)
+    cached = test_client.get(f"/flamapy/analyze/{test_client.hubfile_id}?ops=count,dead").get_json()["operations"]
+    assert list(cached) == ["count", "dead"]
+    assert cached["count"] == {**operations["count"], "cached": True}
+
+
+def test_count_does_not_enumerate_configurations(tmp_path):
+    uvl_path = tmp_path / "optional.uvl"
+    uvl_path.write_text("features\n    Root\n        optional\n" + "".join(f"            F{i}\n" for i in range(40)))
+
+    started = time.perf_counter()
+    assert count_configurations(str(uvl_path))["result"] == 2**40
+    assert time.perf_counter() - started < 5
+
+
+def test_count_over_its_limits_keeps_the_other_results(test_client, monkeypatch):
+    def exceed(*args, **kwargs):
+        raise FlamapyJobLimitExceeded("count_configurations did not finish within 1 s")
+
+    monkeypatch.setattr("app.modules.flamapy.services.count_configurations", exceed)
+    uvl_path = os.path.join(test_client.dataset_dir, "flamapy.uvl")
+    hubfile = SimpleNamespace(checksum="bdd-limit-checksum", get_path=lambda: uvl_path)
+
+    results = ModelAnalysisService().analyze(hubfile, ["valid", "count"])
+
+    assert results["valid"]["result"] is True
+    assert results["count"]["timed_out"] is True and results["count"]["result"] is None
+    assert [analysis.operation for analysis in ModelAnalysis.query.filter_by(checksum="bdd-limit-checksum")] == [
+        "valid"
+    ]
+
+
+def test_analyze_rejects_unknown_operations(test_client):
+    response = test_client.get(f"/flamapy/analyze/{test_client.hubfile_id}?ops=valid,atomic_sets")
+
+    assert response.status_code == 400
+    assert "atomic_sets" in response.get_json()["error"]
+
+
+@pytest.fixture
+def flamapy_pool(test_client, monkeypatch):
+    config = test_client.application.config
+    monkeypatch.setitem(config, "FLAMAPY_POOL_WORKERS", 1)
+    monkeypatch.setitem(config, "FLAMAPY_JOB_TIMEOUT", 30)
+    monkeypatch.setitem(config, "FLAMAPY_JOB_MAX_MEMORY", 256 * 1024 * 1024)
+    pool = FlamapyPoolManager(test_client.application)
+    monkeypatch.setattr(test_client.application, "flamapy_pool", pool)
+    yield pool
+    pool.shutdown()
+
+
+def test_flamapy_pool_kills_jobs_over_their_limits(test_client, flamapy_pool):
+    uvl_path = os.path.join(test_client.dataset_dir, "flamapy.uvl")
+    assert flamapy_pool.run(validate_uvl, uvl_path) == []
+    # Workers have the flamapy jobs preloaded, without importing (and building) the Flask app
+    assert flamapy_pool.run(eval, "'app' in __import__('sys').modules") is False
+    worker_pid = flamapy_pool.run(os.getpid)
+    assert worker_pid != os.getpid()
+
+    with pytest.raises(FlamapyJobLimitExceeded, match="did not finish"):
+        flamapy_pool.run(time.sleep, 5, timeout=0.5)
+    with pytest.raises(FlamapyJobLimitExceeded, match="memory"):
+        flamapy_pool.run(bytes, 1024 * 1024 * 1024)
+    with pytest.raises(FlamapyJobError, match="ValueError"):
+        flamapy_pool.run(int, "not a number")
+
+    # Killed workers are replaced, so the pool keeps serving
+    assert flamapy_pool.run(os.getpid) not in (worker_pid, os.getpid())
+    stats = flamapy_pool.stats()
+    assert (stats["jobs"], stats["limit_kills"], stats["failures"], stats["restarts"]) == (7, 2, 1, 2)
+    assert stats["busy"] == 0 and 0 < stats["utilization"] <= 1
+    assert 0 < stats["peak_rss_mb"] < 256
+
+
+def test_routes_report_killed_flamapy_jobs(test_client, flamapy_pool, monkeypatch):
+    monkeypatch.setattr(flamapy_pool, "job_timeout", 0.001)
+
+    response = test_client.get(f"/flamapy/to_glencoe/{test_client.hubfile_id}")
+
+    assert response.status_code == 503
+    assert "did not finish" in response.get_json()["error"]
+    assert test_client.get("/flamapy/pool/stats").get_json()["limit_kills"] == 1
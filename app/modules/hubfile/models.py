@@ -3,6 +3,7 @@ from flask import request
 from app import db
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
+from app.modules.flamapy.models import UVLValidation
 
 
 class Hubfile(db.Model):
@@ -14,6 +15,13 @@ class Hubfile(db.Model):
     feature_model_id = db.Column(
         db.Integer, db.ForeignKey("feature_model.id"), nullable=False
     )
+    # Syntax check stored at upload time, shared by files with the same content
+    validation = db.relationship(
+        UVLValidation,
+        primaryjoin="foreign(Hubfile.checksum) == UVLValidation.checksum",
+        uselist=False,
+        viewonly=True,
+    )
 
     def get_formatted_size(self):
         from app.modules.dataset.services import SizeService
@@ -51,8 +59,15 @@ class Hubfile(db.Model):
 
 class HubfileViewRecord(db.Model):
     __tablename__ = "file_view_record"
+    __table_args__ = (
+        db.Index("ix_file_view_record_file_user_cookie", "file_id", "user_key", "view_cookie", unique=True),
+    )
+    dedup_columns = ("user_id", "file_id", "view_cookie")
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    # Anonymous visitors have no user_id, and NULLs never collide in a unique index
+    user_key = db.Column(db.Integer, db.Computed("COALESCE(user_id, 0)", persisted=True))
     file_id = db.Column(db.Integer, db.ForeignKey("file.id"), nullable=False)
     view_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     view_cookie = db.Column(db.String(36))
@@ -63,8 +78,15 @@ class HubfileViewRecord(db.Model):
 
 class HubfileDownloadRecord(db.Model):
     __tablename__ = "file_download_record"
+    __table_args__ = (
+        db.Index("ix_file_download_record_file_user_cookie", "file_id", "user_key", "download_cookie", unique=True),
+    )
+    dedup_columns = ("user_id", "file_id", "download_cookie")
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    # Anonymous visitors have no user_id, and NULLs never collide in a unique index
+    user_key = db.Column(db.Integer, db.Computed("COALESCE(user_id, 0)", persisted=True))
     file_id = db.Column(db.Integer, db.ForeignKey("file.id"))
     download_date = db.Column(
         db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
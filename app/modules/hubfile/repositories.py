@@ -1,8 +1,13 @@
-from sqlalchemy import func
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
 from app.modules.featuremodel.models import FeatureModel
 from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from app.modules.public.models import HubCounter
+from app.modules.public.repositories import CountedRepository
+from core.managers.record_buffer_manager import get_record_buffer
 from core.repositories.BaseRepository import BaseRepository
 from app import db
 
@@ -30,20 +35,50 @@ class HubfileRepository(BaseRepository):
             .first()
         )
 
+    def get_with_locations(self, ids: List[int]) -> List[Tuple[Hubfile, int, int]]:
+        """Resolves the given hubfiles together with their owner and dataset ids in a single query."""
+        return (
+            db.session.query(Hubfile, DataSet.user_id, DataSet.id)
+            .join(FeatureModel, Hubfile.feature_model_id == FeatureModel.id)
+            .join(DataSet, FeatureModel.data_set_id == DataSet.id)
+            .filter(Hubfile.id.in_(ids))
+            .all()
+        )
+
+
+class HubfileViewRecordRepository(CountedRepository):
+    counter_name = HubCounter.FEATURE_MODEL_VIEWS
 
-class HubfileViewRecordRepository(BaseRepository):
     def __init__(self):
         super().__init__(HubfileViewRecord)
 
-    def total_hubfile_views(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
+    def record_view(self, file_id: int, user_id: Optional[int], view_cookie: str):
+        get_record_buffer().record(
+            self,
+            user_id=user_id,
+            file_id=file_id,
+            view_date=datetime.now(timezone.utc),
+            view_cookie=view_cookie,
+        )
+
 
+class HubfileDownloadRecordRepository(CountedRepository):
+    counter_name = HubCounter.FEATURE_MODEL_DOWNLOADS
 
-class HubfileDownloadRecordRepository(BaseRepository):
     def __init__(self):
         super().__init__(HubfileDownloadRecord)
 
-    def total_hubfile_downloads(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
+    def record_downloads(self, file_ids: List[int], user_id: Optional[int], download_cookie: str):
+        download_date = datetime.now(timezone.utc)
+        get_record_buffer().record_many(
+            self,
+            [
+                {
+                    "user_id": user_id,
+                    "file_id": file_id,
+                    "download_date": download_date,
+                    "download_cookie": download_cookie,
+                }
+                for file_id in file_ids
+            ],
+        )
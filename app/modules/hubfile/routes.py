@@ -1,9 +1,7 @@
-from datetime import datetime, timezone
 import os
 import uuid
-import zipfile
-import io
 from flask import (
+    Response,
     current_app,
     jsonify,
     make_response,
@@ -12,48 +10,53 @@ from flask import (
     send_file,
 )
 from flask_login import current_user
+from app.modules.dataset.services import ArchiveCacheService, ZipStreamService
 from app.modules.hubfile import hubfile_bp
-from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
 from app.modules.hubfile.services import HubfileDownloadRecordService, HubfileService
+from core.http.caching import (
+    apply_cache_control,
+    file_last_modified,
+    is_not_modified,
+    not_modified_response,
+)
 
-from app import db
+archive_cache_service = ArchiveCacheService()
 
 
 @hubfile_bp.route("/file/download/<int:file_id>", methods=["GET"])
 def download_file(file_id):
     file = HubfileService().get_or_404(file_id)
     filename = file.name
+    dataset = file.feature_model.data_set
 
-    directory_path = f"uploads/user_{file.feature_model.data_set.user_id}/dataset_{file.feature_model.data_set_id}/"
+    directory_path = f"uploads/user_{dataset.user_id}/dataset_{file.feature_model.data_set_id}/"
     parent_directory_path = os.path.dirname(current_app.root_path)
     file_path = os.path.join(parent_directory_path, directory_path)
 
+    # Conditional and Range requests are answered by send_from_directory using the checksum as ETag
+    resp = make_response(
+        send_from_directory(
+            directory=file_path, path=filename, as_attachment=True, etag=file.checksum
+        )
+    )
+
     # Get the cookie from the request or generate a new one if it does not exist
     user_cookie = request.cookies.get("file_download_cookie")
     if not user_cookie:
         user_cookie = str(uuid.uuid4())
-
-    # Check if the download record already exists for this cookie
-    existing_record = HubfileDownloadRecord.query.filter_by(
-        user_id=current_user.id if current_user.is_authenticated else None,
-        file_id=file_id,
-        download_cookie=user_cookie,
-    ).first()
-
-    if not existing_record:
-        # Record the download in your database
-        HubfileDownloadRecordService().create(
+        # Save the cookie to the user's browser
+        resp.set_cookie("file_download_cookie", user_cookie)
+
+    # A 304 means the client already had the file, so it does not count as a download
+    if resp.status_code != 304:
+        # Queued in the record buffer, which drops duplicates for this cookie
+        HubfileDownloadRecordService().record_downloads(
+            [file_id],
             user_id=current_user.id if current_user.is_authenticated else None,
-            file_id=file_id,
-            download_date=datetime.now(timezone.utc),
             download_cookie=user_cookie,
         )
 
-    # Save the cookie to the user's browser
-    resp = make_response(
-        send_from_directory(directory=file_path, path=filename, as_attachment=True)
-    )
-    resp.set_cookie("file_download_cookie", user_cookie)
+    apply_cache_control(resp, published=dataset.ds_meta_data.dataset_doi is not None)
 
     return resp
 
@@ -62,45 +65,45 @@ def download_file(file_id):
 def view_file(file_id):
     file = HubfileService().get_or_404(file_id)
     filename = file.name
+    dataset = file.feature_model.data_set
+    published = dataset.ds_meta_data.dataset_doi is not None
 
-    directory_path = f"uploads/user_{file.feature_model.data_set.user_id}/dataset_{file.feature_model.data_set_id}/"
+    directory_path = f"uploads/user_{dataset.user_id}/dataset_{file.feature_model.data_set_id}/"
     parent_directory_path = os.path.dirname(current_app.root_path)
     file_path = os.path.join(parent_directory_path, directory_path, filename)
 
     try:
         if os.path.exists(file_path):
-            with open(file_path, "r") as f:
-                content = f.read()
+            last_modified = file_last_modified(file_path)
+            not_modified = is_not_modified(file.checksum, last_modified)
+            if not not_modified:
+                with open(file_path, "r") as f:
+                    content = f.read()
 
             user_cookie = request.cookies.get("view_cookie")
             if not user_cookie:
                 user_cookie = str(uuid.uuid4())
 
-            # Check if the view record already exists for this cookie
-            existing_record = HubfileViewRecord.query.filter_by(
+            # Register file view, queued in the record buffer
+            HubfileService().record_view(
+                file_id,
                 user_id=current_user.id if current_user.is_authenticated else None,
-                file_id=file_id,
                 view_cookie=user_cookie,
-            ).first()
-
-            if not existing_record:
-                # Register file view
-                new_view_record = HubfileViewRecord(
-                    user_id=current_user.id if current_user.is_authenticated else None,
-                    file_id=file_id,
-                    view_date=datetime.now(),
-                    view_cookie=user_cookie,
-                )
-                db.session.add(new_view_record)
-                db.session.commit()
+            )
 
             # Prepare response
-            response = jsonify({"success": True, "content": content})
+            if not_modified:
+                response = not_modified_response(file.checksum, published, last_modified)
+            else:
+                response = jsonify({"success": True, "content": content})
+                response.set_etag(file.checksum)
+                response.last_modified = last_modified
             if not request.cookies.get("view_cookie"):
                 response = make_response(response)
                 response.set_cookie(
                     "view_cookie", user_cookie, max_age=60 * 60 * 24 * 365 * 2
                 )
+            apply_cache_control(response, published)
 
             return response
         else:
@@ -122,57 +125,50 @@ def download_selected_files():
     except ValueError:
         return jsonify({"success": False, "error": "Invalid file IDs format"}), 400
 
-    # Crear un stream de bytes para el archivo ZIP
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w") as zip_file:
-        for file_id in file_ids:
-            file = HubfileService().get_or_404(file_id)
-            filename = file.name
-
-            directory_path = (
-                f"uploads/user_{file.feature_model.data_set.user_id}/"
-                + f"dataset_{file.feature_model.data_set_id}/"
-            )
-
-            parent_directory_path = os.path.dirname(current_app.root_path)
-            file_path = os.path.join(parent_directory_path, directory_path, filename)
+    # Resolve every file with its owner and dataset in a single query
+    file_ids = list(dict.fromkeys(file_ids))
+    parent_directory_path = os.path.dirname(current_app.root_path)
+    files = HubfileService().get_with_paths(file_ids, base_dir=parent_directory_path)
 
-            zip_file.write(file_path, arcname=filename)  # Añadir el archivo al ZIP
+    entries = [(file.name, file_path) for file, file_path in files]
+    checksums = {file.name: file.checksum for file, _ in files}
 
-            # Get the cookie from the request or generate a new one if it does not exist
-            user_cookie = request.cookies.get("file_download_cookie")
-            if not user_cookie:
-                user_cookie = str(uuid.uuid4())
+    # Get the cookie from the request or generate a new one if it does not exist
+    user_cookie = request.cookies.get("file_download_cookie")
+    if not user_cookie:
+        user_cookie = str(uuid.uuid4())
 
-            # Check if the download record already exists for this cookie
-            existing_record = HubfileDownloadRecord.query.filter_by(
-                user_id=current_user.id if current_user.is_authenticated else None,
-                file_id=file_id,
-                download_cookie=user_cookie,
-            ).first()
-
-            if not existing_record:
-                # Record the download in your database
-                HubfileDownloadRecordService().create(
-                    user_id=current_user.id if current_user.is_authenticated else None,
-                    file_id=file_id,
-                    download_date=datetime.now(timezone.utc),
-                    download_cookie=user_cookie,
-                )
+    # Record every download for this cookie, written in bulk by the record buffer
+    HubfileDownloadRecordService().record_downloads(
+        file_ids,
+        user_id=current_user.id if current_user.is_authenticated else None,
+        download_cookie=user_cookie,
+    )
 
     file_id_str = "_".join(str(file_id) for file_id in file_ids)
     zip_filename = f"models_{file_id_str}.zip"
 
     # Preparar la respuesta con el archivo ZIP
-    zip_buffer.seek(0)
-    response = make_response(
-        send_file(
-            zip_buffer,
-            mimetype="application/zip",
-            as_attachment=True,
-            download_name=zip_filename,
+    if archive_cache_service.is_enabled():
+        key = archive_cache_service.key_for(
+            archive_cache_service.fingerprints(entries, checksums)
+        )
+        response = make_response(
+            send_file(
+                archive_cache_service.get_or_build(key, entries),
+                mimetype="application/zip",
+                as_attachment=True,
+                download_name=zip_filename,
+            )
+        )
+    else:
+        # Se genera el ZIP mientras se envía, sin cargarlo entero en memoria
+        response = Response(
+            ZipStreamService().stream(entries), mimetype="application/zip"
+        )
+        response.headers["Content-Disposition"] = (
+            f"attachment; filename={zip_filename}"
         )
-    )
     response.set_cookie("file_download_cookie", user_cookie)
 
     return response
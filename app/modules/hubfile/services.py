@@ -1,4 +1,6 @@
 import os
+from typing import List, Optional
+from flask import abort
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
 from app.modules.hubfile.models import Hubfile
@@ -7,6 +9,8 @@ from app.modules.hubfile.repositories import (
     HubfileRepository,
     HubfileViewRecordRepository,
 )
+from app.modules.public.models import HubCounter
+from app.modules.public.services import HubCounterService
 from core.services.BaseService import BaseService
 
 
@@ -15,6 +19,7 @@ class HubfileService(BaseService):
         super().__init__(HubfileRepository())
         self.hubfile_view_record_repository = HubfileViewRecordRepository()
         self.hubfile_download_record_repository = HubfileDownloadRecordRepository()
+        self.hub_counter_service = HubCounterService()
 
     def get_owner_user_by_hubfile(self, hubfile: Hubfile) -> User:
         return self.repository.get_owner_user_by_hubfile(hubfile)
@@ -38,14 +43,41 @@ class HubfileService(BaseService):
 
         return path
 
+    def get_with_paths(self, ids: List[int], base_dir: Optional[str] = None) -> List[tuple]:
+        """
+        Returns ``(hubfile, path)`` pairs in the order of ``ids``, aborting with 404
+        if any of them does not exist.
+        """
+        rows = self.repository.get_with_locations(ids)
+        by_id = {hubfile.id: (hubfile, user_id, dataset_id) for hubfile, user_id, dataset_id in rows}
+        missing = [id for id in ids if id not in by_id]
+        if missing:
+            abort(404, description=f"Files not found: {missing}")
+
+        if base_dir is None:
+            base_dir = os.getenv("WORKING_DIR", "")
+        pairs = []
+        for id in ids:
+            hubfile, user_id, dataset_id = by_id[id]
+            path = os.path.join(
+                base_dir, "uploads", f"user_{user_id}", f"dataset_{dataset_id}", hubfile.name
+            )
+            pairs.append((hubfile, path))
+        return pairs
+
     def total_hubfile_views(self) -> int:
-        return self.hubfile_view_record_repository.total_hubfile_views()
+        return self.hub_counter_service.get(HubCounter.FEATURE_MODEL_VIEWS)
+
+    def record_view(self, file_id: int, user_id: Optional[int], view_cookie: str):
+        return self.hubfile_view_record_repository.record_view(file_id, user_id, view_cookie)
 
     def total_hubfile_downloads(self) -> int:
-        hubfile_download_record_repository = HubfileDownloadRecordRepository()
-        return hubfile_download_record_repository.total_hubfile_downloads()
+        return self.hub_counter_service.get(HubCounter.FEATURE_MODEL_DOWNLOADS)
 
 
 class HubfileDownloadRecordService(BaseService):
     def __init__(self):
         super().__init__(HubfileDownloadRecordRepository())
+
+    def record_downloads(self, file_ids: List[int], user_id: Optional[int], download_cookie: str):
+        return self.repository.record_downloads(file_ids, user_id, download_cookie)
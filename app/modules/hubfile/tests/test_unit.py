@@ -1,4 +1,20 @@
+import io
+import os
+import shutil
+from datetime import datetime, timezone
+from zipfile import ZipFile
+
 import pytest
+from sqlalchemy import event
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from app.modules.hubfile.repositories import HubfileDownloadRecordRepository
+
+UVL_CONTENT = "features\n    Root\n        optional\n            Leaf\n"
 
 
 @pytest.fixture(scope="module")
@@ -7,12 +23,63 @@ def test_client(test_client):
     Extends the test_client fixture to add additional specific data for module testing.
     """
     with test_client.application.app_context():
-        # Add HERE new elements to the database that you want to exist in the test context.
-        # DO NOT FORGET to use db.session.add(<element>) and db.session.commit() to save the data.
-        pass
+        user = User(email="hubfile_user@example.com", password="test1234")
+        db.session.add(user)
+        db.session.commit()
+
+        ds_meta_data = DSMetaData(
+            title="Hubfile dataset",
+            description="Dataset used by the hubfile tests",
+            publication_type=PublicationType.NONE,
+            dataset_doi="10.1234/hubfile",
+        )
+        db.session.add(ds_meta_data)
+        db.session.commit()
+
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=ds_meta_data.id)
+        db.session.add(dataset)
+        db.session.commit()
+
+        feature_model = FeatureModel(data_set_id=dataset.id)
+        db.session.add(feature_model)
+        db.session.commit()
+
+        dataset_dir = f"uploads/user_{user.id}/dataset_{dataset.id}"
+        os.makedirs(dataset_dir, exist_ok=True)
+        with open(os.path.join(dataset_dir, "hubfile.uvl"), "w") as f:
+            f.write(UVL_CONTENT)
+
+        hubfile = Hubfile(
+            name="hubfile.uvl",
+            checksum="hubfile-checksum",
+            size=len(UVL_CONTENT),
+            feature_model_id=feature_model.id,
+        )
+        db.session.add(hubfile)
+        db.session.commit()
+
+        other_hubfiles = []
+        for index in range(3):
+            name = f"other_{index}.uvl"
+            with open(os.path.join(dataset_dir, name), "w") as f:
+                f.write(UVL_CONTENT)
+            other_hubfile = Hubfile(
+                name=name,
+                checksum=f"other-checksum-{index}",
+                size=len(UVL_CONTENT),
+                feature_model_id=feature_model.id,
+            )
+            db.session.add(other_hubfile)
+            other_hubfiles.append(other_hubfile)
+        db.session.commit()
+
+        test_client.hubfile_id = hubfile.id
+        test_client.other_hubfile_ids = [other.id for other in other_hubfiles]
 
     yield test_client
 
+    shutil.rmtree(dataset_dir, ignore_errors=True)
+
 
 def test_sample_assertion(test_client):
     """
@@ -24,3 +91,194 @@ def test_sample_assertion(test_client):
     assert (
         greeting == "Hello, World!"
     ), "The greeting does not coincide with 'Hello, World!'"
+
+
+def test_download_file_uses_checksum_etag(test_client):
+    test_client.delete_cookie("file_download_cookie")
+    response = test_client.get(f"/file/download/{test_client.hubfile_id}")
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"hubfile-checksum"'
+    # A shared cache must not store the dedup cookie and hand it to everyone
+    assert "file_download_cookie" in response.headers["Set-Cookie"]
+    assert response.cache_control.private and not response.cache_control.public
+    assert response.cache_control.max_age
+
+    response = test_client.get(f"/file/download/{test_client.hubfile_id}")
+
+    assert "Set-Cookie" not in response.headers
+    assert "public" in response.headers["Cache-Control"]
+
+
+def test_download_file_not_modified(test_client):
+    records = HubfileDownloadRecord.query.count()
+
+    response = test_client.get(
+        f"/file/download/{test_client.hubfile_id}",
+        headers={"If-None-Match": '"hubfile-checksum"'},
+    )
+
+    assert response.status_code == 304
+    assert response.data == b""
+    assert HubfileDownloadRecord.query.count() == records
+
+
+def test_download_file_range(test_client):
+    response = test_client.get(
+        f"/file/download/{test_client.hubfile_id}", headers={"Range": "bytes=0-7"}
+    )
+
+    assert response.status_code == 206
+    assert response.data == UVL_CONTENT.encode()[:8]
+    assert response.headers["Content-Range"] == f"bytes 0-7/{len(UVL_CONTENT)}"
+
+
+def test_view_file_not_modified(test_client):
+    response = test_client.get(f"/file/view/{test_client.hubfile_id}")
+    assert response.status_code == 200
+    assert response.get_json()["content"] == UVL_CONTENT
+
+    response = test_client.get(
+        f"/file/view/{test_client.hubfile_id}",
+        headers={"If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status_code == 304
+
+
+def count_statements(test_client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = test_client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return response, len(statements)
+
+
+def test_download_selected_files_batches_queries(test_client):
+    test_client.delete_cookie("file_download_cookie")
+    ids = [test_client.hubfile_id] + test_client.other_hubfile_ids
+    records = HubfileDownloadRecord.query.count()
+
+    _, one_file_statements = count_statements(
+        test_client, f"/dataset/download_selected?file_ids={ids[0]}"
+    )
+    test_client.delete_cookie("file_download_cookie")
+    response, all_files_statements = count_statements(
+        test_client, f"/dataset/download_selected?file_ids={','.join(map(str, ids))}"
+    )
+
+    assert response.status_code == 200
+    assert all_files_statements == one_file_statements
+    assert HubfileDownloadRecord.query.count() == records + 1 + len(ids)
+    with ZipFile(io.BytesIO(response.data)) as zipf:
+        assert sorted(zipf.namelist()) == sorted(
+            ["hubfile.uvl", "other_0.uvl", "other_1.uvl", "other_2.uvl"]
+        )
+
+
+def test_download_selected_files_unknown_id(test_client):
+    response = test_client.get(
+        f"/dataset/download_selected?file_ids={test_client.hubfile_id},999999"
+    )
+
+    assert response.status_code == 404
+
+
+def test_record_buffer_writes_behind(test_client, monkeypatch):
+    record_buffer = test_client.application.record_buffer
+    monkeypatch.setattr(record_buffer, "max_delay", 60)
+    monkeypatch.setattr(record_buffer, "max_size", 100)
+    test_client.delete_cookie("view_cookie")
+    views = HubfileViewRecord.query.count()
+
+    for _ in range(3):
+        response = test_client.get(f"/file/view/{test_client.hubfile_id}")
+        assert response.status_code == 200
+
+    # Repeated views with the same cookie are queued once and not written yet
+    assert record_buffer.queue_depth() == 1
+    assert HubfileViewRecord.query.count() == views
+
+    record_buffer.flush()
+
+    assert record_buffer.queue_depth() == 0
+    assert HubfileViewRecord.query.count() == views + 1
+    assert record_buffer.stats()["flushed_records"] >= 1
+
+
+def test_record_buffer_retries_failed_flushes(test_client, monkeypatch):
+    record_buffer = test_client.application.record_buffer
+    monkeypatch.setattr(record_buffer, "max_delay", 60)
+    monkeypatch.setattr(record_buffer, "max_retries", 2)
+    records = HubfileDownloadRecord.query.count()
+    dropped = record_buffer.stats()["dropped_records"]
+    row = {
+        "user_id": None,
+        "file_id": test_client.hubfile_id,
+        "download_date": datetime.now(timezone.utc),
+        "download_cookie": "retried-cookie",
+    }
+    create_many = HubfileDownloadRecordRepository.create_many_ignoring_duplicates
+
+    def unavailable(self, rows, commit=True):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(HubfileDownloadRecordRepository, "create_many_ignoring_duplicates", unavailable)
+    record_buffer.record_many(HubfileDownloadRecordRepository(), [row])
+
+    # A failed batch stays queued and is written by the next flush that succeeds
+    record_buffer.flush()
+    assert record_buffer.queue_depth() == 1
+    monkeypatch.setattr(HubfileDownloadRecordRepository, "create_many_ignoring_duplicates", create_many)
+    record_buffer.flush()
+    assert record_buffer.queue_depth() == 0
+    assert HubfileDownloadRecord.query.count() == records + 1
+
+    # After max_retries failed retries the batch is dropped
+    monkeypatch.setattr(HubfileDownloadRecordRepository, "create_many_ignoring_duplicates", unavailable)
+    record_buffer.record_many(HubfileDownloadRecordRepository(), [dict(row, download_cookie="dropped-cookie")])
+    for _ in range(3):
+        assert record_buffer.queue_depth() == 1
+        record_buffer.flush()
+
+    assert record_buffer.queue_depth() == 0
+    assert record_buffer.stats()["dropped_records"] == dropped + 1
+
+
+def test_download_records_ignore_duplicates(test_client):
+    user = User.query.filter_by(email="hubfile_user@example.com").first()
+    repository = HubfileDownloadRecordRepository()
+    records = HubfileDownloadRecord.query.count()
+    row = {
+        "user_id": user.id,
+        "file_id": test_client.hubfile_id,
+        "download_date": datetime.now(timezone.utc),
+        "download_cookie": "duplicated-cookie",
+    }
+
+    repository.create_many_ignoring_duplicates([row])
+    repository.create_many_ignoring_duplicates([row, dict(row, download_cookie="another-cookie")])
+
+    assert HubfileDownloadRecord.query.count() == records + 2
+
+
+def test_anonymous_download_records_ignore_duplicates(test_client):
+    repository = HubfileDownloadRecordRepository()
+    records = HubfileDownloadRecord.query.count()
+    row = {
+        "user_id": None,
+        "file_id": test_client.hubfile_id,
+        "download_date": datetime.now(timezone.utc),
+        "download_cookie": "anonymous-cookie",
+    }
+
+    inserted = [repository.create_many_ignoring_duplicates([row]) for _ in range(3)]
+
+    assert inserted == [1, 0, 0]
+    assert HubfileDownloadRecord.query.count() == records + 1
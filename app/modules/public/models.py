@@ -0,0 +1,20 @@
+from app import db
+
+
+class HubCounter(db.Model):
+    __tablename__ = "hub_counters"
+
+    SYNCHRONIZED_DATASETS = "synchronized_datasets"
+    FEATURE_MODELS = "feature_models"
+    DATASET_DOWNLOADS = "dataset_downloads"
+    DATASET_VIEWS = "dataset_views"
+    FEATURE_MODEL_DOWNLOADS = "feature_model_downloads"
+    FEATURE_MODEL_VIEWS = "feature_model_views"
+    # Bumped whenever the published catalog changes, invalidating cached search results
+    CATALOG_VERSION = "catalog_version"
+
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<HubCounter {self.name}={self.value}>"
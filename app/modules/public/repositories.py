@@ -0,0 +1,48 @@
+from typing import Dict, List
+
+from sqlalchemy import update
+
+from app.modules.public.models import HubCounter
+from core.repositories.BaseRepository import BaseRepository
+
+
+class HubCounterRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(HubCounter)
+
+    def get_value(self, name: str) -> int:
+        value = self.session.query(self.model.value).filter(self.model.name == name).scalar()
+        return value if value is not None else 0
+
+    def get_values(self) -> Dict[str, int]:
+        return dict(self.session.query(self.model.name, self.model.value).all())
+
+    def increment(self, name: str, amount: int = 1, commit: bool = True):
+        if amount:
+            # A single UPDATE ... SET value = value + n so concurrent writers never lose increments
+            statement = (
+                update(self.model)
+                .where(self.model.name == name)
+                .values(value=self.model.value + amount)
+            )
+            if not self.session.execute(statement).rowcount:
+                self.create_many_ignoring_duplicates([{"name": name, "value": 0}], commit=False)
+                self.session.execute(statement)
+        if commit:
+            self.session.commit()
+
+    def replace_all(self, values: Dict[str, int]):
+        self.session.query(self.model).delete()
+        self.session.add_all(self.model(name=name, value=value) for name, value in values.items())
+        self.session.commit()
+
+
+class CountedRepository(BaseRepository):
+    """Repository whose bulk inserts also add the rows written to a hub counter."""
+
+    counter_name = None
+
+    def create_many_ignoring_duplicates(self, rows: List[dict], commit: bool = True) -> int:
+        created = super().create_many_ignoring_duplicates(rows, commit=False)
+        HubCounterRepository().increment(self.counter_name, created, commit=commit)
+        return created
@@ -1,41 +1,62 @@
 import logging
 
-from flask import render_template
+from flask import render_template, session
+from flask_login import current_user
 
+from app.modules.dataset.signals import dataset_synchronized
 from app.modules.featuremodel.services import FeatureModelService
 from app.modules.public import public_bp
 from app.modules.dataset.services import DataSetService
+from core.managers.response_cache_manager import get_response_cache
 
 logger = logging.getLogger(__name__)
 
+INDEX_CACHE_PREFIX = "public.index"
 
-@public_bp.route("/")
-def index():
-    logger.info("Access index")
+
+@dataset_synchronized.connect
+def invalidate_index(sender, **extra):
+    sender.response_cache.invalidate(INDEX_CACHE_PREFIX)
+
+
+def index_statistics():
     dataset_service = DataSetService()
     feature_model_service = FeatureModelService()
 
-    # Statistics: total datasets and feature models
-    datasets_counter = dataset_service.count_synchronized_datasets()
-    feature_models_counter = feature_model_service.count_feature_models()
-
-    # Statistics: total downloads
-    total_dataset_downloads = dataset_service.total_dataset_downloads()
-    total_feature_model_downloads = (
-        feature_model_service.total_feature_model_downloads()
+    return {
+        # Statistics: total datasets and feature models
+        "datasets_counter": dataset_service.count_synchronized_datasets(),
+        "feature_models_counter": feature_model_service.count_feature_models(),
+        # Statistics: total downloads
+        "total_dataset_downloads": dataset_service.total_dataset_downloads(),
+        "total_feature_model_downloads": feature_model_service.total_feature_model_downloads(),
+        # Statistics: total views
+        "total_dataset_views": dataset_service.total_dataset_views(),
+        "total_feature_model_views": feature_model_service.total_feature_model_views(),
+    }
+
+
+def render_index():
+    response_cache = get_response_cache()
+
+    latest_datasets = response_cache.get_or_set(
+        f"{INDEX_CACHE_PREFIX}.latest_datasets",
+        lambda: render_template(
+            "public/latest_datasets.html",
+            datasets=DataSetService().latest_synchronized(profile="card"),
+        ),
     )
+    statistics = response_cache.get_or_set(f"{INDEX_CACHE_PREFIX}.statistics", index_statistics)
 
-    # Statistics: total views
-    total_dataset_views = dataset_service.total_dataset_views()
-    total_feature_model_views = feature_model_service.total_feature_model_views()
-
-    return render_template(
-        "public/index.html",
-        datasets=dataset_service.latest_synchronized(),
-        datasets_counter=datasets_counter,
-        feature_models_counter=feature_models_counter,
-        total_dataset_downloads=total_dataset_downloads,
-        total_feature_model_downloads=total_feature_model_downloads,
-        total_dataset_views=total_dataset_views,
-        total_feature_model_views=total_feature_model_views,
-    )
+    return render_template("public/index.html", latest_datasets=latest_datasets, **statistics)
+
+
+@public_bp.route("/")
+def index():
+    logger.info("Access index")
+
+    # Logged-out visitors without pending messages all see the same page
+    if current_user.is_anonymous and not session.get("_flashes"):
+        return get_response_cache().get_or_set(f"{INDEX_CACHE_PREFIX}.page", render_index)
+
+    return render_index()
@@ -0,0 +1,10 @@
+from app.modules.public.services import HubCounterService
+from core.seeders.BaseSeeder import BaseSeeder
+
+
+class HubCounterSeeder(BaseSeeder):
+
+    priority = 100  # Runs after every seeder that creates counted rows
+
+    def run(self):
+        HubCounterService().rebuild()
@@ -0,0 +1,47 @@
+import logging
+from typing import Dict
+
+from app.modules.dataset.repositories import (
+    DataSetRepository,
+    DSDownloadRecordRepository,
+    DSViewRecordRepository,
+)
+from app.modules.featuremodel.repositories import FeatureModelRepository
+from app.modules.hubfile.repositories import (
+    HubfileDownloadRecordRepository,
+    HubfileViewRecordRepository,
+)
+from app.modules.public.models import HubCounter
+from app.modules.public.repositories import HubCounterRepository
+from core.services.BaseService import BaseService
+
+logger = logging.getLogger(__name__)
+
+
+class HubCounterService(BaseService):
+    def __init__(self):
+        super().__init__(HubCounterRepository())
+
+    def get(self, name: str) -> int:
+        return self.repository.get_value(name)
+
+    def get_all(self) -> Dict[str, int]:
+        return self.repository.get_values()
+
+    def increment(self, name: str, amount: int = 1, commit: bool = True):
+        return self.repository.increment(name, amount, commit=commit)
+
+    def rebuild(self) -> Dict[str, int]:
+        """Recomputes every counter from the source tables."""
+        values = {
+            HubCounter.SYNCHRONIZED_DATASETS: DataSetRepository().count_synchronized_datasets(),
+            HubCounter.FEATURE_MODELS: FeatureModelRepository().count(),
+            HubCounter.DATASET_DOWNLOADS: DSDownloadRecordRepository().count(),
+            HubCounter.DATASET_VIEWS: DSViewRecordRepository().count(),
+            HubCounter.FEATURE_MODEL_DOWNLOADS: HubfileDownloadRecordRepository().count(),
+            HubCounter.FEATURE_MODEL_VIEWS: HubfileViewRecordRepository().count(),
+            HubCounter.CATALOG_VERSION: self.get(HubCounter.CATALOG_VERSION) + 1,
+        }
+        self.repository.replace_all(values)
+        logger.info(f"Rebuilt hub counters: {values}")
+        return values
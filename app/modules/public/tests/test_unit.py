@@ -0,0 +1,159 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.dataset.repositories import DSViewRecordRepository
+from app.modules.dataset.services import DataSetService
+from app.modules.public.models import HubCounter
+from app.modules.public.services import HubCounterService
+
+
+@pytest.fixture(scope="module")
+def test_client(test_client):
+    """
+    Extends the test_client fixture to add additional specific data for module testing.
+    """
+    with test_client.application.app_context():
+        user = User(email="public_user@example.com", password="test1234")
+        db.session.add(user)
+        db.session.commit()
+
+        ds_meta_data = DSMetaData(
+            title="Public dataset",
+            description="Dataset used by the public tests",
+            publication_type=PublicationType.NONE,
+            tags="public",
+        )
+        db.session.add(ds_meta_data)
+        db.session.commit()
+
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=ds_meta_data.id)
+        db.session.add(dataset)
+        db.session.commit()
+
+        test_client.dataset_id = dataset.id
+        test_client.ds_meta_data_id = ds_meta_data.id
+
+    yield test_client
+
+
+def test_index_reads_counters(test_client):
+    HubCounterService().increment(HubCounter.DATASET_DOWNLOADS, 42)
+
+    response = test_client.get("/")
+
+    assert response.status_code == 200
+    assert b"42 datasets downloaded" in response.data
+
+
+def test_publishing_dataset_updates_counter(test_client):
+    dataset_service = DataSetService()
+    before = dataset_service.count_synchronized_datasets()
+
+    dataset_service.update_dsmetadata(test_client.ds_meta_data_id, dataset_doi="10.1234/public")
+    assert dataset_service.count_synchronized_datasets() == before + 1
+
+    dataset_service.update_dsmetadata(test_client.ds_meta_data_id, dataset_doi="10.1234/public-v2")
+    assert dataset_service.count_synchronized_datasets() == before + 1
+
+    dataset_service.update_dsmetadata(test_client.ds_meta_data_id, dataset_doi=None)
+    assert dataset_service.count_synchronized_datasets() == before
+
+
+def test_uploads_keep_counter_in_step(test_client):
+    dataset_service = DataSetService()
+    user = User.query.filter_by(email="public_user@example.com").first()
+    author = SimpleNamespace(profile=SimpleNamespace(surname="Doe", name="Jane", affiliation=None, orcid=None))
+
+    def upload(doi):
+        form = SimpleNamespace(
+            get_dsmetadata=lambda: {
+                "title": f"Uploaded {doi or 'blank'}",
+                "description": "Uploaded by the public tests",
+                "publication_type": PublicationType.NONE,
+                "publication_doi": "",
+                "dataset_doi": doi,
+                "tags": "",
+            },
+            get_authors=lambda: [],
+            feature_models=[],
+        )
+        author.id = user.id
+        return dataset_service.create_from_form(form=form, current_user=author)
+
+    before = HubCounterService().rebuild()[HubCounter.SYNCHRONIZED_DATASETS]
+
+    # Blank DOI field: stored as NULL, so every published check agrees it is unpublished
+    blank = upload("")
+    assert blank.ds_meta_data.dataset_doi is None
+    assert dataset_service.count_synchronized_datasets() == before
+    dataset_service.update_dsmetadata(blank.ds_meta_data_id, dataset_doi=None)
+    dataset_service.update_dsmetadata(blank.ds_meta_data_id, dataset_doi=" ")
+    assert dataset_service.count_synchronized_datasets() == before
+
+    # DOI typed in the form, later replaced by the deposition DOI
+    typed = upload("10.1234/typed")
+    assert dataset_service.count_synchronized_datasets() == before + 1
+    dataset_service.update_dsmetadata(typed.ds_meta_data_id, dataset_doi="10.1234/deposition")
+    assert dataset_service.count_synchronized_datasets() == before + 1
+
+    assert HubCounterService().rebuild()[HubCounter.SYNCHRONIZED_DATASETS] == before + 1
+
+
+def test_records_update_counter_once(test_client):
+    user = User.query.filter_by(email="public_user@example.com").first()
+    before = HubCounterService().get(HubCounter.DATASET_VIEWS)
+    row = {"user_id": user.id, "dataset_id": test_client.dataset_id, "view_cookie": "public-cookie"}
+
+    DSViewRecordRepository().create_many_ignoring_duplicates([row, dict(row, view_cookie="other-cookie")])
+    DSViewRecordRepository().create_many_ignoring_duplicates([row])
+
+    assert HubCounterService().get(HubCounter.DATASET_VIEWS) == before + 2
+
+
+def test_rebuild_counters(test_client):
+    HubCounterService().increment(HubCounter.FEATURE_MODEL_VIEWS, 1000)
+
+    values = HubCounterService().rebuild()
+
+    assert values[HubCounter.DATASET_VIEWS] == DSViewRecordRepository().count()
+    assert HubCounterService().get(HubCounter.FEATURE_MODEL_VIEWS) == values[HubCounter.FEATURE_MODEL_VIEWS]
+    assert HubCounterService().get_all() == values
+
+
+def test_index_is_cached_for_anonymous_visitors(test_client, monkeypatch):
+    response_cache = test_client.application.response_cache
+    monkeypatch.setattr(response_cache, "ttl", 60)
+    response_cache.invalidate()
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    test_client.get("/")
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = test_client.get("/")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    assert response.status_code == 200
+    assert statements == []
+
+
+def test_index_cache_invalidated_on_synchronization(test_client, monkeypatch):
+    response_cache = test_client.application.response_cache
+    monkeypatch.setattr(response_cache, "ttl", 60)
+    response_cache.invalidate()
+
+    assert b"Public dataset" not in test_client.get("/").data
+
+    DataSetService().update_dsmetadata(test_client.ds_meta_data_id, dataset_doi="10.1234/public-cached")
+
+    assert b"Public dataset" in test_client.get("/").data
+    DataSetService().update_dsmetadata(test_client.ds_meta_data_id, dataset_doi=None)
@@ -191,11 +191,7 @@ class ZenodoService(BaseService):
                 }
                 for author in dataset.ds_meta_data.authors
             ],
-            "keywords": (
-                ["uvlhub"]
-                if not dataset.ds_meta_data.tags
-                else dataset.ds_meta_data.tags.split(", ") + ["uvlhub"]
-            ),
+            "keywords": dataset.ds_meta_data.tag_labels() + ["uvlhub"],
             "access_right": "open",
             "license": "CC-BY-4.0",
         }
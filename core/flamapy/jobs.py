@@ -0,0 +1,266 @@
+"""
+CPU-heavy flamapy work run by the flamapy pool's worker processes. The pool's
+fork server imports this module before forking workers, so it must not import
+``app``: that would build a whole Flask application in every worker.
+"""
+import threading
+import time
+from typing import List
+
+from antlr4 import CommonTokenStream, FileStream
+from antlr4.error.ErrorListener import ErrorListener
+from flamapy.metamodels.bdd_metamodel.models import BDDModel
+from flamapy.metamodels.fm_metamodel.transformations import (
+    UVLReader,
+    GlencoeWriter,
+    SPLOTWriter,
+)
+from flamapy.metamodels.pysat_metamodel.transformations import FmToPysat, DimacsWriter
+from pysat.solvers import Solver
+
+from uvl.UVLCustomLexer import UVLCustomLexer
+from uvl.UVLPythonParser import UVLPythonParser
+
+TRANSFORMATION_FORMATS = ("cnf", "splot", "glencoe")
+# Answered by run_analyses on a shared solver, in this order
+SAT_ANALYSIS_OPERATIONS = ("valid", "core", "dead", "false_optional")
+# Counting enumerates nothing: count_configurations counts the paths of the model's BDD
+ANALYSIS_OPERATIONS = SAT_ANALYSIS_OPERATIONS + ("count",)
+
+
+class UVLErrorListener(ErrorListener):
+    def __init__(self):
+        self.errors = []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.errors.append({"line": line, "column": column, "message": msg})
+
+
+def validate_uvl(uvl_path: str) -> List[dict]:
+    """
+    Parses a UVL file with the UVL grammar and returns its syntax errors as
+    ``{"line", "column", "message"}`` objects; an empty list means the model is
+    valid.
+    """
+    try:
+        input_stream = FileStream(uvl_path, encoding="utf-8")
+    except UnicodeDecodeError as exc:
+        return [{"line": 0, "column": 0, "message": f"The file is not valid UTF-8: {exc.reason}"}]
+
+    error_listener = UVLErrorListener()
+    lexer = UVLCustomLexer(input_stream)
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(error_listener)
+
+    parser = UVLPythonParser(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+    parser.addErrorListener(error_listener)
+    parser.featureModel()
+
+    return error_listener.errors
+
+
+def transform_uvl(uvl_path: str, formats=TRANSFORMATION_FORMATS) -> dict:
+    """
+    Parses a UVL file once and serializes the model to every requested format.
+    It lives at module level so it can be sent to worker processes.
+    """
+    model = UVLReader(uvl_path).transform()
+
+    results = {}
+    for format in formats:
+        if format == "cnf":
+            sat = FmToPysat(model).transform()
+            results[format] = DimacsWriter(None, sat).transform()
+        elif format == "splot":
+            results[format] = SPLOTWriter(None, model).transform()
+        elif format == "glencoe":
+            results[format] = GlencoeWriter(None, model).transform()
+    return results
+
+
+def analyze_uvl(uvl_path: str) -> dict:
+    """
+    Parses a UVL model once and returns its metrics and identifiers. Metrics are
+    the number of features and cross-tree constraints, and the depth of the
+    feature tree: the number of edges from the root to the deepest feature.
+    Identifiers are the feature names and the names referenced by constraints.
+    """
+    model = UVLReader(uvl_path).transform()
+
+    depth, pending = 0, [(model.root, 0)] if model.root is not None else []
+    while pending:
+        feature, level = pending.pop()
+        depth = max(depth, level)
+        pending.extend((child, level + 1) for child in feature.get_children())
+
+    constraint_names = set()
+    for constraint in model.get_constraints():
+        nodes = [constraint.ast.root]
+        while nodes:
+            node = nodes.pop()
+            if node is None:
+                continue
+            if node.is_term():
+                constraint_names.add(str(node.data))
+            else:
+                nodes.extend((node.left, node.right))
+
+    return {
+        "metrics": {
+            "number_of_features": len(model.get_features()),
+            "number_of_constraints": len(model.get_constraints()),
+            "depth": depth,
+        },
+        "identifiers": {
+            "feature": sorted(feature.name for feature in model.get_features()),
+            "constraint": sorted(constraint_names),
+        },
+    }
+
+
+def check_satisfiability(uvl_path: str, time_budget: float) -> dict:
+    """
+    Translates a UVL model to CNF and asks a SAT solver whether it has at least
+    one valid configuration. Parsing and solving share ``time_budget`` seconds;
+    when it runs out the solver is interrupted and ``satisfiable`` is None.
+    """
+    deadline = time.monotonic() + time_budget
+    sat_model = FmToPysat(UVLReader(uvl_path).transform()).transform()
+    clauses = sat_model.get_all_clauses().clauses
+
+    satisfiable, solver_seconds = None, 0.0
+    remaining = deadline - time.monotonic()
+    if remaining > 0:
+        with Solver(name="glucose3", bootstrap_with=clauses) as solver:
+            timer = threading.Timer(remaining, solver.interrupt)
+            started = time.perf_counter()
+            timer.start()
+            try:
+                satisfiable = solver.solve_limited(expect_interrupt=True)
+            finally:
+                timer.cancel()
+                solver_seconds = time.perf_counter() - started
+
+    return {
+        "satisfiable": satisfiable,
+        "clauses": len(clauses),
+        "variables": len(sat_model.variables),
+        "solver_ms": round(solver_seconds * 1000, 3),
+    }
+
+
+class _BudgetExhausted(Exception):
+    pass
+
+
+def run_analyses(uvl_path: str, operations, time_budget: float) -> dict:
+    """
+    Parses and encodes a UVL model once and runs the requested SAT analysis
+    operations on a single incremental solver, answering each question with
+    assumptions. Every configuration the solver finds rules features out of the
+    core and dead candidates. Returns ``{"result", "elapsed_ms", "timed_out"}``
+    per operation. Operations that do not fit in ``time_budget`` seconds come
+    back with ``timed_out`` set and no result.
+    """
+    deadline = time.monotonic() + time_budget
+    feature_model = UVLReader(uvl_path).transform()
+    sat_model = FmToPysat(feature_model).transform()
+    names = {variable: name.strip('"') for name, variable in sat_model.variables.items()}
+    seen_selected, seen_deselected = set(), set()
+
+    with Solver(name="glucose3", bootstrap_with=sat_model.get_all_clauses().clauses) as solver:
+
+        def solve(*assumptions):
+            if time.monotonic() >= deadline:
+                raise _BudgetExhausted()
+            satisfiable = solver.solve_limited(assumptions=list(assumptions), expect_interrupt=True)
+            if satisfiable is None:
+                raise _BudgetExhausted()
+            if satisfiable:
+                for literal in solver.get_model():
+                    if abs(literal) in names:
+                        (seen_selected if literal > 0 else seen_deselected).add(abs(literal))
+            return satisfiable
+
+        def core():
+            return [names[v] for v in names if v not in seen_deselected and not solve(-v)]
+
+        def dead():
+            return [names[v] for v in names if v not in seen_selected and not solve(v)]
+
+        def false_optional():
+            result = []
+            for feature in feature_model.get_features():
+                parent = feature.get_parent()
+                if feature.is_root() or feature.is_mandatory() or parent is None:
+                    continue
+                if not solve(sat_model.variables[parent.name], -sat_model.variables[feature.name]):
+                    result.append(feature.name.strip('"'))
+            return result
+
+        steps = {"valid": solve, "core": core, "dead": dead, "false_optional": false_optional}
+        timer = threading.Timer(max(deadline - time.monotonic(), 0), solver.interrupt)
+        timer.start()
+        results, exhausted = {}, False
+        try:
+            # Validity runs first in any case: its configuration seeds the candidate pruning
+            for operation in ("valid",) + tuple(op for op in SAT_ANALYSIS_OPERATIONS if op in operations):
+                if operation in results:
+                    continue
+                started = time.perf_counter()
+                try:
+                    result = None if exhausted else steps[operation]()
+                except _BudgetExhausted:
+                    exhausted = True
+                    result = None
+                if isinstance(result, list):
+                    result = sorted(result)
+                results[operation] = {
+                    "result": result,
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "timed_out": exhausted,
+                }
+        finally:
+            timer.cancel()
+
+    return {operation: results[operation] for operation in operations}
+
+
+def count_configurations(uvl_path: str) -> dict:
+    """
+    Counts the configurations of a UVL model on a BDD of its CNF, in time linear
+    in the size of the diagram instead of in the number of configurations.
+    Variables the encoding adds for constraints are quantified away, so only
+    feature selections are counted. Returns ``{"result", "elapsed_ms",
+    "timed_out"}`` like run_analyses; the time limit is the pool's job timeout,
+    as building the BDD cannot be interrupted.
+    """
+    started = time.perf_counter()
+    sat_model = FmToPysat(UVLReader(uvl_path).transform()).transform()
+    clauses = sat_model.get_all_clauses().clauses
+
+    # Built from the clauses rather than with flamapy's FmToBDD, whose formula parser rejects quoted names
+    bdd = BDDModel().bdd
+    features = {variable: f"f{variable}" for variable in sat_model.variables.values()}
+    auxiliary = {
+        abs(literal): f"a{abs(literal)}" for clause in clauses for literal in clause if abs(literal) not in features
+    }
+    variables = {**features, **auxiliary}
+    bdd.declare(*variables.values())
+
+    root = bdd.true
+    for clause in clauses:
+        disjunction = bdd.false
+        for literal in clause:
+            node = bdd.var(variables[abs(literal)])
+            disjunction |= node if literal > 0 else ~node
+        root &= disjunction
+    if auxiliary:
+        root = bdd.exist(set(auxiliary.values()), root)
+
+    return {
+        "result": int(bdd.count(root, nvars=len(features))),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        "timed_out": False,
+    }
@@ -0,0 +1,50 @@
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from flask import Response, current_app, request
+from werkzeug.http import is_resource_modified
+
+
+def file_last_modified(path: str) -> Optional[datetime]:
+    try:
+        return datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)
+    except OSError:
+        return None
+
+
+def apply_cache_control(response: Response, published: bool) -> Response:
+    """
+    Published content only changes through a new checksum, so clients may keep it
+    for a long time. Anything else must be revalidated on every use. A response
+    that sets a cookie is never public, or a shared cache could hand that cookie
+    to every client, so call this after setting cookies.
+    """
+    if published:
+        if "Set-Cookie" in response.headers:
+            response.cache_control.public = None
+            response.cache_control.private = True
+        else:
+            response.cache_control.public = True
+        response.cache_control.max_age = current_app.config["PUBLISHED_CONTENT_MAX_AGE"]
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
+
+
+def is_not_modified(etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """True when the If-None-Match/If-Modified-Since validators match the current representation."""
+    return not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    )
+
+
+def not_modified_response(
+    etag: str, published: bool, last_modified: Optional[datetime] = None
+) -> Response:
+    response = Response(status=304)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return apply_cache_control(response, published)
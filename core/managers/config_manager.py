@@ -33,6 +33,25 @@ class Config:
     TIMEZONE = 'Europe/Madrid'
     TEMPLATES_AUTO_RELOAD = True
     UPLOAD_FOLDER = 'uploads'
+    ARCHIVE_CACHE_DIR = os.getenv('ARCHIVE_CACHE_DIR', 'cache/archives')
+    ARCHIVE_CACHE_MAX_BYTES = int(os.getenv('ARCHIVE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+    TRANSFORMATION_CACHE_DIR = os.getenv('TRANSFORMATION_CACHE_DIR', 'cache/transformations')
+    TRANSFORMATION_CACHE_MAX_BYTES = int(os.getenv('TRANSFORMATION_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    PUBLISHED_CONTENT_MAX_AGE = int(os.getenv('PUBLISHED_CONTENT_MAX_AGE', 365 * 24 * 60 * 60))
+    FLAMAPY_POOL_WORKERS = int(os.getenv('FLAMAPY_POOL_WORKERS', os.cpu_count() or 1))
+    FLAMAPY_JOB_TIMEOUT = float(os.getenv('FLAMAPY_JOB_TIMEOUT', 300))
+    FLAMAPY_JOB_MAX_MEMORY = int(os.getenv('FLAMAPY_JOB_MAX_MEMORY', 2 * 1024 * 1024 * 1024))
+    SAT_CHECK_TIME_BUDGET = float(os.getenv('SAT_CHECK_TIME_BUDGET', 10))
+    SAT_CHECK_POLL_INTERVAL = float(os.getenv('SAT_CHECK_POLL_INTERVAL', 0.2))
+    RECORD_BUFFER_MAX_SIZE = int(os.getenv('RECORD_BUFFER_MAX_SIZE', 500))
+    RECORD_BUFFER_MAX_DELAY = float(os.getenv('RECORD_BUFFER_MAX_DELAY', 5))
+    RECORD_BUFFER_MAX_RETRIES = int(os.getenv('RECORD_BUFFER_MAX_RETRIES', 3))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+    EXPLORE_PAGE_SIZE = int(os.getenv('EXPLORE_PAGE_SIZE', 20))
+    EXPLORE_MAX_PAGE_SIZE = int(os.getenv('EXPLORE_MAX_PAGE_SIZE', 100))
+    RESULT_CACHE_MAX_KEYS = int(os.getenv('RESULT_CACHE_MAX_KEYS', 200000))
+    SUGGESTION_INDEX_REFRESH_INTERVAL = float(os.getenv('SUGGESTION_INDEX_REFRESH_INTERVAL', 30))
+    SUGGESTION_INDEX_MAX_SCAN = int(os.getenv('SUGGESTION_INDEX_MAX_SCAN', 256))
 
 
 class DevelopmentConfig(Config):
@@ -50,6 +69,15 @@ class TestingConfig(Config):
         f"{os.getenv('MARIADB_TEST_DATABASE', 'default_db')}"
     )
     WTF_CSRF_ENABLED = False
+    # Tests opt into the disk caches explicitly, pointing them at a temp dir
+    ARCHIVE_CACHE_MAX_BYTES = 0
+    TRANSFORMATION_CACHE_MAX_BYTES = 0
+    # Analytics records are written straight away so tests can assert on them
+    RECORD_BUFFER_MAX_DELAY = 0
+    RESPONSE_CACHE_TTL = 0
+    RESULT_CACHE_MAX_KEYS = 0
+    # Flamapy jobs run inline; tests that need the worker pool start their own
+    FLAMAPY_POOL_WORKERS = 0
 
 
 class ProductionConfig(Config):
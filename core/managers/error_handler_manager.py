@@ -1,4 +1,6 @@
-from flask import render_template
+from flask import jsonify, render_template
+
+from core.managers.flamapy_pool_manager import FlamapyJobLimitExceeded
 
 
 class ErrorHandlerManager:
@@ -25,3 +27,9 @@ class ErrorHandlerManager:
         def bad_request_error(e):
             self.app.logger.warning('Bad Request: %s', str(e))
             return render_template('400.html'), 400
+
+        @self.app.errorhandler(FlamapyJobLimitExceeded)
+        def flamapy_job_limit_exceeded(e):
+            # Only the pool worker running the job was killed; this process keeps serving
+            self.app.logger.warning('Flamapy job stopped: %s', str(e))
+            return jsonify({"error": str(e)}), 503
@@ -0,0 +1,249 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Imported once by the fork server, so every worker starts with them loaded
+PRELOADED_MODULES = [
+    "antlr4",
+    "uvl.UVLCustomLexer",
+    "uvl.UVLPythonParser",
+    "flamapy.metamodels.fm_metamodel.transformations",
+    "flamapy.metamodels.pysat_metamodel.transformations",
+    "pysat.solvers",
+    # Not app.modules.flamapy.services: importing app builds a whole Flask app
+    "core.flamapy.jobs",
+]
+# How often a running job is checked against its time limit and sampled for memory use
+WATCH_INTERVAL = 0.05
+MB = 1024 * 1024
+
+
+def get_flamapy_pool():
+    return current_app.flamapy_pool
+
+
+class FlamapyJobError(Exception):
+    """A job raised an exception in its worker."""
+
+
+class FlamapyJobLimitExceeded(FlamapyJobError):
+    """A job ran out of time or memory and its worker was killed."""
+
+
+def _serve(connection, max_memory: int):
+    # Runs in the worker process: one job at a time, until the pool closes the pipe
+    if max_memory:
+        # Enforced by the kernel: an allocation past the limit fails with MemoryError
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard == resource.RLIM_INFINITY or hard > max_memory:
+            resource.setrlimit(resource.RLIMIT_AS, (max_memory, hard))
+    while True:
+        try:
+            function, args = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        try:
+            connection.send((True, function(*args)))
+        except MemoryError:
+            # Exit rather than keep a possibly fragmented heap; the pool replaces this worker
+            connection.send((None, f"{function.__name__} used more than {max_memory // MB} MB of memory"))
+            return
+        except Exception as exc:
+            connection.send((False, f"{type(exc).__name__}: {exc}"))
+
+
+class _Worker:
+    def __init__(self, context, max_memory: int):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_connection, max_memory), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def rss(self) -> int:
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return 0
+
+    def run(self, function, args, timeout: float):
+        """Runs a job and returns its result and the peak RSS sampled while it ran."""
+        self.connection.send((function, args))
+        deadline = time.monotonic() + timeout
+        peak_rss = self.rss()
+        while not self.connection.poll(min(WATCH_INTERVAL, max(deadline - time.monotonic(), 0))):
+            if not self.is_alive():
+                raise FlamapyJobError(f"The worker running {function.__name__} exited unexpectedly")
+            if time.monotonic() >= deadline:
+                self.kill()
+                raise FlamapyJobLimitExceeded(f"{function.__name__} did not finish within {timeout:g} s")
+            peak_rss = max(peak_rss, self.rss())
+
+        try:
+            succeeded, value = self.connection.recv()
+        except (EOFError, OSError):
+            raise FlamapyJobError(f"The worker running {function.__name__} exited unexpectedly")
+        if succeeded is None:
+            self.process.join()
+            raise FlamapyJobLimitExceeded(value)
+        if not succeeded:
+            raise FlamapyJobError(value)
+        return value, peak_rss
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class FlamapyPoolManager:
+    """
+    Pool of warm worker processes for CPU-heavy flamapy work (parsing,
+    transformations, solving), so that a pathological model cannot pin a web
+    worker. Workers are forked from a fork server that has flamapy and antlr
+    already imported, and run one job at a time. A job that runs longer than
+    FLAMAPY_JOB_TIMEOUT seconds is killed; each worker's address space is capped
+    at FLAMAPY_JOB_MAX_MEMORY bytes, so a job allocating past it fails and its
+    worker exits. Either way the worker is replaced and the job raises
+    FlamapyJobLimitExceeded. The peak RSS sampled while jobs run is reported in
+    stats(). Each web worker process starts its own pool of
+    FLAMAPY_POOL_WORKERS processes on first use. A size of 0 runs jobs inline.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.size = app.config["FLAMAPY_POOL_WORKERS"]
+        self.job_timeout = app.config["FLAMAPY_JOB_TIMEOUT"]
+        self.max_memory = app.config["FLAMAPY_JOB_MAX_MEMORY"]
+        self._idle = None
+        self._dispatcher = None
+        self._context = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._busy = 0
+        self._jobs = 0
+        self._failures = 0
+        self._limit_kills = 0
+        self._restarts = 0
+        self._busy_seconds = 0.0
+        self._peak_rss = 0
+
+    def register(self):
+        self.app.flamapy_pool = self
+        atexit.register(self.shutdown)
+
+    def is_enabled(self) -> bool:
+        return self.size > 0
+
+    def run(self, function, *args, timeout=None):
+        """Runs ``function(*args)`` in a worker and returns its result."""
+        if not self.is_enabled():
+            return function(*args)
+
+        self._ensure_started()
+        worker = self._idle.get()
+        started = time.perf_counter()
+        with self._lock:
+            self._busy += 1
+        try:
+            value, peak_rss = worker.run(function, args, timeout or self.job_timeout)
+            with self._lock:
+                self._peak_rss = max(self._peak_rss, peak_rss)
+            return value
+        except FlamapyJobLimitExceeded as exc:
+            logger.warning(f"Killed a flamapy worker: {exc}")
+            with self._lock:
+                self._limit_kills += 1
+            raise
+        except FlamapyJobError:
+            with self._lock:
+                self._failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._busy -= 1
+                self._jobs += 1
+                self._busy_seconds += elapsed
+            if not worker.is_alive():
+                worker = self._replace(worker)
+            self._idle.put(worker)
+
+    def submit(self, function, *args, timeout=None) -> Future:
+        """Queues ``function(*args)`` for the next free worker and returns its future."""
+        if not self.is_enabled():
+            future = Future()
+            try:
+                future.set_result(function(*args))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+
+        self._ensure_started()
+        return self._dispatcher.submit(self.run, function, *args, timeout=timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            uptime = time.monotonic() - self._started_at
+            capacity = self.size * uptime
+            return {
+                "workers": self.size,
+                "busy": self._busy,
+                "jobs": self._jobs,
+                "failures": self._failures,
+                "limit_kills": self._limit_kills,
+                "restarts": self._restarts,
+                "busy_seconds": self._busy_seconds,
+                "utilization": self._busy_seconds / capacity if capacity else 0.0,
+                "peak_rss_mb": self._peak_rss / MB,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._idle is None or self._pid != os.getpid():
+                return
+            idle, self._idle = self._idle, None
+            dispatcher, self._dispatcher = self._dispatcher, None
+        dispatcher.shutdown(wait=False, cancel_futures=True)
+        while not idle.empty():
+            idle.get_nowait().kill()
+
+    def _ensure_started(self):
+        # Processes and threads do not survive a fork, so each web worker starts its own pool
+        if self._idle is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._idle is not None and self._pid == os.getpid():
+                return
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                self._context = multiprocessing.get_context("forkserver")
+                self._context.set_forkserver_preload(PRELOADED_MODULES)
+            else:
+                self._context = multiprocessing.get_context("spawn")
+            idle = queue.Queue()
+            for _ in range(self.size):
+                idle.put(_Worker(self._context, self.max_memory))
+            self._dispatcher = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="flamapy-pool")
+            self._pid = os.getpid()
+            self._started_at = time.monotonic()
+            self._idle = idle
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        with self._lock:
+            self._restarts += 1
+        worker.connection.close()
+        return _Worker(self._context, self.max_memory)
@@ -0,0 +1,166 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+def get_record_buffer():
+    return current_app.record_buffer
+
+
+class RecordBufferManager:
+    """
+    Write-behind buffer for analytics records (views and downloads). Records are
+    deduplicated in memory by the model's ``dedup_columns`` and written in bulk by
+    a background thread once RECORD_BUFFER_MAX_SIZE records are pending or
+    RECORD_BUFFER_MAX_DELAY seconds have passed, and once more when the worker
+    exits. A delay of 0 writes every record straight away. Records already in the
+    database are skipped by the unique index on the dedup columns. A batch that
+    cannot be written is queued again for the next flush, and its records are
+    dropped (and logged) after RECORD_BUFFER_MAX_RETRIES failed attempts.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.max_size = app.config["RECORD_BUFFER_MAX_SIZE"]
+        self.max_delay = app.config["RECORD_BUFFER_MAX_DELAY"]
+        self.max_retries = app.config["RECORD_BUFFER_MAX_RETRIES"]
+        self._pending = {}
+        self._attempts = {}
+        self._repositories = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._flushes = 0
+        self._flushed_records = 0
+        self._dropped_records = 0
+        self._last_flush_seconds = 0.0
+        self._total_flush_seconds = 0.0
+
+    def register(self):
+        self.app.record_buffer = self
+        atexit.register(self.shutdown)
+
+    def record(self, repository, **values):
+        self.record_many(repository, [values])
+
+    def record_many(self, repository, rows):
+        model = repository.model
+        with self._lock:
+            self._repositories.setdefault(model, repository)
+            for values in rows:
+                key = (model, tuple(values[column] for column in model.dedup_columns))
+                self._pending.setdefault(key, values)
+            depth = len(self._pending)
+
+        if self.max_delay <= 0:
+            self.flush()
+            return
+
+        self._ensure_worker()
+        if depth >= self.max_size:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        started = time.perf_counter()
+        rows_by_model = defaultdict(list)
+        for (model, _), values in pending.items():
+            rows_by_model[model].append(values)
+
+        from app import db
+
+        written = 0
+        try:
+            for model, rows in rows_by_model.items():
+                written += self._repositories[model].create_many_ignoring_duplicates(rows, commit=False)
+            db.session.commit()
+        except Exception as exc:
+            db.session.rollback()
+            logger.exception(f"Could not flush {len(pending)} buffered records: {exc}")
+            self._requeue(pending)
+            return
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            for key in pending:
+                self._attempts.pop(key, None)
+            self._flushes += 1
+            self._flushed_records += written
+            self._last_flush_seconds = elapsed
+            self._total_flush_seconds += elapsed
+        logger.info(
+            f"Flushed {written} buffered records in {elapsed * 1000:.1f} ms "
+            f"({self.queue_depth()} still queued)"
+        )
+
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": len(self._pending),
+                "flushes": self._flushes,
+                "flushed_records": self._flushed_records,
+                "dropped_records": self._dropped_records,
+                "last_flush_ms": self._last_flush_seconds * 1000,
+                "avg_flush_ms": (
+                    self._total_flush_seconds / self._flushes * 1000 if self._flushes else 0.0
+                ),
+            }
+
+    def shutdown(self):
+        with self.app.app_context():
+            self.flush()
+
+    def _requeue(self, pending):
+        dropped = []
+        with self._lock:
+            for key, values in pending.items():
+                attempts = self._attempts.get(key, 0) + 1
+                if attempts > self.max_retries:
+                    self._attempts.pop(key, None)
+                    dropped.append(values)
+                    continue
+                self._attempts[key] = attempts
+                # The same record may have been queued again since the swap
+                self._pending.setdefault(key, values)
+            self._dropped_records += len(dropped)
+        if dropped:
+            logger.error(f"Dropped {len(dropped)} buffered records after {self.max_retries} retries: {dropped}")
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="record-buffer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # Without a delay the buffer is written through, so only wake up on demand
+            self._wakeup.wait(timeout=self.max_delay if self.max_delay > 0 else None)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as exc:
+                logger.exception(f"Record buffer flush failed: {exc}")
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from flask import current_app
+
+
+def get_response_cache():
+    return current_app.response_cache
+
+
+class ResponseCacheManager:
+    """
+    In-process cache for rendered pages and fragments. Entries expire after
+    RESPONSE_CACHE_TTL seconds, and can be dropped earlier by key prefix when the
+    content they were built from changes. A TTL of 0 disables caching.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.ttl = app.config["RESPONSE_CACHE_TTL"]
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self):
+        self.app.response_cache = self
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def get_or_set(self, key, builder, ttl=None):
+        value = self.get(key)
+        if value is None:
+            value = builder()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, prefix: str = ""):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
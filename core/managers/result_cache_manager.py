@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+def get_result_cache():
+    return current_app.result_cache
+
+
+class ResultCacheManager:
+    """
+    In-process LRU cache for ordered search results. Every entry is a tuple of
+    sort keys and belongs to a catalog version: a lookup with a different version
+    drops all entries, so bumping the version in the database invalidates the
+    cache of every worker. The cache keeps at most RESULT_CACHE_MAX_KEYS sort keys
+    in total, evicting the least recently used entries first. A bound of 0
+    disables caching.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.max_keys = app.config["RESULT_CACHE_MAX_KEYS"]
+        self._entries = OrderedDict()
+        self._size = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._hit_seconds = 0.0
+        self._miss_seconds = 0.0
+
+    def register(self):
+        self.app.result_cache = self
+
+    def is_enabled(self) -> bool:
+        return self.max_keys > 0
+
+    def get_or_set(self, key, version, builder):
+        started = time.perf_counter()
+        with self._lock:
+            if version != self._version:
+                self._clear()
+                self._version = version
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+
+        if value is not None:
+            self._count(hit=True, elapsed=time.perf_counter() - started)
+            return value
+
+        value = tuple(builder())
+        with self._lock:
+            # Results built while the version moved on are already stale
+            if version == self._version and key not in self._entries and len(value) <= self.max_keys:
+                self._entries[key] = value
+                self._size += len(value)
+                while self._size > self.max_keys:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+                    self._evictions += 1
+        self._count(hit=False, elapsed=time.perf_counter() - started)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "cached_keys": self._size,
+                "version": self._version,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "avg_hit_ms": self._hit_seconds / self._hits * 1000 if self._hits else 0.0,
+                "avg_miss_ms": self._miss_seconds / self._misses * 1000 if self._misses else 0.0,
+            }
+
+    def _clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    def _count(self, hit: bool, elapsed: float):
+        with self._lock:
+            if hit:
+                self._hits += 1
+                self._hit_seconds += elapsed
+            else:
+                self._misses += 1
+                self._miss_seconds += elapsed
@@ -0,0 +1,144 @@
+import bisect
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import unidecode
+from flask import current_app
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+MAX_MEMO_ENTRIES = 10000
+
+
+def get_suggestion_index():
+    return current_app.suggestion_index
+
+
+def normalize(text) -> str:
+    return " ".join(WORD_PATTERN.findall(unidecode.unidecode(text or "").lower()))
+
+
+class SuggestionIndexManager:
+    """
+    In-memory prefix index for autocompletion. Each document contributes phrases
+    (titles, tags, names...), and every phrase is reachable from the start of any
+    of its words through a sorted list of keys, so a prefix lookup is a binary
+    search plus a scan of at most SUGGESTION_INDEX_MAX_SCAN keys. Answers are
+    remembered until the index changes. Documents can be replaced one at a time,
+    and the index remembers the catalog version it reflects so that workers can
+    tell when another process has changed the catalog.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.refresh_interval = app.config["SUGGESTION_INDEX_REFRESH_INTERVAL"]
+        self.max_scan = app.config["SUGGESTION_INDEX_MAX_SCAN"]
+        self._keys = []
+        self._phrases = {}
+        self._documents = {}
+        self._memo = {}
+        self._lock = threading.Lock()
+        self.version = None
+        self.checked_at = 0.0
+
+    def register(self):
+        self.app.suggestion_index = self
+
+    def needs_check(self) -> bool:
+        return self.version is None or time.monotonic() - self.checked_at >= self.refresh_interval
+
+    def mark_checked(self, version):
+        self.version = version
+        self.checked_at = time.monotonic()
+
+    def load(self, documents: Dict[int, Iterable[str]], version):
+        with self._lock:
+            self._keys, self._phrases, self._documents, self._memo = [], {}, {}, {}
+            for document_id, phrases in documents.items():
+                self._replace(document_id, phrases)
+        self.mark_checked(version)
+
+    def replace(self, document_id: int, phrases: Iterable[str]):
+        with self._lock:
+            self._replace(document_id, phrases)
+
+    def remove(self, document_id: int):
+        with self._lock:
+            self._replace(document_id, [])
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        memo_key = (prefix, limit)
+        suggestions = self._memo.get(memo_key)
+        if suggestions is not None:
+            return suggestions
+
+        with self._lock:
+            start = bisect.bisect_left(self._keys, (prefix,))
+            matches = {}
+            for key, phrase in self._keys[start:start + self.max_scan]:
+                if not key.startswith(prefix):
+                    break
+                # Phrases starting with the prefix rank above those merely containing it
+                rank = (key == phrase, len(self._phrases[phrase][1]))
+                matches[phrase] = max(rank, matches.get(phrase, rank))
+            ranked = sorted(matches, key=lambda phrase: (matches[phrase], -len(phrase)), reverse=True)
+            suggestions = [self._phrases[phrase][0] for phrase in ranked[:limit]]
+            if len(self._memo) >= MAX_MEMO_ENTRIES:
+                self._memo.clear()
+            self._memo[memo_key] = suggestions
+        return suggestions
+
+    def size(self) -> int:
+        return len(self._phrases)
+
+    def _replace(self, document_id: int, phrases: Iterable[str]):
+        self._memo.clear()
+        displays = {}
+        for display in phrases:
+            phrase = normalize(display)
+            if phrase:
+                displays.setdefault(phrase, display.strip())
+
+        previous = self._documents.pop(document_id, set())
+        for phrase in previous - displays.keys():
+            self._release(phrase, document_id)
+        for phrase, display in displays.items():
+            self._acquire(phrase, display, document_id)
+        if displays:
+            self._documents[document_id] = set(displays)
+
+    def _acquire(self, phrase: str, display: str, document_id: int):
+        entry = self._phrases.get(phrase)
+        if entry is None:
+            self._phrases[phrase] = (display, {document_id})
+            for key in self._phrase_keys(phrase):
+                bisect.insort(self._keys, (key, phrase))
+        else:
+            entry[1].add(document_id)
+
+    def _release(self, phrase: str, document_id: int):
+        entry: Optional[tuple] = self._phrases.get(phrase)
+        if entry is None:
+            return
+        entry[1].discard(document_id)
+        if entry[1]:
+            return
+        del self._phrases[phrase]
+        for key in self._phrase_keys(phrase):
+            index = bisect.bisect_left(self._keys, (key, phrase))
+            if index < len(self._keys) and self._keys[index] == (key, phrase):
+                del self._keys[index]
+
+    @staticmethod
+    def _phrase_keys(phrase: str) -> List[str]:
+        # The phrase itself plus its tail from every later word
+        keys = [phrase]
+        for index, character in enumerate(phrase):
+            if character == " ":
+                keys.append(phrase[index + 1:])
+        return keys
@@ -1,5 +1,8 @@
 from typing import Generic, List, NoReturn, Optional, TypeVar, Union
 
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+
 import app
 
 T = TypeVar('T')
@@ -19,6 +22,45 @@ class BaseRepository(Generic[T]):
             self.session.flush()
         return instance
 
+    def create_many_ignoring_duplicates(self, rows: List[dict], commit: bool = True) -> int:
+        """
+        Inserts rows in one statement, skipping those that collide with a unique
+        index instead of checking for them first. Returns the rows inserted.
+        """
+        if not rows:
+            return 0
+
+        table = self.model.__table__
+        dialect = self.session.get_bind().dialect.name
+        if dialect in ("mysql", "mariadb"):
+            # IGNORE rather than a no-op ON DUPLICATE KEY UPDATE, which the driver's
+            # FOUND_ROWS flag reports as an affected row and would inflate the count
+            statement = insert(table).prefix_with("IGNORE")
+        elif dialect == "postgresql":
+            statement = postgresql.insert(table).on_conflict_do_nothing()
+        elif dialect == "sqlite":
+            statement = sqlite.insert(table).on_conflict_do_nothing()
+        else:
+            statement = insert(table)
+
+        result = self.session.execute(statement, rows)
+        if commit:
+            self.session.commit()
+        return result.rowcount
+
+    def upsert(self, key: dict, values: dict, commit: bool = True) -> T:
+        """
+        Inserts the row identified by ``key`` with ``values``, or updates it if it
+        already exists, and returns it. Unlike a lookup followed by an insert, two
+        workers saving the same key at once cannot both insert it.
+        """
+        if not self.create_many_ignoring_duplicates([{**key, **values}], commit=False):
+            self.session.execute(update(self.model).filter_by(**key).values(**values))
+        instance: T = self.session.query(self.model).filter_by(**key).populate_existing().one()
+        if commit:
+            self.session.commit()
+        return instance
+
     def get_by_id(self, id: int) -> Optional[T]:
         instance: Optional[T] = self.model.query.get(id)
         return instance
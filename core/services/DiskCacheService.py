@@ -0,0 +1,104 @@
+import os
+import tempfile
+from typing import Optional
+
+from flask import current_app
+
+
+class DiskCacheService:
+    """
+    Base class for caches that keep artifacts as files on disk. Subclasses name
+    the config keys holding the cache directory and its byte budget. When the
+    budget is exceeded the least recently used files are evicted first, using
+    the file mtime (refreshed on every hit) as recency so that all workers
+    share the same view of the cache.
+    """
+
+    dir_config_key = None
+    max_bytes_config_key = None
+    suffix = ""
+
+    hits = 0
+    misses = 0
+
+    def cache_dir(self) -> str:
+        return os.path.abspath(
+            os.path.join(
+                os.getenv("WORKING_DIR", ""), current_app.config[self.dir_config_key]
+            )
+        )
+
+    def max_bytes(self) -> int:
+        return current_app.config[self.max_bytes_config_key]
+
+    def is_enabled(self) -> bool:
+        return self.max_bytes() > 0
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir(), f"{key}{self.suffix}")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        try:
+            # Touching the file marks it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return path
+
+    def put(self, key: str, chunks) -> str:
+        """Writes an artifact from an iterable of byte chunks and returns its path."""
+        cache_dir = self.cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+        path = self.path_for(key)
+
+        # Write under a temporary name so concurrent readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as artifact:
+                for chunk in chunks:
+                    artifact.write(chunk)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Optional[str] = None):
+        artifacts = []
+        with os.scandir(self.cache_dir()) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(self.suffix):
+                    stat = entry.stat()
+                    artifacts.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in artifacts)
+        for _, size, path in sorted(artifacts):
+            if total_size <= self.max_bytes():
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def stats(self) -> dict:
+        cls = type(self)
+        lookups = cls.hits + cls.misses
+        return {
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "hit_ratio": cls.hits / lookups if lookups else 0.0,
+        }
+
+    def _count(self, counter: str):
+        # Counters live on the concrete class so every instance in the worker shares them
+        cls = type(self)
+        setattr(cls, counter, getattr(cls, counter) + 1)
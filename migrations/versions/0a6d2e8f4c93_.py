@@ -0,0 +1,32 @@
+"""uvl validation verdicts
+
+Revision ID: 0a6d2e8f4c93
+Revises: f1c7b3d92a56
+Create Date: 2026-10-18 17:26:41.207359
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6d2e8f4c93'
+down_revision = 'f1c7b3d92a56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled at upload time or on the first check; `rosemary uvl:reanalyze` checks the files stored before
+    op.create_table('uvl_validation',
+    sa.Column('checksum', sa.String(length=120), nullable=False),
+    sa.Column('parser_version', sa.String(length=64), nullable=False),
+    sa.Column('valid', sa.Boolean(), nullable=False),
+    sa.Column('errors', sa.JSON(), nullable=False),
+    sa.Column('checked_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('checksum')
+    )
+
+
+def downgrade():
+    op.drop_table('uvl_validation')
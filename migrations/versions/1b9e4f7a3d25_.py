@@ -0,0 +1,39 @@
+"""sat check results
+
+Revision ID: 1b9e4f7a3d25
+Revises: 0a6d2e8f4c93
+Create Date: 2026-10-18 18:04:15.862940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b9e4f7a3d25'
+down_revision = '0a6d2e8f4c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sat_check',
+    sa.Column('checksum', sa.String(length=120), nullable=False),
+    sa.Column('flamapy_version', sa.String(length=64), nullable=False),
+    sa.Column('satisfiable', sa.Boolean(), nullable=False),
+    sa.Column('clauses', sa.Integer(), nullable=False),
+    sa.Column('variables', sa.Integer(), nullable=False),
+    sa.Column('solver_ms', sa.Float(), nullable=False),
+    sa.Column('checked_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('checksum')
+    )
+    op.create_table('sat_check_claim',
+    sa.Column('checksum', sa.String(length=120), nullable=False),
+    sa.Column('claimed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('checksum')
+    )
+
+
+def downgrade():
+    op.drop_table('sat_check_claim')
+    op.drop_table('sat_check')
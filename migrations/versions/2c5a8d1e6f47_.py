@@ -0,0 +1,32 @@
+"""model analysis results
+
+Revision ID: 2c5a8d1e6f47
+Revises: 1b9e4f7a3d25
+Create Date: 2026-10-18 18:41:52.093716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c5a8d1e6f47'
+down_revision = '1b9e4f7a3d25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('model_analysis',
+    sa.Column('checksum', sa.String(length=120), nullable=False),
+    sa.Column('operation', sa.String(length=32), nullable=False),
+    sa.Column('flamapy_version', sa.String(length=64), nullable=False),
+    sa.Column('result', sa.JSON(), nullable=False),
+    sa.Column('elapsed_ms', sa.Float(), nullable=False),
+    sa.Column('checked_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('checksum', 'operation')
+    )
+
+
+def downgrade():
+    op.drop_table('model_analysis')
@@ -0,0 +1,25 @@
+"""store blank dataset DOIs as NULL
+
+Revision ID: 3d8f1a6c2e70
+Revises: 2c5a8d1e6f47
+Create Date: 2026-10-18 20:12:37.518204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3d8f1a6c2e70'
+down_revision = '2c5a8d1e6f47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Uploads with a blank DOI field stored ""; NULL is now the only unpublished value
+    op.execute("UPDATE ds_meta_data SET dataset_doi = NULL WHERE TRIM(dataset_doi) = ''")
+
+
+def downgrade():
+    # Nothing to undo: "" and NULL both meant unpublished before this revision
+    pass
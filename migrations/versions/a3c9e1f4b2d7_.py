@@ -0,0 +1,44 @@
+"""unique indexes on view and download records
+
+Revision ID: a3c9e1f4b2d7
+Revises: 73b2027f6b05
+Create Date: 2026-10-18 10:12:41.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e1f4b2d7'
+down_revision = '73b2027f6b05'
+branch_labels = None
+depends_on = None
+
+
+# user_key is COALESCE(user_id, 0): NULLs never collide in a unique index, so
+# indexing user_id itself would not deduplicate anonymous visitors
+RECORD_INDEXES = [
+    ('ds_download_record', 'ix_ds_download_record_dataset_user_cookie', ['dataset_id', 'user_key', 'download_cookie']),
+    ('ds_view_record', 'ix_ds_view_record_dataset_user_cookie', ['dataset_id', 'user_key', 'view_cookie']),
+    ('file_download_record', 'ix_file_download_record_file_user_cookie', ['file_id', 'user_key', 'download_cookie']),
+    ('file_view_record', 'ix_file_view_record_file_user_cookie', ['file_id', 'user_key', 'view_cookie']),
+]
+
+
+def upgrade():
+    for table, index, columns in RECORD_INDEXES:
+        op.add_column(table, sa.Column('user_key', sa.Integer(), sa.Computed('COALESCE(user_id, 0)', persisted=True)))
+        # Keep the oldest record of each group so the unique index can be built
+        matches = ' AND '.join(f'newer.{column} <=> older.{column}' for column in columns)
+        op.execute(
+            f'DELETE newer FROM {table} newer '
+            f'JOIN {table} older ON {matches} AND newer.id > older.id'
+        )
+        op.create_index(index, table, columns, unique=True)
+
+
+def downgrade():
+    for table, index, _ in RECORD_INDEXES:
+        op.drop_index(index, table_name=table)
+        op.drop_column(table, 'user_key')
@@ -0,0 +1,43 @@
+"""hub_counters table
+
+Revision ID: b7d2f0c8e615
+Revises: a3c9e1f4b2d7
+Create Date: 2026-10-18 11:03:27.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2f0c8e615'
+down_revision = 'a3c9e1f4b2d7'
+branch_labels = None
+depends_on = None
+
+
+COUNTER_QUERIES = {
+    'synchronized_datasets': 'SELECT COUNT(*) FROM data_set JOIN ds_meta_data '
+                             'ON ds_meta_data.id = data_set.ds_meta_data_id '
+                             "WHERE ds_meta_data.dataset_doi IS NOT NULL AND ds_meta_data.dataset_doi != ''",
+    'feature_models': 'SELECT COUNT(*) FROM feature_model',
+    'dataset_downloads': 'SELECT COUNT(*) FROM ds_download_record',
+    'dataset_views': 'SELECT COUNT(*) FROM ds_view_record',
+    'feature_model_downloads': 'SELECT COUNT(*) FROM file_download_record',
+    'feature_model_views': 'SELECT COUNT(*) FROM file_view_record',
+}
+
+
+def upgrade():
+    op.create_table('hub_counters',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Start from the current totals; `rosemary counters:rebuild` recomputes them at any time
+    for name, query in COUNTER_QUERIES.items():
+        op.execute(f"INSERT INTO hub_counters (name, value) SELECT '{name}', ({query})")
+
+
+def downgrade():
+    op.drop_table('hub_counters')
@@ -0,0 +1,139 @@
+"""search index tables
+
+Revision ID: c41a8e93d5f2
+Revises: b7d2f0c8e615
+Create Date: 2026-10-18 12:20:54.377610
+
+"""
+import re
+from collections import Counter, defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+import unidecode
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41a8e93d5f2'
+down_revision = 'b7d2f0c8e615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backfilled here and kept up to date as datasets change; `rosemary search:reindex` rebuilds it
+    op.create_table('search_document',
+    sa.Column('dataset_id', sa.Integer(), nullable=False),
+    sa.Column('length', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['dataset_id'], ['data_set.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('dataset_id')
+    )
+    op.create_table('search_posting',
+    sa.Column('term', sa.String(length=64), nullable=False),
+    sa.Column('dataset_id', sa.Integer(), nullable=False),
+    sa.Column('frequency', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['dataset_id'], ['data_set.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('term', 'dataset_id')
+    )
+    with op.batch_alter_table('search_posting', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_search_posting_dataset_id'), ['dataset_id'], unique=False)
+
+    backfill()
+
+
+# The tokenizer and field weights of the search index as of this revision. Copied rather
+# than imported so the backfill stays the same when the app's versions change.
+TERM_PATTERN = re.compile(r'[a-z0-9]+')
+MAX_TERM_LENGTH = 64
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+AUTHOR_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+
+def tokenize(text):
+    normalized = unidecode.unidecode(text or '').lower()
+    return [term[:MAX_TERM_LENGTH] for term in TERM_PATTERN.findall(normalized)]
+
+
+def metadata_terms(ds_meta_data, authors, fm_meta_datas):
+    fields = [
+        (ds_meta_data.title, TITLE_WEIGHT),
+        (ds_meta_data.tags, TAG_WEIGHT),
+        (ds_meta_data.description, TEXT_WEIGHT),
+    ]
+    for author in authors:
+        fields += [
+            (author.name, AUTHOR_WEIGHT),
+            (author.affiliation, AUTHOR_WEIGHT),
+            (author.orcid, AUTHOR_WEIGHT),
+        ]
+    for fm_meta_data in fm_meta_datas:
+        fields += [
+            (fm_meta_data.uvl_filename, TEXT_WEIGHT),
+            (fm_meta_data.title, TEXT_WEIGHT),
+            (fm_meta_data.description, TEXT_WEIGHT),
+            (fm_meta_data.publication_doi, TEXT_WEIGHT),
+            (fm_meta_data.tags, TAG_WEIGHT),
+        ]
+
+    terms = Counter()
+    for text, weight in fields:
+        for term in tokenize(text):
+            terms[term] += weight
+    return terms
+
+
+def backfill():
+    # Text search only reads the index, so it must be complete before the app serves /explore.
+    # Plain queries rather than the models, which describe the schema of later revisions.
+    bind = op.get_bind()
+    datasets = bind.execute(sa.text(
+        'SELECT data_set.id, ds_meta_data.title, ds_meta_data.tags, ds_meta_data.description '
+        'FROM data_set JOIN ds_meta_data ON ds_meta_data.id = data_set.ds_meta_data_id'
+    )).all()
+    authors = defaultdict(list)
+    for row in bind.execute(sa.text(
+        'SELECT data_set.id AS dataset_id, author.name, author.affiliation, author.orcid '
+        'FROM author JOIN data_set ON data_set.ds_meta_data_id = author.ds_meta_data_id'
+    )):
+        authors[row.dataset_id].append(row)
+    fm_meta_datas = defaultdict(list)
+    for row in bind.execute(sa.text(
+        'SELECT feature_model.data_set_id AS dataset_id, fm_meta_data.uvl_filename, fm_meta_data.title, '
+        'fm_meta_data.description, fm_meta_data.publication_doi, fm_meta_data.tags '
+        'FROM feature_model JOIN fm_meta_data ON fm_meta_data.id = feature_model.fm_meta_data_id'
+    )):
+        fm_meta_datas[row.dataset_id].append(row)
+
+    documents, postings = [], []
+    for dataset in datasets:
+        terms = metadata_terms(dataset, authors[dataset.id], fm_meta_datas[dataset.id])
+        documents.append({'dataset_id': dataset.id, 'length': sum(terms.values())})
+        postings += [
+            {'term': term, 'dataset_id': dataset.id, 'frequency': frequency}
+            for term, frequency in terms.items()
+        ]
+    if documents:
+        op.bulk_insert(
+            sa.table('search_document', sa.column('dataset_id', sa.Integer), sa.column('length', sa.Integer)),
+            documents,
+        )
+    if postings:
+        op.bulk_insert(
+            sa.table(
+                'search_posting',
+                sa.column('term', sa.String),
+                sa.column('dataset_id', sa.Integer),
+                sa.column('frequency', sa.Integer),
+            ),
+            postings,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('search_posting', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_search_posting_dataset_id'))
+
+    op.drop_table('search_posting')
+    op.drop_table('search_document')
@@ -0,0 +1,82 @@
+"""normalized tags
+
+Revision ID: d8e3b5a17c40
+Revises: c41a8e93d5f2
+Create Date: 2026-10-18 14:05:12.640193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8e3b5a17c40'
+down_revision = 'c41a8e93d5f2'
+branch_labels = None
+depends_on = None
+
+
+TAGGED_TABLES = [
+    ('ds_meta_data', 'ds_meta_data_tag', 'ds_meta_data_id'),
+    ('fm_meta_data', 'fm_meta_data_tag', 'fm_meta_data_id'),
+]
+
+
+def tag_names(text):
+    # Same normalization as Tag.names_from
+    names = (name.strip().lower()[:120] for name in (text or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def upgrade():
+    op.create_table('tag',
+    sa.Column('id', sa.Integer(), nullable=False),
+    # Binary collation: the default one is accent-insensitive, and Tag.names_from compares names exactly
+    sa.Column('name', sa.String(length=120, collation='utf8mb4_bin'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('tag', schema=None) as batch_op:
+        batch_op.create_index('ix_tag_name', ['name'], unique=True)
+
+    for table, association, column in TAGGED_TABLES:
+        op.create_table(association,
+        sa.Column(column, sa.Integer(), nullable=False),
+        sa.Column('tag_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([column], [f'{table}.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(column, 'tag_id')
+        )
+        with op.batch_alter_table(association, schema=None) as batch_op:
+            batch_op.create_index(f'ix_{association}_tag_id', ['tag_id', column], unique=False)
+
+    # Backfill from the comma-separated strings, which stay as the entered text
+    bind = op.get_bind()
+    tagged = {
+        table: [(row.id, tag_names(row.tags)) for row in bind.execute(sa.text(f'SELECT id, tags FROM {table}'))]
+        for table, _, _ in TAGGED_TABLES
+    }
+    names = sorted({name for rows in tagged.values() for _, row_names in rows for name in row_names})
+    tag_table = sa.table('tag', sa.column('name', sa.String))
+    if names:
+        op.bulk_insert(tag_table, [{'name': name} for name in names])
+    tag_ids = {row.name: row.id for row in bind.execute(sa.text('SELECT id, name FROM tag'))}
+
+    for table, association, column in TAGGED_TABLES:
+        rows = [
+            {column: row_id, 'tag_id': tag_ids[name]}
+            for row_id, row_names in tagged[table]
+            for name in row_names
+        ]
+        if rows:
+            op.bulk_insert(sa.table(association, sa.column(column, sa.Integer), sa.column('tag_id', sa.Integer)), rows)
+
+
+def downgrade():
+    for _, association, _ in TAGGED_TABLES:
+        with op.batch_alter_table(association, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{association}_tag_id')
+        op.drop_table(association)
+
+    with op.batch_alter_table('tag', schema=None) as batch_op:
+        batch_op.drop_index('ix_tag_name')
+    op.drop_table('tag')
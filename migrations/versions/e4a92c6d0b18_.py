@@ -0,0 +1,68 @@
+"""typed and indexed feature model metrics
+
+Revision ID: e4a92c6d0b18
+Revises: d8e3b5a17c40
+Create Date: 2026-10-18 15:32:47.118025
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a92c6d0b18'
+down_revision = 'd8e3b5a17c40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Free-text values cannot become integers; `rosemary uvl:reanalyze` recomputes them from the UVL files
+    for column in ('number_of_models', 'number_of_features'):
+        op.execute(f"UPDATE ds_metrics SET {column} = NULL WHERE {column} NOT REGEXP '^[0-9]+$'")
+
+    with op.batch_alter_table('ds_metrics', schema=None) as batch_op:
+        batch_op.alter_column('number_of_models',
+               existing_type=sa.String(length=120),
+               type_=sa.Integer(),
+               existing_nullable=True)
+        batch_op.alter_column('number_of_features',
+               existing_type=sa.String(length=120),
+               type_=sa.Integer(),
+               existing_nullable=True)
+        batch_op.add_column(sa.Column('number_of_constraints', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('depth', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_ds_metrics_number_of_models'), ['number_of_models'], unique=False)
+        batch_op.create_index(batch_op.f('ix_ds_metrics_number_of_features'), ['number_of_features'], unique=False)
+        batch_op.create_index(
+            batch_op.f('ix_ds_metrics_number_of_constraints'), ['number_of_constraints'], unique=False
+        )
+        batch_op.create_index(batch_op.f('ix_ds_metrics_depth'), ['depth'], unique=False)
+
+    with op.batch_alter_table('fm_metrics', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('number_of_features', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('number_of_constraints', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('depth', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('fm_metrics', schema=None) as batch_op:
+        batch_op.drop_column('depth')
+        batch_op.drop_column('number_of_constraints')
+        batch_op.drop_column('number_of_features')
+
+    with op.batch_alter_table('ds_metrics', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ds_metrics_depth'))
+        batch_op.drop_index(batch_op.f('ix_ds_metrics_number_of_constraints'))
+        batch_op.drop_index(batch_op.f('ix_ds_metrics_number_of_features'))
+        batch_op.drop_index(batch_op.f('ix_ds_metrics_number_of_models'))
+        batch_op.drop_column('depth')
+        batch_op.drop_column('number_of_constraints')
+        batch_op.alter_column('number_of_features',
+               existing_type=sa.Integer(),
+               type_=sa.String(length=120),
+               existing_nullable=True)
+        batch_op.alter_column('number_of_models',
+               existing_type=sa.Integer(),
+               type_=sa.String(length=120),
+               existing_nullable=True)
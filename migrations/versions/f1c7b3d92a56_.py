@@ -0,0 +1,39 @@
+"""uvl identifier index
+
+Revision ID: f1c7b3d92a56
+Revises: e4a92c6d0b18
+Create Date: 2026-10-18 16:48:09.530271
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c7b3d92a56'
+down_revision = 'e4a92c6d0b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled at upload time; `rosemary uvl:reanalyze` indexes the models stored before this revision
+    op.create_table('uvl_identifier',
+    sa.Column('feature_model_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    # Binary collation, so names that differ only in accents do not collide in the primary key
+    sa.Column('name', sa.String(length=255, collation='utf8mb4_bin'), nullable=False),
+    sa.Column('data_set_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['data_set_id'], ['data_set.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['feature_model_id'], ['feature_model.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('feature_model_id', 'kind', 'name')
+    )
+    with op.batch_alter_table('uvl_identifier', schema=None) as batch_op:
+        batch_op.create_index('ix_uvl_identifier_kind_name', ['kind', 'name', 'data_set_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('uvl_identifier', schema=None) as batch_op:
+        batch_op.drop_index('ix_uvl_identifier_kind_name')
+
+    op.drop_table('uvl_identifier')
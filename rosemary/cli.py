@@ -19,6 +19,9 @@ from rosemary.commands.info import info, info2
 from rosemary.commands.make_module import make_module
 from rosemary.commands.env import env
 from rosemary.commands.test import test
+from rosemary.commands.counters_rebuild import counters_rebuild
+from rosemary.commands.search_reindex import search_reindex
+from rosemary.commands.uvl_reanalyze import uvl_reanalyze
 
 
 class RosemaryCLI(click.Group):
@@ -52,6 +55,9 @@ cli.add_command(db_reset)
 cli.add_command(db_migrate)
 cli.add_command(db_console)
 cli.add_command(db_seed)
+cli.add_command(counters_rebuild)
+cli.add_command(search_reindex)
+cli.add_command(uvl_reanalyze)
 cli.add_command(route_list)
 cli.add_command(compose_env)
 cli.add_command(locust)
@@ -0,0 +1,18 @@
+import click
+from flask.cli import with_appcontext
+
+from app.modules.public.services import HubCounterService
+
+
+@click.command('counters:rebuild', help="Recomputes the homepage statistics counters from the database.")
+@with_appcontext
+def counters_rebuild():
+    try:
+        values = HubCounterService().rebuild()
+    except Exception as e:
+        click.echo(click.style(f"Error rebuilding counters: {e}", fg='red'))
+        return
+
+    for name, value in values.items():
+        click.echo(f"{name}: {value}")
+    click.echo(click.style("Hub counters rebuilt.", fg='green'))
@@ -0,0 +1,16 @@
+import click
+from flask.cli import with_appcontext
+
+from app.modules.explore.services import SearchIndexService
+
+
+@click.command('search:reindex', help="Rebuilds the full-text search index used by /explore.")
+@with_appcontext
+def search_reindex():
+    try:
+        count = SearchIndexService().rebuild()
+    except Exception as e:
+        click.echo(click.style(f"Error rebuilding the search index: {e}", fg='red'))
+        return
+
+    click.echo(click.style(f"Search index rebuilt with {count} datasets.", fg='green'))
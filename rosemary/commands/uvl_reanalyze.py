@@ -0,0 +1,16 @@
+import click
+from flask.cli import with_appcontext
+
+from app.modules.dataset.services import DataSetService
+
+
+@click.command('uvl:reanalyze', help="Recomputes metrics and the UVL identifier index from the stored UVL files.")
+@with_appcontext
+def uvl_reanalyze():
+    try:
+        count = DataSetService().reanalyze_uvl_files()
+    except Exception as e:
+        click.echo(click.style(f"Error reanalyzing the UVL files: {e}", fg='red'))
+        return
+
+    click.echo(click.style(f"UVL files reanalyzed for {count} datasets.", fg='green'))